@@ -0,0 +1,95 @@
+"""
+Micro-benchmark for ensemble voting
+Usage: python bench_ensemble.py [--repeat 20]
+
+Compares the original nested-loop ensemble (scalar IoU, dict copy per
+candidate) with the IoU-matrix implementation in CurrencyDetector at
+10, 100 and 1000 boxes per model.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from utils.detections import Detections
+from utils.inference import CurrencyDetector
+
+
+def legacy_ensemble_vote(detector, binary_dets, specific_dets):
+    """The pre-vectorization implementation, kept as the baseline"""
+    if not binary_dets or not specific_dets:
+        return specific_dets
+
+    matched_dets = []
+    for binary_det in binary_dets:
+        best_match = None
+        best_iou = 0.3
+        for specific_det in specific_dets:
+            iou = detector.calculate_iou(binary_det['bbox'], specific_det['bbox'])
+            if iou > best_iou:
+                best_iou = iou
+                best_match = specific_det.copy()
+        if best_match:
+            best_match['binary_confidence'] = binary_det['confidence']
+            best_match['ensemble_confidence'] = max(
+                binary_det['confidence'], best_match['confidence']
+            )
+            matched_dets.append(best_match)
+
+    return matched_dets if matched_dets else specific_dets
+
+
+def random_detections(rng, count, jitter=None, base=None):
+    if base is None:
+        xy = rng.uniform(0, 4000, size=(count, 2))
+        wh = rng.uniform(40, 200, size=(count, 2))
+        boxes = np.hstack([xy, xy + wh])
+    else:
+        boxes = base + rng.normal(0, jitter, size=base.shape)
+
+    return boxes, [
+        {'bbox': box.tolist(), 'confidence': float(rng.uniform(0.3, 1.0)),
+         'class_id': 0, 'class_name': '10_coin'}
+        for box in boxes
+    ]
+
+
+def timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    detector = CurrencyDetector({}, device='cpu')
+    rng = np.random.default_rng(0)
+
+    print(f"{'boxes':>6} {'legacy ms':>12} {'vectorized ms':>14} {'speedup':>8}")
+    for n in args.sizes:
+        boxes, binary = random_detections(rng, n)
+        _, specific = random_detections(rng, n, jitter=5.0, base=boxes)
+
+        repeat = max(1, args.repeat // (10 if n >= 1000 else 1))
+        binary_arrays = Detections.from_dicts(binary)
+        specific_arrays = Detections.from_dicts(specific)
+
+        legacy = timeit(lambda: legacy_ensemble_vote(detector, binary, specific), repeat)
+        vectorized = timeit(
+            lambda: detector.ensemble_vote(binary_arrays, specific_arrays).to_dicts(), repeat
+        )
+
+        print(f"{n:>6} {legacy * 1000:>12.2f} {vectorized * 1000:>14.2f} "
+              f"{legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+End-to-end inference benchmark over the test splits
+Usage: python benchmark.py [--profiles none fast] [--ensemble on off]
+                           [--backends torch onnx] [--batch-sizes 1 8]
+                           [--threads 0 4] [--binary-sizes 320 640]
+                           [--speculative off on]
+                           [--limit 50] [--compare old.json]
+
+Runs CurrencyDetector.detect_batch over datasets/{binary,banknote,coin}/test
+for every combination of the options and reports per configuration and
+split: images/sec, p50/p95/p99 latency per batch call, peak RSS,
+mAP50 / precision / recall against the labels, the images per detection
+path (binary-first cascade, speculative single pass, fallback) and, with
+a binary size below the model input, the share of images re-run at full
+size. The binary split is scored
+on the detection 'type' (coin/note), the others on the class name.
+
+Images are decoded before timing starts. Scores come from the pipeline's
+final output (after thresholds and the 0.4 confidence filter), so they
+describe the operating point the API serves, not a full PR sweep.
+
+Results are written as JSON together with the git commit so runs can be
+compared across commits (--compare prints the differences).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from config import DATASET_DIR, DEVICE, MODEL_DIR, MODEL_SUFFIXES
+from utils.backends import configure_threads
+from utils.evaluation import evaluate_detections, list_split, load_class_names, load_yolo_labels
+from utils.inference import CurrencyDetector, PREPROCESSING_PROFILES, TypePrior
+
+DATASETS = ('binary', 'banknote', 'coin')
+
+
+def git_commit() -> Optional[str]:
+    """Current commit, with '-dirty' when the tree has local changes"""
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+        dirty = subprocess.run(
+            ['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL
+        ).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far (None on Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def load_split(dataset: str, limit: Optional[int]) -> List[tuple]:
+    """Decoded test images with their labels as (class_name, box) pairs"""
+    dataset_dir = os.path.join(DATASET_DIR, dataset)
+    names = load_class_names(dataset_dir)
+
+    samples = []
+    for image_path, label_path in list_split(dataset_dir, 'test', limit=limit):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+        labels = [(names[c], box) for c, box in load_yolo_labels(label_path, w, h)]
+        samples.append((image, labels))
+    return samples
+
+
+def make_detector(backend: str, threads: int, device: str) -> CurrencyDetector:
+    model_paths = {
+        name: os.path.join(MODEL_DIR, f"{name}_model{MODEL_SUFFIXES[backend]}")
+        for name in ('binary', 'banknote', 'coin')
+    }
+    detector = CurrencyDetector(
+        model_paths, device if backend == 'torch' else 'cpu',
+        backend=backend, num_threads=threads
+    )
+    # After loading, so torch is imported by then
+    configure_threads(threads)
+    return detector
+
+
+def run_config(detector: CurrencyDetector, samples: List[tuple], dataset: str,
+               profile: str, ensemble: bool, batch_size: int,
+               speculative: bool = False) -> Dict:
+    """
+    Time one configuration on one split and score its detections
+
+    Speculative runs treat the split as one client: the type hint of a
+    batch comes from a TypePrior over the earlier results.
+    """
+    images = [image for image, _ in samples]
+    options = {'preprocessing': profile, 'use_ensemble': ensemble, 'speculative': speculative}
+    prior = TypePrior()
+
+    # Warm-up: first calls pay for lazy initialization and allocations
+    detector.detect_batch(images[:batch_size], **options)
+    detector.binary_low_res = detector.binary_escalations = 0
+    detector.path_counts = dict.fromkeys(detector.path_counts, 0)
+
+    predictions, latencies = [], []
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        batch_start = time.perf_counter()
+        results = detector.detect_batch(
+            images[i:i + batch_size], type_hint=prior.likely(), **options
+        )
+        latencies.append(time.perf_counter() - batch_start)
+        for result in results:
+            prior.update(det['type'] for det in result['detections'])
+        predictions.extend(result['detections'] for result in results)
+    total = time.perf_counter() - start
+
+    if dataset == 'binary':
+        predictions = [[dict(det, class_name=det['type']) for det in dets] for dets in predictions]
+    metrics = evaluate_detections(predictions, [labels for _, labels in samples])
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        'images': len(images),
+        'images_per_sec': len(images) / total if total > 0 else None,
+        'latency_ms': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)},
+        'peak_rss_mb': peak_rss_mb(),
+        'map50': metrics['map50'],
+        'precision': metrics['precision'],
+        'recall': metrics['recall'],
+        'binary_escalation_rate': (detector.binary_escalations / detector.binary_low_res
+                                   if detector.binary_low_res else None),
+        'paths': dict(detector.path_counts),
+    }
+
+
+def config_key(result: Dict) -> tuple:
+    # Reports from before --binary-sizes / --speculative ran the binary
+    # stage at 640, binary model first
+    keys = ('dataset', 'backend', 'profile', 'ensemble', 'batch_size', 'threads')
+    return tuple(result[k] for k in keys) + (
+        result.get('binary_size', 640), result.get('speculative', False)
+    )
+
+
+def compare(results: List[Dict], baseline_path: str) -> None:
+    """Print speed and accuracy changes against an earlier report"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    previous = {config_key(r): r for r in baseline['results']}
+
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    for result in results:
+        old = previous.get(config_key(result))
+        if old is None:
+            continue
+        speed = (result['images_per_sec'] / old['images_per_sec'] - 1) * 100
+        print(f"   {' / '.join(map(str, config_key(result)))}: "
+              f"{speed:+.1f}% img/s, "
+              f"p95 {result['latency_ms']['p95'] - old['latency_ms']['p95']:+.1f} ms, "
+              f"mAP50 {result['map50'] - old['map50']:+.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=list(DATASETS))
+    parser.add_argument('--profiles', nargs='+', choices=PREPROCESSING_PROFILES, default=['fast'])
+    parser.add_argument('--ensemble', nargs='+', choices=['on', 'off'], default=['on'])
+    parser.add_argument('--backends', nargs='+', choices=list(MODEL_SUFFIXES), default=['torch'])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1])
+    parser.add_argument('--threads', nargs='+', type=int, default=[0],
+                        help='intra-op threads (0 = runtime default)')
+    parser.add_argument('--binary-sizes', nargs='+', type=int, default=[640],
+                        help='input size of the binary stage (below 640: low-res '
+                             'pass with escalation of ambiguous images)')
+    parser.add_argument('--speculative', nargs='+', choices=['on', 'off'], default=['off'],
+                        help='run the specific model of the likely type first')
+    parser.add_argument('--device', default=DEVICE, help='device for the torch backend')
+    parser.add_argument('--limit', type=int, default=None, help='images per split')
+    parser.add_argument('--output', default=None,
+                        help='JSON report path (default: benchmark_<commit>.json)')
+    parser.add_argument('--compare', default=None, help='earlier JSON report')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("INFERENCE BENCHMARK")
+    print("=" * 60)
+
+    splits = {}
+    for dataset in args.datasets:
+        splits[dataset] = load_split(dataset, args.limit)
+        print(f"   {dataset}: {len(splits[dataset])} test images")
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'results': []
+    }
+
+    for backend, threads in itertools.product(args.backends, args.threads):
+        detector = make_detector(backend, threads, args.device)
+        missing = [name for name in ('binary', 'banknote', 'coin') if name not in detector.models]
+        if missing:
+            print(f"\n❌ {backend}: models not loaded ({', '.join(missing)}), skipping")
+            continue
+
+        for binary_size, speculative, profile, ensemble, batch_size, dataset in itertools.product(
+                args.binary_sizes, args.speculative, args.profiles, args.ensemble,
+                args.batch_sizes, args.datasets):
+            if not splits[dataset]:
+                continue
+            detector.binary_image_size = binary_size
+            config = {
+                'dataset': dataset, 'backend': backend, 'profile': profile,
+                'ensemble': ensemble == 'on', 'batch_size': batch_size, 'threads': threads,
+                'binary_size': binary_size, 'speculative': speculative == 'on'
+            }
+            result = dict(config, **run_config(
+                detector, splits[dataset], dataset, profile, ensemble == 'on', batch_size,
+                speculative == 'on'
+            ))
+            report['results'].append(result)
+
+            print(f"\n{dataset} | {backend} | {profile} | ensemble {ensemble} | "
+                  f"batch {batch_size} | threads {threads or 'default'} | binary {binary_size} | "
+                  f"speculative {speculative}")
+            print(f"   {result['images_per_sec']:.2f} img/s, "
+                  f"p50/p95/p99 {result['latency_ms']['p50']:.1f}/"
+                  f"{result['latency_ms']['p95']:.1f}/{result['latency_ms']['p99']:.1f} ms")
+            print(f"   mAP50 {result['map50']:.4f}, P {result['precision']:.4f}, "
+                  f"R {result['recall']:.4f}, peak RSS {result['peak_rss_mb'] or 0:.0f} MB")
+            if result['binary_escalation_rate'] is not None:
+                print(f"   re-run at full size: {result['binary_escalation_rate']:.1%}")
+            print(f"   paths: " + ", ".join(f"{k} {v}" for k, v in result['paths'].items()))
+
+    output = Path(args.output or f"benchmark_{(commit or 'unknown')[:12]}.json")
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\n📄 Report: {output}")
+
+    if args.compare:
+        compare(report['results'], args.compare)
+
+    if not report['results']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
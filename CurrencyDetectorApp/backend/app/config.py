@@ -1,26 +1,145 @@
 import os
-import torch
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODEL_DIR = os.path.join(BASE_DIR, "app", "models")
+DATASET_DIR = os.path.join(os.path.dirname(BASE_DIR), "yolov8_training", "datasets")
 
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# 'torch' runs the .pt files through ultralytics; 'onnx' and 'openvino'
+# use the exports produced by export_models.py and never import torch
+INFERENCE_BACKEND = 'torch'
+
+
+def _select_device() -> str:
+    # MKD_DEVICE=cpu|cuda skips importing torch here (~1-2 s of startup)
+    if os.environ.get('MKD_DEVICE'):
+        return os.environ['MKD_DEVICE']
+    if INFERENCE_BACKEND != 'torch':
+        return "cpu"
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+DEVICE = _select_device()
 
 # Use the copied .pt files (NOT the .torchscript files)
 BINARY_MODEL = os.path.join(MODEL_DIR, "binary_model.pt")
 BANKNOTE_MODEL = os.path.join(MODEL_DIR, "banknote_model.pt")
 COIN_MODEL = os.path.join(MODEL_DIR, "coin_model.pt")
 
+MODEL_SUFFIXES = {
+    'torch': '.pt',
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+}
+# Per model: use the INT8 export published by quantize_models.py (onnx only)
+INT8_MODELS = {'binary': False, 'banknote': False, 'coin': False}
+
+MODEL_PATHS = {
+    name: os.path.join(MODEL_DIR, f"{name}_model_int8.onnx")
+    if INFERENCE_BACKEND == 'onnx' and INT8_MODELS[name]
+    else os.path.join(MODEL_DIR, f"{name}_model{MODEL_SUFFIXES[INFERENCE_BACKEND]}")
+    for name in ('binary', 'banknote', 'coin')
+}
+
 BINARY_CONFIDENCE = 0.35
 BANKNOTE_CONFIDENCE = 0.45
 COIN_CONFIDENCE = 0.45
 
 IMAGE_SIZE = 640
+# Input size of the coin/note stage. None = model input size (IMAGE_SIZE);
+# smaller values (e.g. 320) run the binary stage at low res and re-run
+# ambiguous images (empty, weak or conflicting boxes) at full size.
+# Compare with: python benchmark.py --datasets binary --binary-sizes 320 640
+BINARY_IMAGE_SIZE = None
 USE_PREPROCESSING = True
+# 'none', 'clahe_only', 'fast' or 'full' (non-local means, slowest);
+# can be overridden per request with ?preprocessing=
+PREPROCESSING_PROFILE = 'fast'
 USE_ENSEMBLE = True
+# Run the banknote/coin model only on crops around the binary boxes
+USE_ROI_CASCADE = False
+# Detect on overlapping tiles of large photos (e.g. a table of coins at
+# 48 MP) instead of one downscaled pass; uploads are then decoded at full
+# resolution. Tile size and count: CurrencyDetector.tile_* attributes
+USE_TILING = False
+# Speculative ordering: run the banknote or coin model of the likely
+# type first and the binary model only when that answer is uncertain.
+# The likely type is per client: ?hint= on /detect and /detect/batch, or
+# the previous frames of the same /ws/detect stream; without one the
+# cascade runs. /metrics shows how often each path is taken (detect_path_*)
+SPECULATIVE_DETECTION = False
 
 MAX_IMAGE_SIZE = 10*1024*1024
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
 
 TTS_LANGUAGE = 'mk'
-TTS_ENABLED = True
\ No newline at end of file
+TTS_ENABLED = True
+# 'edge' (online voices) or 'offline' (pyttsx3)
+TTS_SYNTHESIZER = 'edge'
+# Synthesized phrases are cached in memory and on disk; TTS_WARM_UP
+# synthesizes every possible announcement in the background on startup
+TTS_CACHE_DIR = os.path.join(BASE_DIR, "app", "tts_cache")
+TTS_CACHE_MAX_ENTRIES = 128
+TTS_CACHE_MAX_BYTES = 16 * 1024 * 1024
+TTS_CACHE_DISK_MAX_BYTES = 64 * 1024 * 1024
+TTS_WARM_UP = False
+# Longest text /speak synthesizes
+TTS_MAX_TEXT_LENGTH = 200
+
+# Worker pool for the CPU-bound detection pipeline
+WORKER_POOL_TYPE = 'thread'  # 'thread' or 'process'
+WORKER_POOL_SIZE = max(1, (os.cpu_count() or 2) // 2)
+WORKER_QUEUE_SIZE = 8
+DETECT_TIMEOUT = 30.0  # seconds
+
+# Intra-op threads of torch / onnxruntime / openvino / OpenCV per server
+# process (0 = runtime default, i.e. all cores). serve.py divides the
+# cores between its workers when this is 0.
+INTRA_OP_THREADS = 0
+
+# Startup: the banknote/coin models can be loaded on their first request
+# instead of at startup; warm-up runs every loaded model once on a blank
+# image before the server reports ready (/ready)
+LAZY_SPECIFIC_MODELS = False
+WARM_UP_MODELS = True
+
+# serve.py: uvicorn worker processes forked after the models are loaded
+SERVE_WORKERS = 2
+
+# POST /detect/batch: images per request (files or zip entries) and the
+# total upload size, both as sent and after zip expansion; images go
+# through the models BATCH_MAX_SIZE at a time
+BATCH_MAX_FILES = 64
+BATCH_MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+
+# /ws/detect: run the full cascade every N frames (or on a scene change,
+# mean thumbnail difference above the threshold) and track boxes in between
+STREAM_FULL_EVERY = 5
+STREAM_SCENE_THRESHOLD = 12.0
+
+# Announcements in streams: majority vote over the last STABILIZER_WINDOW
+# frames, at most one announcement every STABILIZER_DEBOUNCE seconds
+STABILIZER_WINDOW = 8
+STABILIZER_MIN_SHARE = 0.6
+STABILIZER_DEBOUNCE = 2.0
+
+# Micro-batching of concurrent requests (only with the thread pool;
+# WORKER_POOL_SIZE bounds how many requests can share one batch)
+USE_BATCHING = False
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 10.0
+
+# Cache of /detect responses for re-sent identical uploads (retries,
+# double taps). RESULT_CACHE_DIR enables a disk tier shared by all
+# uvicorn workers, e.g. '/tmp/mkd_result_cache'
+USE_RESULT_CACHE = True
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL = 300.0  # seconds
+RESULT_CACHE_DIR = None
+RESULT_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024
+
+# Decoded frames kept for /detect?lazy_images=true so crops can be
+# fetched later from /frames/{frame_id}/detections/{id}/image
+FRAME_STORE_MAX_BYTES = 256 * 1024 * 1024
+FRAME_STORE_TTL = 120.0  # seconds
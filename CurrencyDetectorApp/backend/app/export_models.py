@@ -0,0 +1,143 @@
+"""
+Export the backend models to ONNX / OpenVINO and validate the exports
+Usage: python export_models.py [--format onnx|openvino] [--samples 20]
+
+Reads the .pt files copied into app/models by export_models.ipynb, writes
+<name>_model.onnx (or <name>_model_openvino_model/) next to them and checks
+that the exported model, run through our own letterbox + NMS, finds the
+same boxes as the PyTorch model on images from the dataset test splits.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import MODEL_DIR, MODEL_SUFFIXES, DATASET_DIR, IMAGE_SIZE
+from utils.backends import load_model
+from utils.boxes import box_iou
+
+MODELS = {
+    'binary': 'binary',
+    'banknote': 'banknote',
+    'coin': 'coin',
+}  # model name -> dataset folder
+
+
+def export(name: str, fmt: str) -> str:
+    """Export app/models/<name>_model.pt and move the result into MODEL_DIR"""
+    from ultralytics import YOLO
+
+    source = os.path.join(MODEL_DIR, f"{name}_model.pt")
+    destination = os.path.join(MODEL_DIR, f"{name}_model{MODEL_SUFFIXES[fmt]}")
+
+    kwargs = {'simplify': True, 'opset': 12} if fmt == 'onnx' else {}
+    exported = YOLO(source).export(
+        format=fmt, imgsz=IMAGE_SIZE, dynamic=True, device='cpu', **kwargs
+    )
+
+    if os.path.isdir(destination):
+        shutil.rmtree(destination)
+    shutil.move(str(exported), destination)
+    return destination
+
+
+def sample_images(dataset: str, count: int):
+    image_dir = Path(DATASET_DIR) / dataset / 'test' / 'images'
+    paths = sorted(image_dir.glob('*.jpg'))[:count]
+    return [(p.name, cv2.imread(str(p))) for p in paths]
+
+
+def agreement(reference, candidate, iou_threshold: float = 0.9) -> float:
+    """Fraction of reference boxes matched by a same-class candidate box"""
+    if not reference:
+        return 1.0 if not candidate else 0.0
+
+    matched = 0
+    for det in reference:
+        same_class = [c['bbox'] for c in candidate if c['class_id'] == det['class_id']]
+        if same_class and box_iou(np.array(det['bbox']), np.array(same_class)).max() >= iou_threshold:
+            matched += 1
+    return matched / len(reference)
+
+
+def validate(name: str, dataset: str, fmt: str, path: str, samples: int,
+             conf: float = 0.25, iou: float = 0.5) -> float:
+    reference = load_model(os.path.join(MODEL_DIR, f"{name}_model.pt"), 'torch', 'cpu')
+    exported = load_model(path, fmt)
+
+    if reference.names != exported.names:
+        print(f"   ✗ Class names differ: {reference.names} vs {exported.names}")
+        return 0.0
+
+    scores, ref_times, exp_times = [], [], []
+    for _, image in sample_images(dataset, samples):
+        start = time.perf_counter()
+        ref_dets = reference.predict([image], conf, iou)[0].to_dicts()
+        ref_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        exp_dets = exported.predict([image], conf, iou)[0].to_dicts()
+        exp_times.append(time.perf_counter() - start)
+
+        scores.append(agreement(ref_dets, exp_dets))
+
+    if not scores:
+        print(f"   ⚠ No test images found for {dataset}, skipping validation")
+        return 1.0
+
+    score = float(np.mean(scores))
+    print(f"   Box agreement: {score:.2%} on {len(scores)} images")
+    print(f"   Latency: torch {np.median(ref_times) * 1000:.1f} ms, "
+          f"{fmt} {np.median(exp_times) * 1000:.1f} ms (median)")
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--format', choices=['onnx', 'openvino'], default='onnx')
+    parser.add_argument('--samples', type=int, default=20,
+                        help='test images per model used for validation')
+    parser.add_argument('--min-agreement', type=float, default=0.95)
+    parser.add_argument('--skip-export', action='store_true',
+                        help='only validate existing exports')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"EXPORTING MODELS TO {args.format.upper()}")
+    print("=" * 60)
+
+    failed = []
+    for name, dataset in MODELS.items():
+        print(f"\n{name}:")
+        if args.skip_export:
+            path = os.path.join(MODEL_DIR, f"{name}_model{MODEL_SUFFIXES[args.format]}")
+        else:
+            try:
+                path = export(name, args.format)
+            except Exception as e:
+                print(f"   ✗ Export failed: {e}")
+                failed.append(name)
+                continue
+        print(f"   ✓ {path}")
+
+        score = validate(name, dataset, args.format, path, args.samples)
+        if score < args.min_agreement:
+            print(f"   ✗ Below required agreement of {args.min_agreement:.0%}")
+            failed.append(name)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"✅ Done! Set INFERENCE_BACKEND = '{args.format}' in config.py to use them.")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
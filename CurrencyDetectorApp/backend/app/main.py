@@ -3,40 +3,213 @@ Enhanced Currency Detection API with Image Extraction
 Returns both full image detection and extracted currency images
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import (
+    FastAPI, File, UploadFile, HTTPException, Header, Query, WebSocket, WebSocketDisconnect
+)
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import cv2
 import numpy as np
-from PIL import Image
-import io
-import base64
-from typing import List
+import asyncio
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 from config import (
-    BINARY_MODEL, BANKNOTE_MODEL, COIN_MODEL,
-    DEVICE, USE_PREPROCESSING, USE_ENSEMBLE
+    MODEL_PATHS, INFERENCE_BACKEND,
+    DEVICE, USE_PREPROCESSING, USE_ENSEMBLE, PREPROCESSING_PROFILE,
+    USE_ROI_CASCADE, USE_TILING, SPECULATIVE_DETECTION,
+    WORKER_POOL_TYPE, WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, DETECT_TIMEOUT, INTRA_OP_THREADS,
+    LAZY_SPECIFIC_MODELS, WARM_UP_MODELS,
+    USE_BATCHING, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+    USE_RESULT_CACHE, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_TTL, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES,
+    FRAME_STORE_MAX_BYTES, FRAME_STORE_TTL, BATCH_MAX_FILES, BATCH_MAX_UPLOAD_SIZE,
+    STREAM_FULL_EVERY, STREAM_SCENE_THRESHOLD,
+    STABILIZER_WINDOW, STABILIZER_MIN_SHARE, STABILIZER_DEBOUNCE,
+    TTS_ENABLED, TTS_LANGUAGE, TTS_SYNTHESIZER, TTS_CACHE_DIR, TTS_CACHE_MAX_ENTRIES,
+    TTS_CACHE_MAX_BYTES, TTS_CACHE_DISK_MAX_BYTES, TTS_WARM_UP, TTS_MAX_TEXT_LENGTH,
+    IMAGE_SIZE, BINARY_IMAGE_SIZE, MAX_IMAGE_SIZE, ALLOWED_EXTENSIONS
+)
+from utils import inference
+from utils.inference import (
+    init_detector, detect_currency, detect_currency_batch, enable_batching,
+    scale_detections, denomination, PREPROCESSING_PROFILES, SPECIFIC_MODELS, TypePrior
+)
+from utils.backends import configure_threads
+from utils.cache import ResultCache, make_cache_key
+from utils.encoding import (
+    IMAGE_FORMATS, FormatUnavailable, ResponseOptions, check_format_available,
+    encode_crop, encode_response, negotiate_format, response_media_type
 )
-from utils.inference import init_detector, detect_currency
 from utils.extraction import extract_currency_images
+from utils.frames import FrameStore
+from utils.ingest import decode_upload, expand_zip, is_zip, validate_upload, UploadRejected
+from utils.stabilizer import DetectionStabilizer
+from utils.streaming import LatestFrameSlot, StreamStats
+from utils import telemetry
+from utils.telemetry import StageTimer
+from utils.tracking import BoxTracker
+from utils.tts import VOICES, get_tts, init_tts
+from utils.workers import InferencePool, PoolBusyError
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI
 app = FastAPI(title="MKD Currency Detector API v2.0")
 
+# Worker pool for the CPU-bound pipeline (created on startup)
+inference_pool: InferencePool = None
+
+# Encoded /detect responses of recent uploads
+result_cache = ResultCache(
+    RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL,
+    RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES
+) if USE_RESULT_CACHE else None
+
+# Decodes /detect/batch images (created on first use)
+decode_pool: Optional[ThreadPoolExecutor] = None
+
+# Decoded frames of lazy /detect requests
+frame_store = FrameStore(FRAME_STORE_MAX_BYTES, FRAME_STORE_TTL)
+
+# Cache key -> future of a request that is being computed right now, so
+# a double tap waits for the first request instead of running twice
+pending_results: Dict[str, asyncio.Future] = {}
+
+
+# Model loading runs in the background after startup: /health answers
+# right away, /ready and the detection endpoints wait for it
+loading_task: Optional[asyncio.Task] = None
+models_ready = False
+# Seconds per startup step, reported by /ready
+startup_times: Dict[str, float] = {}
+# detector_status() of a process-pool worker, probed at startup
+pool_detector: Optional[dict] = None
+
+
+def load_models(started: float) -> None:
+    """Load (unless serve.py preloaded them) and warm up the models"""
+    global models_ready
+
+    detector = inference.detector
+    if detector is None:
+        start = time.perf_counter()
+        detector = init_detector(MODEL_PATHS, device=DEVICE,
+                                 preprocessing_profile=PREPROCESSING_PROFILE,
+                                 backend=INFERENCE_BACKEND,
+                                 num_threads=INTRA_OP_THREADS,
+                                 lazy_specific=LAZY_SPECIFIC_MODELS,
+                                 binary_image_size=BINARY_IMAGE_SIZE)
+        startup_times['models'] = time.perf_counter() - start
+    else:
+        # Loaded by serve.py before forking, shared copy-on-write
+        print("✅ Using models preloaded by the parent process")
+    configure_threads(INTRA_OP_THREADS)
+    telemetry.set_model_load_times(detector.load_times)
+
+    if WARM_UP_MODELS:
+        start = time.perf_counter()
+        detector.warm_up()
+        startup_times['warmup'] = time.perf_counter() - start
+
+    if USE_BATCHING:
+        enable_batching(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+    startup_times['total'] = time.perf_counter() - started
+    models_ready = 'binary' in detector.models
+
+    print(f"✅ Detector initialized on {DEVICE} ({INFERENCE_BACKEND} backend)")
+    print(f"   Models: {', '.join(detector.models)}"
+          f"{' (banknote/coin on first use)' if LAZY_SPECIFIC_MODELS else ''}")
+    print(f"   Startup: " + ", ".join(f"{k} {v:.2f}s" for k, v in startup_times.items()))
+    memory = telemetry.memory_usage()
+    if memory:
+        print(f"   Memory: " + ", ".join(f"{k} {v:.0f} MB" for k, v in memory.items()))
+    print(f"   Preprocessing: {USE_PREPROCESSING} ({PREPROCESSING_PROFILE})")
+    print(f"   Ensemble voting: {USE_ENSEMBLE}")
+    print(f"   Worker pool: {WORKER_POOL_SIZE} {WORKER_POOL_TYPE} workers, queue {WORKER_QUEUE_SIZE}")
+    print(f"   Batching: {inference.batcher is not None}")
+
+
+def detector_status() -> dict:
+    """Settings and model status of this process' detector (pool probe)"""
+    detector = inference.detector
+    if detector is None:
+        raise RuntimeError("Detector not initialized")
+    return {'settings': detector.settings(), 'models': detector.model_status()}
+
+
+async def probe_pool(started: float) -> None:
+    """
+    Wait for a process-pool worker to load its models
+
+    The first job starts the worker, whose initializer loads (and warms
+    up) the models, so the probe returns once that is done.
+    """
+    global pool_detector, models_ready
+    pool_detector = await inference_pool.run(detector_status)
+    startup_times['total'] = time.perf_counter() - started
+    models_ready = pool_detector['models'].get('binary', {}).get('loaded', False)
+    print(f"✅ Worker processes loaded: {', '.join(m for m, s in pool_detector['models'].items() if s['loaded'])}")
+
+
+def models_loading() -> bool:
+    """Whether the startup hook is still loading the models"""
+    return loading_task is not None and not loading_task.done()
+
+
+def require_models() -> None:
+    if models_loading():
+        raise HTTPException(
+            status_code=503,
+            detail="Models are still loading",
+            headers={"Retry-After": "2"}
+        )
+
 
 # Initialize detector on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize models on server startup"""
-    model_paths = {
-        'binary': BINARY_MODEL,
-        'banknote': BANKNOTE_MODEL,
-        'coin': COIN_MODEL
-    }
+    """Create the worker pool and start loading the models"""
+    global inference_pool, loading_task
+    started = time.perf_counter()
+
+    if WORKER_POOL_TYPE == 'process':
+        # Every worker process loads its own copy of the models
+        inference_pool = InferencePool(
+            WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, kind='process',
+            initializer=init_detector,
+            initargs=(MODEL_PATHS, DEVICE, PREPROCESSING_PROFILE, INFERENCE_BACKEND,
+                      INTRA_OP_THREADS, LAZY_SPECIFIC_MODELS, WARM_UP_MODELS,
+                      BINARY_IMAGE_SIZE)
+        )
+        loading_task = asyncio.create_task(probe_pool(started))
+    else:
+        inference_pool = InferencePool(
+            WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, kind='thread'
+        )
+        loading_task = asyncio.create_task(asyncio.to_thread(load_models, started))
+
+    start = time.perf_counter()
+    tts = init_tts(TTS_LANGUAGE, TTS_SYNTHESIZER, TTS_CACHE_DIR, TTS_CACHE_MAX_ENTRIES,
+                   TTS_CACHE_MAX_BYTES, TTS_CACHE_DISK_MAX_BYTES)
+    if TTS_ENABLED and TTS_WARM_UP:
+        asyncio.get_running_loop().run_in_executor(None, tts.warm_up)
+    startup_times['tts'] = time.perf_counter() - start
 
-    init_detector(model_paths, device=DEVICE)
-    print(f"✅ Detector initialized on {DEVICE}")
-    print(f"   Preprocessing: {USE_PREPROCESSING}")
-    print(f"   Ensemble voting: {USE_ENSEMBLE}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the worker pool"""
+    if inference_pool is not None:
+        inference_pool.shutdown(wait=False)
+    if inference.batcher is not None:
+        inference.batcher.close()
+    if decode_pool is not None:
+        decode_pool.shutdown(wait=False)
 
 
 @app.get("/")
@@ -59,86 +232,567 @@ async def health_check():
     return {
         "status": "healthy",
         "device": DEVICE,
+        "backend": INFERENCE_BACKEND,
         "preprocessing": USE_PREPROCESSING,
-        "ensemble": USE_ENSEMBLE
+        "preprocessing_profile": PREPROCESSING_PROFILE,
+        "ensemble": USE_ENSEMBLE,
+        "roi_cascade": USE_ROI_CASCADE,
+        "tiling": USE_TILING,
+        "workers": inference_pool.stats() if inference_pool else None,
+        "batching": inference.batcher.stats() if inference.batcher else None,
+        "result_cache": result_cache is not None
+    }
+
+
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe, unlike /health only OK once the models can serve
+
+    Reports per model whether it is loaded (or deferred until first use)
+    and warmed up, with load/warm-up seconds, the startup breakdown and
+    the memory of this process (see telemetry.memory_usage).
+    """
+    detector = inference.detector
+    if loading_task is not None and loading_task.done() and loading_task.exception():
+        error = str(loading_task.exception())
+    else:
+        error = None
+
+    status = {
+        'ready': models_ready,
+        'loading': models_loading(),
+        'error': error,
+        'models': (detector.model_status() if detector
+                   else pool_detector['models'] if pool_detector else None),
+        'startup_s': {k: round(v, 3) for k, v in startup_times.items()},
+        'memory_mb': telemetry.memory_usage()
+    }
+    return JSONResponse(status_code=200 if models_ready else 503, content=status)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics
+
+    Stage and request latency histograms, model load times and gauges for
+    the worker queue, in-flight requests and cache hit rates.
+    """
+    if not telemetry.metrics_available():
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+
+    gauges = {}
+    if inference_pool is not None:
+        pool = inference_pool.stats()
+        gauges['queue_depth'] = pool['queued']
+        gauges['in_flight'] = pool['in_flight']
+    if inference.batcher is not None:
+        gauges['avg_batch_size'] = inference.batcher.stats()['avg_batch_size']
+    detector = inference.detector
+    if detector is not None and detector.binary_low_res:
+        gauges['binary_escalation_rate'] = detector.binary_escalations / detector.binary_low_res
+    if detector is not None:
+        # Images per detection path (see CurrencyDetector.path_counts)
+        for path, count in dict(detector.path_counts).items():
+            gauges[f'detect_path_{path}'] = count
+    if result_cache is not None:
+        cache = result_cache.stats()
+        gauges['result_cache_hit_rate'] = cache['hit_rate']
+        gauges['result_cache_entries'] = cache['entries']
+    frames = frame_store.stats()
+    crop_lookups = frames['crop_hits'] + frames['crop_misses']
+    gauges['crop_cache_hit_rate'] = frames['crop_hits'] / crop_lookups if crop_lookups else 0.0
+    gauges['frame_store_bytes'] = frames['bytes']
+    telemetry.set_gauges(gauges)
+
+    body, content_type = telemetry.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the result cache"""
+    if result_cache is None:
+        return {"enabled": False, "frames": frame_store.stats()}
+    return {"enabled": True, **result_cache.stats(), "frames": frame_store.stats()}
+
+
+def get_inference_pool() -> InferencePool:
+    """Return the worker pool, creating a thread pool if startup did not run"""
+    global inference_pool
+    if inference_pool is None:
+        inference_pool = InferencePool(
+            WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, kind='thread'
+        )
+    return inference_pool
+
+
+def detection_settings(extract_images: bool, preprocessing: Optional[str],
+                       options: ResponseOptions, type_hint: Optional[str] = None) -> dict:
+    """Settings that change the /detect response, part of the cache key"""
+    return {
+        'extract_images': extract_images,
+        'response': options._asdict(),
+        'preprocessing': preprocessing or PREPROCESSING_PROFILE,
+        'roi_cascade': USE_ROI_CASCADE,
+        'tiling': USE_TILING,
+        'speculative': SPECULATIVE_DETECTION,
+        'type_hint': type_hint,
+        'models': MODEL_PATHS,
+        'backend': INFERENCE_BACKEND,
+        # Probed from a worker with the process pool
+        'detector': (inference.detector.settings() if inference.detector
+                     else pool_detector['settings'] if pool_detector else None)
+    }
+
+
+async def detect_cached(contents: bytes, extract_images: bool,
+                        preprocessing: Optional[str],
+                        options: ResponseOptions,
+                        debug: bool = False,
+                        type_hint: Optional[str] = None) -> Tuple[bytes, str, str]:
+    """
+    Run detection through the result cache
+
+    Args:
+        debug: Add 'timings' to the response; bypasses the cache
+        type_hint: Likely currency type for speculative detection
+
+    Returns:
+        (encoded response body, media type, 'HIT', 'MISS' or 'BYPASS')
+    """
+    key = make_cache_key(
+        contents, detection_settings(extract_images, preprocessing, options, type_hint)
+    )
+    # Derived from the key so cached multipart bodies keep a valid boundary
+    boundary = key[:32]
+    media_type = response_media_type(options.response_format, boundary)
+
+    async def render():
+        body, stages, failed = await get_inference_pool().run(
+            render_detection, contents, extract_images, preprocessing,
+            options, boundary, debug, type_hint, timeout=DETECT_TIMEOUT
+        )
+        telemetry.observe_stages(stages)
+        return body, failed
+
+    if debug:
+        return (await render())[0], media_type, 'BYPASS'
+    if result_cache is None:
+        return (await render())[0], media_type, 'MISS'
+
+    while True:
+        body = result_cache.get(key)
+        if body is not None:
+            return body, media_type, 'HIT'
+
+        pending = pending_results.get(key)
+        if pending is None:
+            break
+        try:
+            body, failed = await asyncio.shield(pending)
+            return body, media_type, 'MISS' if failed else 'HIT'
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                # This request was cancelled itself
+                raise
+            # The request running the detection went away: look again,
+            # the first waiter to get here renders it for the others
+
+    future = asyncio.get_running_loop().create_future()
+    pending_results[key] = future
+    try:
+        body, failed = await render()
+        # A detection error may be transient (model load, backend fault):
+        # do not keep answering it from the cache
+        if not failed:
+            result_cache.put(key, body)
+        future.set_result((body, failed))
+        return body, media_type, 'MISS'
+    except Exception as e:
+        future.set_exception(e)
+        # Waiters re-raise it; keep asyncio from warning when there are none
+        future.exception()
+        raise
+    finally:
+        if not future.done():
+            future.cancel()
+        pending_results.pop(key, None)
+
+
+def render_detection(contents: bytes, extract_images: bool,
+                     preprocessing: Optional[str], options: ResponseOptions,
+                     boundary: str, debug: bool = False,
+                     type_hint: Optional[str] = None) -> Tuple[bytes, Dict[str, float], bool]:
+    """
+    CPU-bound part of /detect: decode, detect, extract and encode
+
+    Executed inside the worker pool so the event loop stays responsive.
+
+    Args:
+        debug: Add the stage timings in ms as 'timings' to the payload
+            (everything but the final response encoding)
+
+    Returns:
+        (encoded response body, seconds per stage, whether detection
+         raised an error; such bodies are not cached)
+    """
+    timer = StageTimer()
+    payload, images = run_detection(
+        contents, extract_images, preprocessing, options, timer, type_hint
+    )
+    if debug:
+        payload['timings'] = timer.as_ms()
+    with timer.stage('encode'):
+        body = encode_response(payload, images, options.response_format, boundary)
+    return body, timer.stages, 'error' in payload
+
+
+def run_detection(contents: bytes, extract_images: bool = True,
+                  preprocessing: Optional[str] = None,
+                  options: ResponseOptions = ResponseOptions(),
+                  timer: Optional[StageTimer] = None,
+                  type_hint: Optional[str] = None) -> Tuple[dict, dict]:
+    """
+    Decode, detect and extract
+
+    Args:
+        contents: Raw uploaded file bytes
+        extract_images: If True, extract individual currency images
+        preprocessing: Preprocessing profile (None uses the configured one)
+        options: Crop encoding options
+        timer: Receives the stage timings
+        type_hint: Likely currency type for speculative detection
+
+    Returns:
+        (response payload, {detection id: (encoded crop, media type)})
+    """
+    timer = timer or StageTimer()
+    payload, full_image, stages = detect_upload(
+        contents, preprocessing, keep_full_res=extract_images, type_hint=type_hint
+    )
+    timer.merge(stages)
+
+    images = {}
+    if extract_images:
+        for detection_data in payload['detections']:
+            with timer.stage('extraction'):
+                extracted_img = extract_currency_image(
+                    full_image,
+                    detection_data['bbox'],
+                    detection_data['type']
+                )
+            with timer.stage('crop_encode'):
+                images[detection_data['id']] = encode_crop(
+                    extracted_img,
+                    options.image_format,
+                    options.image_quality,
+                    options.image_max_dim,
+                    detection_data['type']
+                )
+
+    return payload, images
+
+
+def detect_upload(contents: bytes, preprocessing: Optional[str] = None,
+                  keep_full_res: bool = False,
+                  type_hint: Optional[str] = None) -> Tuple[dict, Optional[np.ndarray], Dict[str, float]]:
+    """
+    Decode and detect, without extracting crops
+
+    Args:
+        contents: Raw uploaded file bytes
+        preprocessing: Preprocessing profile (None uses the configured one)
+        keep_full_res: Also return the full-resolution frame
+        type_hint: Likely currency type for speculative detection
+
+    Returns:
+        (response payload, full-resolution image or None, seconds per stage)
+    """
+    timer = StageTimer()
+    # Full resolution is only needed to cut out the detected currency,
+    # or for tiling, which is pointless on a downscaled photo
+    with timer.stage('decode'):
+        decoded = decode_upload(contents, IMAGE_SIZE, keep_full_res=keep_full_res or USE_TILING)
+
+    try:
+        result = detect_currency(
+            decoded.image,
+            preprocessing=preprocessing,
+            use_roi_cascade=USE_ROI_CASCADE,
+            use_tiling=USE_TILING,
+            speculative=SPECULATIVE_DETECTION,
+            type_hint=type_hint
+        )
+        timer.merge(result.pop('timings', None))
+        if decoded.scale != 1.0:
+            scale_detections(result['detections'], decoded.scale, decoded.scale)
+    except Exception as e:
+        logger.exception("Detection failed")
+        return format_result(None, str(e)), decoded.full_image, timer.stages
+
+    return format_result(result), decoded.full_image, timer.stages
+
+
+def format_result(result: Optional[dict], error: Optional[str] = None) -> dict:
+    """
+    Response payload of one detect_currency() result
+
+    Args:
+        result: The result, None if detection raised
+        error: The exception message, added as 'error'
+    """
+    if result is None:
+        # If detection fails, return empty detection instead of 500
+        result = {
+            'success': False,
+            'message': 'Detection failed or no currency detected',
+            'type': None,
+            'detections': []
+        }
+        if error is not None:
+            result['error'] = error
+
+    # Normalize 'none' to None
+    detected_type = result.get('type')
+    if detected_type == 'none':
+        detected_type = None
+
+    # If detection failed, return success=False
+    if not result.get('success', False):
+        payload = {
+            'success': False,
+            'message': result.get('message', 'No currency detected'),
+            'type': detected_type,
+            'detections': []
+        }
+        if 'error' in result:
+            payload['error'] = result['error']
+        return payload
+
+    # Format detections
+    detections_formatted = []
+    for i, det in enumerate(result.get('detections', [])):
+        detections_formatted.append({
+            'id': i,
+            'class_name': det['class_name'],
+            'confidence': det.get('ensemble_confidence', det['confidence']),
+            'bbox': det['bbox'],
+            'type': det.get('type', detected_type)
+        })
+
+    return {
+        'success': True,
+        'type': detected_type,
+        'detections': detections_formatted,
+        'count': len(detections_formatted)
     }
 
+
+async def detect_lazy(contents: bytes, preprocessing: Optional[str],
+                      response_format: str, debug: bool = False,
+                      type_hint: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Detect without extracting crops and keep the frame for later
+
+    The full-resolution frame goes to the frame store and every detection
+    gets an image_url for GET /frames/{frame_id}/detections/{id}/image.
+    Not cached: the frame id belongs to this request.
+
+    Returns:
+        (encoded response body, media type)
+    """
+    payload, full_image, stages = await get_inference_pool().run(
+        detect_upload, contents, preprocessing, True, type_hint, timeout=DETECT_TIMEOUT
+    )
+    telemetry.observe_stages(stages)
+    if debug:
+        payload['timings'] = StageTimer(stages).as_ms()
+
+    if payload['detections']:
+        frame_id = frame_store.put(full_image, payload['detections'])
+        payload['frame_id'] = frame_id
+        for det in payload['detections']:
+            det['image_url'] = f"/frames/{frame_id}/detections/{det['id']}/image"
+
+    boundary = uuid.uuid4().hex
+    return (
+        encode_response(payload, {}, response_format, boundary),
+        response_media_type(response_format, boundary)
+    )
+
+
+def render_crop(region: np.ndarray, bbox: List[float], currency_type: str,
+                options: ResponseOptions) -> Tuple[bytes, str]:
+    """Extract and encode one crop (runs in the worker pool)"""
+    # Same extraction as the eager crops of /detect, so both give the same image
+    return encode_crop(
+        extract_currency_image(region, bbox, currency_type),
+        options.image_format,
+        options.image_quality,
+        options.image_max_dim,
+        currency_type
+    )
+
+
+@app.get("/frames/{frame_id}/detections/{detection_id}/image")
+async def detection_image(frame_id: str, detection_id: int,
+                          image_format: str = 'png',
+                          image_quality: Optional[int] = Query(None, ge=1, le=100),
+                          image_max_dim: Optional[int] = Query(None, ge=16)):
+    """
+    Extracted image of one detection of a lazy /detect request
+
+    Args:
+        frame_id: frame_id returned by /detect?lazy_images=true
+        detection_id: Detection id
+        image_format: 'png', 'webp', 'jpeg' or 'auto'
+        image_quality: WebP/JPEG quality
+        image_max_dim: Downscale the crop to at most this many pixels
+
+    Returns:
+        The encoded crop
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"image_format must be one of {', '.join(IMAGE_FORMATS)}"
+        )
+
+    frame = frame_store.get(frame_id)
+    if frame is None:
+        raise HTTPException(status_code=404, detail="Frame not found or expired")
+    if not 0 <= detection_id < len(frame.detections):
+        raise HTTPException(status_code=404, detail="Detection not found")
+
+    options = ResponseOptions('json', image_format, image_quality, image_max_dim)
+    key = (detection_id, options)
+    crop = frame_store.get_crop(frame_id, key)
+
+    if crop is None:
+        det = frame.detections[detection_id]
+        # Only the region around the box goes to the worker
+        region, bbox = frame.region(det['bbox'], padding=10)
+        try:
+            crop = await get_inference_pool().run(
+                render_crop, region, bbox, det['type'], options,
+                timeout=DETECT_TIMEOUT
+            )
+        except PoolBusyError:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Extraction timed out")
+        frame_store.put_crop(frame_id, key, crop)
+
+    data, media_type = crop
+    return Response(content=data, media_type=media_type)
+
+
 @app.post("/detect")
-async def detect(file: UploadFile = File(...), extract_images: bool = True):
+async def detect(file: UploadFile = File(...), extract_images: bool = True,
+                 lazy_images: bool = False,
+                 preprocessing: Optional[str] = None,
+                 response_format: Optional[str] = None,
+                 image_format: str = 'png',
+                 image_quality: Optional[int] = Query(None, ge=1, le=100),
+                 image_max_dim: Optional[int] = Query(None, ge=16),
+                 debug: bool = False,
+                 hint: Optional[str] = None,
+                 accept: Optional[str] = Header(None)):
     """
     Detect currency in uploaded image
 
     Args:
         file: Uploaded image file
         extract_images: If True, extract individual currency images
+        lazy_images: Instead of extracting, return a frame_id and an
+            image_url per detection to fetch crops on demand
+        preprocessing: Preprocessing profile ('none', 'clahe_only', 'fast', 'full')
+        response_format: 'json', 'multipart', 'msgpack' or 'cbor'
+            (default: from the Accept header, else JSON)
+        image_format: Crop encoding 'png', 'webp', 'jpeg' or 'auto'
+            (JPEG for banknotes, WebP with alpha for coins)
+        image_quality: WebP/JPEG quality
+        image_max_dim: Downscale crops to at most this many pixels
+        debug: Add per-stage 'timings' in ms (not served from the cache)
+        hint: Likely currency type ('coin' or 'note'); with speculative
+            detection its model runs first
 
     Returns:
         Detection results with optional extracted images
     """
+    started = time.perf_counter()
+    require_models()
+    if preprocessing is not None and preprocessing not in PREPROCESSING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"preprocessing must be one of {', '.join(PREPROCESSING_PROFILES)}"
+        )
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"image_format must be one of {', '.join(IMAGE_FORMATS)}"
+        )
+    if hint is not None and hint not in SPECIFIC_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"hint must be one of {', '.join(SPECIFIC_MODELS)}"
+        )
+
     try:
-        # Read image safely
-        contents = await file.read()
-        try:
-            pil_image = Image.open(io.BytesIO(contents)).convert("RGB")
-            image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid image file")
+        response_format = negotiate_format(response_format, accept)
+        check_format_available(response_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FormatUnavailable as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
-        try:
-            result = detect_currency(image)
-        except Exception:
-            # If detection fails, return empty detection instead of 500
-            result = {
-                'success': False,
-                'message': 'Detection failed or no currency detected',
-                'type': None,
-                'detections': []
-            }
+    options = ResponseOptions(response_format, image_format, image_quality, image_max_dim)
 
-        # Normalize 'none' to None
-        detected_type = result.get('type')
-        if detected_type == 'none':
-            detected_type = None
+    try:
+        # Read one byte past the limit so oversized uploads can be refused
+        contents = await file.read(MAX_IMAGE_SIZE + 1)
 
-        # If detection failed, return success=False
-        if not result.get('success', False):
-            return JSONResponse({
-                'success': False,
-                'message': result.get('message', 'No currency detected'),
-                'type': detected_type,
-                'detections': []
-            })
-
-        # Format detections
-        detections_formatted = []
-        for i, det in enumerate(result.get('detections', [])):
-            detection_data = {
-                'id': i,
-                'class_name': det['class_name'],
-                'confidence': det.get('ensemble_confidence', det['confidence']),
-                'bbox': det['bbox']
-            }
+        try:
+            validate_upload(contents, file.filename, MAX_IMAGE_SIZE, ALLOWED_EXTENSIONS)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
 
-            # Extract individual currency image if requested
-            if extract_images:
-                extracted_img = extract_currency_image(
-                    image,
-                    det['bbox'],
-                    detected_type
+        try:
+            if lazy_images:
+                body, media_type = await detect_lazy(
+                    contents, preprocessing, response_format, debug, hint
                 )
-                _, buffer = cv2.imencode('.png', extracted_img)
-                img_base64 = base64.b64encode(buffer).decode('utf-8')
-                detection_data['image'] = f"data:image/png;base64,{img_base64}"
-
-            detections_formatted.append(detection_data)
+                cache_status = 'BYPASS'
+            else:
+                body, media_type, cache_status = await detect_cached(
+                    contents, extract_images, preprocessing, options, debug, hint
+                )
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except PoolBusyError:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Detection timed out")
 
-        return JSONResponse({
-            'success': True,
-            'type': detected_type,
-            'detections': detections_formatted,
-            'count': len(detections_formatted)
-        })
+        telemetry.observe_request('detect', cache_status, time.perf_counter() - started)
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={"X-Cache": cache_status}
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -148,6 +802,440 @@ async def detect(file: UploadFile = File(...), extract_images: bool = True):
             }
         )
 
+def batch_error(index: int, filename: Optional[str], message: str) -> dict:
+    return {'index': index, 'filename': filename, 'success': False, 'error': message}
+
+
+def get_decode_pool() -> ThreadPoolExecutor:
+    """Threads decoding the images of a batch chunk (cv2 releases the GIL)"""
+    global decode_pool
+    if decode_pool is None:
+        decode_pool = ThreadPoolExecutor(max_workers=BATCH_MAX_SIZE, thread_name_prefix='decode')
+    return decode_pool
+
+
+def detect_chunk(items: List[Tuple[int, str, bytes]],
+                 preprocessing: Optional[str] = None,
+                 type_hint: Optional[str] = None) -> List[dict]:
+    """
+    Decode a chunk of /detect/batch images in parallel and run them
+    through the models in one batched pass
+
+    Args:
+        items: (index, filename, bytes) per image
+        preprocessing: Preprocessing profile (None uses the configured one)
+        type_hint: Likely currency type for speculative detection
+
+    Returns:
+        One NDJSON line (dict) per item
+    """
+    def decode(item):
+        try:
+            return decode_upload(item[2], IMAGE_SIZE, keep_full_res=USE_TILING)
+        except UploadRejected as e:
+            return e
+
+    decoded = list(get_decode_pool().map(decode, items))
+    lines: List[Optional[dict]] = [None] * len(items)
+
+    valid = []
+    for i, (item, image) in enumerate(zip(items, decoded)):
+        if isinstance(image, UploadRejected):
+            lines[i] = batch_error(item[0], item[1], str(image))
+        else:
+            valid.append(i)
+
+    def detect(indices: List[int]) -> List[dict]:
+        return detect_currency_batch(
+            [decoded[i].image for i in indices],
+            preprocessing=preprocessing,
+            use_roi_cascade=USE_ROI_CASCADE,
+            use_tiling=USE_TILING,
+            speculative=SPECULATIVE_DETECTION,
+            type_hint=type_hint
+        )
+
+    results: Dict[int, dict] = {}
+    errors: Dict[int, str] = {}
+    if valid:
+        try:
+            results = dict(zip(valid, detect(valid)))
+        except Exception:
+            logger.exception(f"Batched detection of {len(valid)} images failed, retrying one by one")
+            # One bad image must not fail the others
+            for i in valid:
+                try:
+                    results[i] = detect([i])[0]
+                except Exception as e:
+                    logger.exception(f"Detection of batch image {items[i][0]} failed")
+                    errors[i] = str(e)
+
+    for i in valid:
+        result = results.get(i)
+        if result is not None and decoded[i].scale != 1.0:
+            scale_detections(result['detections'], decoded[i].scale, decoded[i].scale)
+        lines[i] = {'index': items[i][0], 'filename': items[i][1],
+                    **format_result(result, errors.get(i))}
+
+    return lines
+
+
+class BatchSummary:
+    """Running totals of a /detect/batch request"""
+
+    def __init__(self):
+        self.images = 0
+        self.failed = 0
+        self.detections = 0
+        self.counts: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+
+    def add(self, line: dict) -> None:
+        self.images += 1
+        if 'error' in line:
+            self.failed += 1
+            return
+        for det in line['detections']:
+            self.detections += 1
+            self.counts[det['class_name']] = self.counts.get(det['class_name'], 0) + 1
+            value = denomination(det['class_name'])
+            if value is not None:
+                self.totals[det['type']] = self.totals.get(det['type'], 0) + value
+
+    def to_dict(self) -> dict:
+        return {
+            'summary': True,
+            'images': self.images,
+            'failed': self.failed,
+            'detections': self.detections,
+            'counts': self.counts,
+            'total_by_type': self.totals,
+            'total': sum(self.totals.values())
+        }
+
+
+def ndjson_line(data: dict) -> bytes:
+    return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+async def stream_batch(chunks: List[List[Tuple[int, str, bytes]]], rejected: List[dict],
+                       preprocessing: Optional[str], type_hint: Optional[str] = None):
+    """
+    Run the chunks of a batch and yield NDJSON lines as chunks finish
+
+    At most one chunk per pool worker is in flight so a large batch does
+    not fill the pool queue that /detect also uses.
+    """
+    pool = get_inference_pool()
+    slots = asyncio.Semaphore(pool.max_workers)
+
+    async def run(chunk):
+        async with slots:
+            try:
+                return await pool.run(
+                    detect_chunk, chunk, preprocessing, type_hint, timeout=DETECT_TIMEOUT
+                )
+            except PoolBusyError:
+                message = "Server is busy, try again shortly"
+            except asyncio.TimeoutError:
+                message = "Detection timed out"
+            return [batch_error(index, name, message) for index, name, _ in chunk]
+
+    tasks = [asyncio.ensure_future(run(chunk)) for chunk in chunks]
+    summary = BatchSummary()
+    try:
+        for line in rejected:
+            summary.add(line)
+            yield ndjson_line(line)
+
+        for finished in asyncio.as_completed(tasks):
+            for line in await finished:
+                summary.add(line)
+                yield ndjson_line(line)
+
+        yield ndjson_line(summary.to_dict())
+    finally:
+        # Client went away: drop the chunks that have not started yet
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/detect/batch")
+async def detect_batch(files: List[UploadFile] = File(...),
+                       preprocessing: Optional[str] = None,
+                       hint: Optional[str] = None):
+    """
+    Detect currency in many images (several files and/or zip archives)
+
+    Streams one NDJSON line per image as soon as its chunk is done
+    (lines carry the image 'index' and 'filename', order is not
+    guaranteed), followed by a summary line with the detection counts
+    and the total value in denars.
+
+    Args:
+        files: Image files or zip archives of images
+        preprocessing: Preprocessing profile ('none', 'clahe_only', 'fast', 'full')
+        hint: Likely currency type ('coin' or 'note'); with speculative
+            detection its model runs first
+    """
+    require_models()
+    if preprocessing is not None and preprocessing not in PREPROCESSING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"preprocessing must be one of {', '.join(PREPROCESSING_PROFILES)}"
+        )
+    if hint is not None and hint not in SPECIFIC_MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"hint must be one of {', '.join(SPECIFIC_MODELS)}"
+        )
+
+    items: List[Tuple[int, str, bytes]] = []
+    rejected: List[dict] = []
+    received = 0
+    # Bytes of all images after zip expansion, capped like the upload
+    image_bytes = 0
+
+    for upload in files:
+        # Read one byte past the remaining budget to detect oversized batches
+        contents = await upload.read(BATCH_MAX_UPLOAD_SIZE - received + 1)
+        received += len(contents)
+        if received > BATCH_MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch is larger than {BATCH_MAX_UPLOAD_SIZE / (1024 * 1024):g} MB"
+            )
+
+        if is_zip(contents, upload.filename):
+            try:
+                # Only what is left of the batch budget may be inflated
+                entries = expand_zip(
+                    contents, ALLOWED_EXTENSIONS,
+                    BATCH_MAX_FILES - len(items) - len(rejected), MAX_IMAGE_SIZE,
+                    BATCH_MAX_UPLOAD_SIZE - image_bytes
+                )
+            except UploadRejected as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{upload.filename}: {e}")
+        else:
+            entries = [(upload.filename, contents)]
+
+        image_bytes += sum(len(data) for _, data in entries)
+        if image_bytes > BATCH_MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch is larger than {BATCH_MAX_UPLOAD_SIZE / (1024 * 1024):g} MB"
+            )
+
+        for name, data in entries:
+            index = len(items) + len(rejected)
+            try:
+                validate_upload(data, name, MAX_IMAGE_SIZE, ALLOWED_EXTENSIONS)
+                items.append((index, name, data))
+            except UploadRejected as e:
+                rejected.append(batch_error(index, name, str(e)))
+
+        if len(items) + len(rejected) > BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"A batch can contain at most {BATCH_MAX_FILES} images"
+            )
+
+    chunks = [items[i:i + BATCH_MAX_SIZE] for i in range(0, len(items), BATCH_MAX_SIZE)]
+    return StreamingResponse(
+        stream_batch(chunks, rejected, preprocessing, hint),
+        media_type="application/x-ndjson"
+    )
+
+
+def detect_frame(image: np.ndarray, preprocessing: Optional[str] = None,
+                 type_hint: Optional[str] = None) -> dict:
+    """Full cascade on one decoded stream frame (runs in the worker pool)"""
+    return detect_currency(
+        image, preprocessing=preprocessing, use_roi_cascade=USE_ROI_CASCADE,
+        speculative=SPECULATIVE_DETECTION, type_hint=type_hint
+    )
+
+
+def scaled_detections(detections: List[dict], scale: float) -> List[dict]:
+    """Copies of the detections with boxes in full-resolution coordinates"""
+    scaled = [dict(det) for det in detections]
+    if scale != 1.0:
+        scale_detections(scaled, scale, scale)
+    return scaled
+
+
+async def process_stream_frame(contents: bytes, tracker: BoxTracker,
+                               preprocessing: Optional[str],
+                               prior: Optional[TypePrior] = None) -> Tuple[dict, bool]:
+    """
+    Detect or track one stream frame
+
+    Args:
+        prior: Currency types of this stream's earlier frames, the type
+            hint when the previous frame had no single type
+
+    Returns:
+        (message without stats, whether the full cascade ran)
+
+    Raises:
+        UploadRejected: If the frame fails the same checks as an upload
+        Exception: Whatever detection raised; the tracker and prior are
+            left untouched
+    """
+    # Frames are uploads too: refuse oversized or non-image bytes before decoding
+    header = validate_upload(contents, None, MAX_IMAGE_SIZE, ALLOWED_EXTENSIONS)
+    decoded = await asyncio.to_thread(decode_upload, contents, IMAGE_SIZE, False, header)
+    gray = cv2.cvtColor(decoded.image, cv2.COLOR_BGR2GRAY)
+
+    full_detection = tracker.needs_detection(gray)
+    if full_detection:
+        # The type of the previous frame is the likely one for this frame
+        previous = {det['type'] for det in tracker.detections}
+        if len(previous) == 1:
+            hint = previous.pop()
+        else:
+            hint = prior.likely() if prior is not None else None
+        result = await get_inference_pool().run(
+            detect_frame, decoded.image, preprocessing, hint, timeout=DETECT_TIMEOUT
+        )
+        payload = format_result(result)
+        detections = tracker.reset(gray, payload['detections'])
+        if prior is not None:
+            prior.update(det['type'] for det in detections)
+    else:
+        detections = await asyncio.to_thread(tracker.propagate, gray)
+
+    types = {det['type'] for det in detections}
+    return {
+        'mode': 'detect' if full_detection else 'track',
+        'type': types.pop() if len(types) == 1 else ('mixed' if types else None),
+        'detections': scaled_detections(detections, decoded.scale),
+        'count': len(detections)
+    }, full_detection
+
+
+@app.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket, preprocessing: Optional[str] = None,
+                        full_every: int = STREAM_FULL_EVERY):
+    """
+    Detect currency in a stream of JPEG frames (binary messages)
+
+    Frames that arrive while the previous one is still being processed
+    replace each other, only the newest is processed. The full cascade
+    runs every full_every frames or when the scene changes; in between
+    the boxes are moved with optical flow. Every processed frame gets a
+    JSON message with its detections, 'mode' ('detect' or 'track'),
+    the achieved 'fps', 'latency_ms' from arrival to answer and the
+    number of 'dropped' frames so far.
+
+    Detections are also voted over the last frames; when the stable set
+    of denominations changes, the message carries an 'announcement'
+    with the text to speak (audio from /speak), its 'counts' and
+    smoothed 'detections'.
+    """
+    await websocket.accept()
+    if preprocessing is not None and preprocessing not in PREPROCESSING_PROFILES:
+        await websocket.close(code=1008, reason="Unknown preprocessing profile")
+        return
+    if models_loading():
+        # 1013: try again later
+        await websocket.close(code=1013, reason="Models are still loading")
+        return
+
+    slot = LatestFrameSlot()
+    stats = StreamStats()
+    tracker = BoxTracker(full_every, STREAM_SCENE_THRESHOLD)
+    prior = TypePrior()
+    stabilizer = DetectionStabilizer(STABILIZER_WINDOW, STABILIZER_MIN_SHARE, STABILIZER_DEBOUNCE)
+
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('bytes'):
+                    slot.put((time.perf_counter(), slot.received, message['bytes']))
+        finally:
+            slot.close()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            item = await slot.get()
+            if item is None:
+                break
+            received_at, frame_index, contents = item
+
+            try:
+                message, full_detection = await process_stream_frame(
+                    contents, tracker, preprocessing, prior
+                )
+            except UploadRejected as e:
+                message, full_detection = {'error': str(e)}, False
+            except (PoolBusyError, asyncio.TimeoutError):
+                # Skip this frame; the next one is already waiting
+                message, full_detection = {'error': 'Server is busy'}, False
+            except Exception as e:
+                # Tracks, prior and stabilizer keep their state from the last good frame
+                logger.exception(f"Detection of stream frame {frame_index} failed")
+                message, full_detection = {'error': str(e) or 'Detection failed'}, False
+
+            if 'error' not in message:
+                announcement = stabilizer.update(message['detections'])
+                if announcement is not None:
+                    message['announcement'] = {
+                        'text': get_tts().generate_currency_message(announcement),
+                        'counts': announcement['counts'],
+                        'detections': announcement['detections']
+                    }
+
+            message['frame'] = frame_index
+            message.update(stats.record(received_at, full_detection))
+            message['dropped'] = slot.dropped
+            await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+
+@app.get("/speak")
+async def speak(text: str = Query(..., min_length=1, max_length=TTS_MAX_TEXT_LENGTH),
+                language: Optional[str] = None):
+    """
+    Synthesize text, e.g. a stream 'announcement', and stream the audio
+
+    The response is chunked: audio is passed on while the synthesizer is
+    still producing it, cached phrases are sent at once.
+    """
+    if not TTS_ENABLED:
+        raise HTTPException(status_code=503, detail="Text-to-speech is disabled")
+    if language is not None and language not in VOICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown language '{language}'. Use one of {sorted(VOICES)}"
+        )
+
+    tts = get_tts()
+    audio = tts.stream(text, VOICES[language] if language else None)
+
+    # Wait for the first chunk so synthesis errors still get a status code
+    try:
+        first = await audio.__anext__()
+    except StopAsyncIteration:
+        first = b''
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Speech synthesis failed: {e}")
+
+    async def body():
+        yield first
+        async for chunk in audio:
+            yield chunk
+
+    return StreamingResponse(body(), media_type=tts.synthesizer.media_type)
+
+
 def extract_currency_image(image: np.ndarray, bbox: List[float], currency_type: str) -> np.ndarray:
     """
     Extract individual currency image from detection
@@ -0,0 +1,208 @@
+"""
+INT8 post-training quantization with an accuracy gate
+Usage: python quantize_models.py [--models binary coin] [--tolerance 0.01]
+
+For every trained detector in yolov8_training/models:
+  1. export an FP32 ONNX model
+  2. calibrate on a sample of datasets/<name>/val/images and write an
+     INT8 (QDQ) ONNX model
+  3. evaluate mAP50 of both on the test split
+  4. publish <name>_model_int8.onnx to app/models only if the mAP50 drop
+     is within the tolerance
+
+A JSON report with mAP50, latency and model size before/after is written
+so the INT8 model can be enabled per model (INT8_MODELS in config.py).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import MODEL_DIR, DATASET_DIR, IMAGE_SIZE
+from utils.backends import OnnxBackend
+from utils.evaluation import (
+    evaluate_detections, list_split, load_class_names, load_yolo_labels
+)
+from utils.preprocess import letterbox
+
+TRAINING_MODELS_DIR = os.path.join(os.path.dirname(DATASET_DIR), "models")
+
+# model name -> (training folder, weights sub-path, dataset folder)
+MODELS = {
+    'binary': ('binary_detector', 'weights/weights/best.pt', 'binary'),
+    'banknote': ('banknote_detector', 'weights/best.pt', 'banknote'),
+    'coin': ('coin_detector_150', 'weights/best.pt', 'coin'),
+}
+
+
+class ValCalibrationReader:
+    """onnxruntime CalibrationDataReader over letterboxed val images"""
+
+    def __init__(self, input_name: str, image_paths, size: int):
+        self.input_name = input_name
+        self.image_paths = list(image_paths)
+        self.size = size
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        for path in self._iter:
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            padded, _, _ = letterbox(image, self.size)
+            blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+            blob = np.ascontiguousarray(blob, dtype=np.float32)[None] / 255.0
+            return {self.input_name: blob}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def export_fp32(weights: str, work_dir: Path, name: str) -> Path:
+    from ultralytics import YOLO
+
+    exported = YOLO(weights).export(
+        format='onnx', imgsz=IMAGE_SIZE, dynamic=False, simplify=True,
+        opset=13, device='cpu'
+    )
+    destination = work_dir / f"{name}_fp32.onnx"
+    shutil.move(str(exported), destination)
+    return destination
+
+
+def quantize(fp32_path: Path, int8_path: Path, dataset: str, samples: int) -> None:
+    import onnxruntime as ort
+    from onnxruntime.quantization import (
+        QuantFormat, QuantType, quantize_static
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = fp32_path.with_name(fp32_path.stem + '_prep.onnx')
+    quant_pre_process(str(fp32_path), str(prepared))
+
+    input_name = ort.InferenceSession(
+        str(prepared), providers=['CPUExecutionProvider']
+    ).get_inputs()[0].name
+
+    val_images = [image for image, _ in list_split(
+        os.path.join(DATASET_DIR, dataset), 'val', limit=samples
+    )]
+    reader = ValCalibrationReader(input_name, val_images, IMAGE_SIZE)
+
+    quantize_static(
+        str(prepared),
+        str(int8_path),
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    prepared.unlink(missing_ok=True)
+
+
+def evaluate(model_path: Path, dataset: str, iou: float = 0.6) -> dict:
+    """mAP50 and median latency of an ONNX model on the test split"""
+    model = OnnxBackend(str(model_path))
+    dataset_dir = os.path.join(DATASET_DIR, dataset)
+    names = load_class_names(dataset_dir)
+
+    predictions, ground_truths, latencies = [], [], []
+    for image_path, label_path in list_split(dataset_dir, 'test'):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+
+        start = time.perf_counter()
+        predictions.append(model.predict([image], conf=0.001, iou=iou)[0].to_dicts())
+        latencies.append(time.perf_counter() - start)
+
+        ground_truths.append([
+            (names[class_id], box) for class_id, box in load_yolo_labels(label_path, w, h)
+        ])
+
+    metrics = evaluate_detections(predictions, ground_truths)
+    return {
+        'map50': metrics['map50'],
+        'precision': metrics['precision'],
+        'recall': metrics['recall'],
+        'latency_ms': float(np.median(latencies) * 1000) if latencies else None,
+        'size_mb': model_path.stat().st_size / (1024 * 1024)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='maximum allowed absolute mAP50 drop')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--work-dir', default=os.path.join(MODEL_DIR, 'quantization'))
+    parser.add_argument('--report', default=None,
+                        help='JSON report path (default: <work-dir>/report.json)')
+    args = parser.parse_args()
+
+    work_dir = Path(args.work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    print("=" * 60)
+    print("INT8 POST-TRAINING QUANTIZATION")
+    print("=" * 60)
+
+    report = {'tolerance': args.tolerance, 'models': {}}
+    for name in args.models:
+        folder, weights_subpath, dataset = MODELS[name]
+        weights = os.path.join(TRAINING_MODELS_DIR, folder, weights_subpath)
+        print(f"\n{name}:")
+
+        if not os.path.exists(weights):
+            print(f"   ❌ Source not found: {weights}")
+            report['models'][name] = {'error': 'weights not found'}
+            continue
+
+        fp32_path = export_fp32(weights, work_dir, name)
+        int8_path = work_dir / f"{name}_int8.onnx"
+        quantize(fp32_path, int8_path, dataset, args.calibration_samples)
+
+        fp32 = evaluate(fp32_path, dataset)
+        int8 = evaluate(int8_path, dataset)
+        drop = fp32['map50'] - int8['map50']
+        accepted = drop <= args.tolerance
+
+        print(f"   mAP50:   {fp32['map50']:.4f} -> {int8['map50']:.4f} (drop {drop:+.4f})")
+        print(f"   Latency: {fp32['latency_ms']:.1f} ms -> {int8['latency_ms']:.1f} ms")
+        print(f"   Size:    {fp32['size_mb']:.1f} MB -> {int8['size_mb']:.1f} MB")
+
+        if accepted:
+            destination = os.path.join(MODEL_DIR, f"{name}_model_int8.onnx")
+            shutil.copy2(int8_path, destination)
+            print(f"   ✅ Published: {destination}")
+        else:
+            print(f"   ❌ Rejected: mAP50 drop exceeds {args.tolerance:.4f}")
+
+        report['models'][name] = {
+            'fp32': fp32,
+            'int8': int8,
+            'map50_drop': drop,
+            'published': accepted
+        }
+
+    report_path = Path(args.report) if args.report else work_dir / 'report.json'
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"\n📄 Report: {report_path}")
+
+    if any(not m.get('published', False) for m in report['models'].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
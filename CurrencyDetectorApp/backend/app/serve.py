@@ -0,0 +1,173 @@
+"""
+Multi-worker server with models shared between the workers
+Usage: python serve.py [--workers 4] [--threads 2] [--host 0.0.0.0] [--port 8000]
+
+`uvicorn --workers N` starts N interpreters that each import torch and
+load all three models. Here the parent process loads the models once,
+fuses them (ultralytics would otherwise fuse Conv+BN on the first
+predict in every worker, allocating new weight tensors there), freezes
+the garbage collector so the loaded objects are never written to again,
+binds the listening socket and then forks the workers. The workers
+share the model pages copy-on-write and accept connections on the
+inherited socket. Every worker logs its memory after warm-up and /ready
+reports it: 'private' is what one more worker costs, the shared weights
+show up under 'shared'.
+
+Only the torch backend is preloaded. onnxruntime sessions and compiled
+OpenVINO models start their thread pools when they are built, and those
+threads do not survive fork(); with those backends every worker loads
+its own models after the fork (the exports are small).
+
+Every worker runs with --threads intra-op threads (default: cores divided
+by workers) so the workers do not oversubscribe the CPU.
+
+The parent must not run inference before forking: thread pools created
+by torch/OpenMP do not survive fork(). Per-process initialization (model
+warm-up, worker pool, batching, TTS) happens in each worker's startup hook.
+
+Needs os.fork() (Linux, macOS); on Windows use uvicorn --workers.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import uvicorn
+
+
+def parse_args():
+    # Defaults are read from config after the thread variables are set
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: SERVE_WORKERS)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='intra-op threads per worker (default: INTRA_OP_THREADS, '
+                             'or cores / workers when that is 0)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--log-level', default='info')
+    return parser.parse_args()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Listening socket inherited by all workers"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, threads: int, log_level: str) -> None:
+    """Serve the app on the shared socket (called in the forked child)"""
+    from main import app
+    from utils.backends import configure_threads
+
+    configure_threads(threads)
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, threads: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, threads, log_level)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    if not hasattr(os, 'fork'):
+        print("❌ serve.py needs os.fork(); use 'uvicorn main:app --workers N' instead")
+        sys.exit(1)
+
+    args = parse_args()
+
+    from config import INTRA_OP_THREADS, SERVE_WORKERS
+    workers = args.workers or SERVE_WORKERS
+    threads = args.threads or INTRA_OP_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+    # OpenMP / MKL read these when torch initializes its thread pools
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ.setdefault(var, str(threads))
+
+    from config import (
+        BINARY_IMAGE_SIZE, DEVICE, INFERENCE_BACKEND, LAZY_SPECIFIC_MODELS, MODEL_PATHS,
+        PREPROCESSING_PROFILE
+    )
+    from utils.inference import init_detector
+
+    print("=" * 60)
+    print(f"MKD Currency Detector: {workers} workers x {threads} threads")
+    print("=" * 60)
+
+    if INFERENCE_BACKEND == 'torch':
+        start = time.perf_counter()
+        detector = init_detector(MODEL_PATHS, device=DEVICE,
+                                 preprocessing_profile=PREPROCESSING_PROFILE,
+                                 backend=INFERENCE_BACKEND, num_threads=threads,
+                                 lazy_specific=LAZY_SPECIFIC_MODELS,
+                                 binary_image_size=BINARY_IMAGE_SIZE)
+        detector.fuse_models()
+        print(f"✅ Models loaded in {time.perf_counter() - start:.1f}s: {', '.join(detector.models)}")
+    else:
+        print(f"ℹ️ {INFERENCE_BACKEND} sessions are not fork-safe, every worker loads its own models")
+
+    # Import the app before forking as well, so its modules are shared too
+    import main as _app_module  # noqa: F401
+
+    # Move everything allocated so far out of the GC's reach: collections
+    # would otherwise touch every object header and unshare the pages
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(f"🚀 Listening on {args.host}:{args.port}")
+
+    children = {spawn(sock, threads, args.log_level) for _ in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting")
+            time.sleep(1)
+            children.add(spawn(sock, threads, args.log_level))
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
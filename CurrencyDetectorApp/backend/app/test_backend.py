@@ -86,6 +86,84 @@ class TestPreprocessing:
             processed = preprocess_image(img, target_size=640)
             assert processed.shape[:2] == (640,640)
 
+    def test_preprocessing_profiles(self):
+        import numpy as np
+        from utils.inference import PREPROCESSING_PROFILES
+        img = np.full((1080, 1920, 3), 128, dtype=np.uint8)
+        for profile in PREPROCESSING_PROFILES:
+            processed = detector.preprocess_image(img, profile)
+            if profile == 'none':
+                assert processed.shape == img.shape
+            else:
+                assert max(processed.shape[:2]) == 640
+
+    def test_unknown_profile_rejected(self):
+        import numpy as np
+        with pytest.raises(ValueError):
+            detector.detect(np.zeros((64, 64, 3), dtype=np.uint8), preprocessing='bogus')
+
+# ============================================================================
+# UNIT TESTS - Ingestion
+# ============================================================================
+class TestIngest:
+    def _jpeg(self, size, orientation=1):
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        buf = io.BytesIO()
+        Image.new('RGB', size, color='red').save(buf, format='JPEG', exif=exif)
+        return buf.getvalue()
+
+    def test_reduced_decode(self):
+        from utils.ingest import decode_upload
+        decoded = decode_upload(self._jpeg((4000, 3000)), target_size=640)
+        assert decoded.image.shape[:2] == (750, 1000)
+        assert decoded.scale == 4.0
+        assert decoded.full_image is None
+
+    def test_full_res_when_requested(self):
+        from utils.ingest import decode_upload
+        decoded = decode_upload(self._jpeg((1600, 1200)), keep_full_res=True)
+        assert decoded.image.shape[:2] == (1200, 1600)
+        assert decoded.full_image is decoded.image
+
+    def test_exif_orientation(self):
+        from utils.ingest import decode_upload
+        decoded = decode_upload(self._jpeg((1600, 1200), orientation=6), keep_full_res=True)
+        assert decoded.image.shape[:2] == (1600, 1200)
+
+    def test_validate_upload(self):
+        from utils.ingest import validate_upload, UploadRejected
+        data = self._jpeg((64, 64))
+        assert validate_upload(data, 'a.jpg', 1024 * 1024, {'.jpg'}).format == 'JPEG'
+        with pytest.raises(UploadRejected) as e:
+            validate_upload(data, 'a.jpg', 10, {'.jpg'})
+        assert e.value.status_code == 413
+        with pytest.raises(UploadRejected):
+            validate_upload(data, 'a.gif', 1024 * 1024, {'.jpg'})
+        with pytest.raises(UploadRejected):
+            validate_upload(b'not an image', 'a.jpg', 1024 * 1024, {'.jpg'})
+
+    def test_expand_zip(self):
+        import zipfile
+        from utils.ingest import expand_zip, is_zip, UploadRejected
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as archive:
+            archive.writestr('photos/a.jpg', self._jpeg((64, 64)))
+            archive.writestr('notes.txt', 'skipped')
+        data = buf.getvalue()
+
+        assert is_zip(data)
+        assert [name for name, _ in expand_zip(data, {'.jpg'}, 10, 1024 * 1024)] == ['photos/a.jpg']
+        with pytest.raises(UploadRejected):
+            expand_zip(data, {'.jpg'}, 10, 10)
+        with pytest.raises(UploadRejected):
+            expand_zip(b'PK\x03\x04broken', {'.jpg'}, 10, 1024 * 1024)
+        with pytest.raises(UploadRejected) as e:
+            expand_zip(data, {'.jpg'}, 10, 1024 * 1024, max_total_bytes=10)
+        assert e.value.status_code == 413
+        with pytest.raises(UploadRejected):
+            expand_zip(data, {'.jpg'}, 0, 1024 * 1024)
+
 # ============================================================================
 # UNIT TESTS - Inference
 # ============================================================================
@@ -110,6 +188,351 @@ class TestInference:
         assert result["type"] in (None, "banknote", "coin")
         assert isinstance(result["detections"], list)
 
+class FakeBackend:
+    """Backend stand-in returning fixed boxes (relative to each input image)"""
+
+    def __init__(self, names, rows):
+        self.names = names
+        self.rows = rows
+        self.calls = []
+
+    def predict(self, images, conf, iou, imgsz=None):
+        from utils.detections import Detections
+        self.calls.append({'count': len(images), 'imgsz': imgsz})
+        batch = []
+        for image in images:
+            h, w = image.shape[:2]
+            batch.append(Detections(
+                [[x1 * w, y1 * h, x2 * w, y2 * h] for x1, y1, x2, y2, _, _ in self.rows],
+                [row[4] for row in self.rows],
+                [row[5] for row in self.rows],
+                self.names
+            ))
+        return batch
+
+
+class TestRoiCascade:
+    def test_specific_model_runs_on_crops(self):
+        import numpy as np
+        from utils.inference import CurrencyDetector
+        det = CurrencyDetector({}, device='cpu')
+        det.models['binary'] = FakeBackend({0: 'coin', 1: 'note'}, [
+            (0.1, 0.1, 0.2, 0.2, 0.9, 0),
+            (0.6, 0.6, 0.7, 0.7, 0.8, 0),
+        ])
+        det.models['coin'] = FakeBackend({0: '10_coin'}, [(0.2, 0.2, 0.8, 0.8, 0.85, 0)])
+
+        result = det.detect(np.zeros((1000, 1000, 3), np.uint8), use_roi_cascade=True)
+
+        assert result['success']
+        assert len(result['detections']) == 2
+        assert det.models['coin'].calls == [{'count': 2, 'imgsz': det.roi_image_size}]
+        # Boxes come back in full-image coordinates, inside the binary boxes
+        x1, y1, x2, y2 = result['detections'][0]['bbox']
+        assert 100 <= x1 < x2 <= 200 and 100 <= y1 < y2 <= 200
+
+    def test_tiled_detection(self):
+        import numpy as np
+        from utils.inference import CurrencyDetector
+        det = CurrencyDetector({}, device='cpu')
+        det.models['binary'] = FakeBackend({0: 'coin', 1: 'note'}, [(0.4, 0.4, 0.6, 0.6, 0.9, 0)])
+        det.models['coin'] = FakeBackend({0: '10_coin'}, [(0.4, 0.4, 0.6, 0.6, 0.85, 0)])
+
+        # Small images keep the single pass
+        assert len(det.tile_windows(1000, 1200)) == 1
+        det.detect(np.zeros((1000, 1200, 3), np.uint8), use_tiling=True)
+        assert det.models['binary'].calls[-1]['count'] == 1
+
+        windows = det.tile_windows(3000, 4000)
+        assert 1 < len(windows) <= det.tile_max_count
+        assert windows[:, 2].max() == 4000 and windows[:, 3].max() == 3000
+
+        result = det.detect(np.zeros((3000, 4000, 3), np.uint8), use_tiling=True)
+        # All tiles in one binary call, one coin in the middle of every tile
+        assert det.models['binary'].calls[-1]['count'] == len(windows)
+        assert result['success'] and len(result['detections']) == len(windows)
+        centers = [((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in
+                   (d['bbox'] for d in result['detections'])]
+        expected = [((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in windows.tolist()]
+        assert sorted(np.round(centers).tolist()) == sorted(np.round(expected).tolist())
+
+
+class TestMixedScenes:
+    def _detector(self):
+        from utils.inference import CurrencyDetector
+        det = CurrencyDetector({}, device='cpu')
+        det.models['binary'] = FakeBackend({0: 'coin', 1: 'note'}, [
+            (0.05, 0.05, 0.15, 0.15, 0.9, 0),
+            (0.4, 0.4, 0.9, 0.7, 0.8, 1),
+        ])
+        det.models['coin'] = FakeBackend({0: '10_coin'}, [(0.05, 0.05, 0.15, 0.15, 0.85, 0)])
+        det.models['banknote'] = FakeBackend({0: '100_note'}, [(0.4, 0.4, 0.9, 0.7, 0.75, 0)])
+        return det
+
+    def test_coins_and_notes_in_one_photo(self):
+        import numpy as np
+        det = self._detector()
+        result = det.detect(np.zeros((640, 640, 3), np.uint8))
+        assert result['success']
+        assert result['type'] == 'mixed'
+        assert {d['type'] for d in result['detections']} == {'coin', 'note'}
+        assert len(det.models['coin'].calls) == 1
+        assert len(det.models['banknote'].calls) == 1
+
+    def test_missing_model_keeps_other_type(self):
+        import numpy as np
+        det = self._detector()
+        del det.models['banknote']
+        result = det.detect(np.zeros((640, 640, 3), np.uint8))
+        assert result['success']
+        assert result['type'] == 'coin'
+
+    def test_low_res_binary_escalates_ambiguous_images(self):
+        import numpy as np
+        det = self._detector()
+        det.binary_image_size = 320
+        image = np.zeros((640, 640, 3), np.uint8)
+
+        # Confident boxes: the low-res pass is enough
+        result = det.detect(image)
+        assert result['type'] == 'mixed'
+        assert [c['imgsz'] for c in det.models['binary'].calls] == [320]
+        assert det.models['coin'].calls[-1]['imgsz'] == 640
+
+        # A weak box is confirmed at full size, for that image only
+        det.models['binary'].rows[0] = (0.05, 0.05, 0.15, 0.15, 0.5, 0)
+        det.detect_batch([image, image])
+        assert det.models['binary'].calls[1:] == [
+            {'count': 2, 'imgsz': 320}, {'count': 2, 'imgsz': 640}
+        ]
+        assert (det.binary_low_res, det.binary_escalations) == (3, 2)
+
+    def test_binary_escalation_rate(self):
+        import numpy as np
+        from utils.detections import Detections
+        det = self._detector()
+        det.binary_image_size = 320
+        names = {0: 'coin', 1: 'note'}
+        low_res = [
+            Detections([[0, 0, 10, 10], [20, 20, 60, 40]], [0.9, 0.8], [0, 1], names),  # clear
+            Detections.empty(names),                                                     # nothing found
+            Detections([[0, 0, 10, 10]], [0.4], [0], names),                             # weak box
+            Detections([[0, 0, 40, 40], [1, 1, 40, 40]], [0.9, 0.9], [0, 1], names),     # coin and note disagree
+            Detections([[0, 0, 10, 10], [0, 0, 11, 11]], [0.9, 0.7], [0, 0], names),     # duplicate coin
+        ]
+        assert [det.binary_ambiguous(d) for d in low_res] == [False, True, True, True, False]
+
+        calls = []
+
+        def fake_filter(images, model, threshold, imgsz):
+            calls.append((len(images), imgsz))
+            return list(low_res) if imgsz == 320 else [Detections.empty(names)] * len(images)
+
+        det.detect_batch_with_confidence_filter = fake_filter
+        images = [np.zeros((64, 64, 3), np.uint8)] * len(low_res)
+        for _ in range(2):
+            result = det.detect_binary(images)
+        assert calls[:2] == [(5, 320), (3, 640)]
+        assert [len(d) for d in result] == [2, 0, 0, 0, 2]
+        assert det.binary_escalations / det.binary_low_res == 3 / 5
+
+    def test_speculative_ordering(self):
+        import numpy as np
+        det = self._detector()
+        image = np.zeros((640, 640, 3), np.uint8)
+
+        # Confident coin model: answered by that single pass
+        result = det.detect(image, speculative=True, type_hint='coin')
+        assert result['type'] == 'coin' and len(result['detections']) == 1
+        assert det.models['binary'].calls == []
+        assert det.path_counts == {'cascade': 0, 'speculative': 1, 'fallback': 0}
+
+        # Uncertain banknote model: falls back to the binary-first cascade
+        det.models['banknote'].rows[0] = (0.4, 0.4, 0.9, 0.7, 0.5, 0)
+        result = det.detect(image, speculative=True, type_hint='note')
+        assert result['type'] == 'mixed'
+        assert len(det.models['binary'].calls) == 1
+        assert det.path_counts['fallback'] == 1
+
+        # Without a hint nothing is speculated on
+        det.detect(image, speculative=True)
+        assert len(det.models['binary'].calls) == 2
+        assert det.path_counts['cascade'] == 1
+
+    def test_type_prior_is_per_client(self):
+        from utils.inference import TypePrior
+        stream, other = TypePrior(), TypePrior()
+        assert stream.likely() is None
+        for _ in range(3):
+            stream.update(['coin', 'coin'])
+        stream.update(['note'])
+        assert stream.likely() == 'coin'
+        assert other.likely() is None
+
+    def test_path_counts_survive_concurrent_updates(self):
+        from concurrent.futures import ThreadPoolExecutor
+        det = self._detector()
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: det._count_path('speculative', 1), range(4000)))
+        assert det.path_counts['speculative'] == 4000
+
+    def test_lazy_specific_models_and_warm_up(self, monkeypatch):
+        import numpy as np
+        from utils import inference
+        fakes = {
+            'binary': FakeBackend({0: 'coin', 1: 'note'}, [(0.05, 0.05, 0.15, 0.15, 0.9, 0)]),
+            'banknote': FakeBackend({0: '100_note'}, []),
+            'coin': FakeBackend({0: '10_coin'}, [(0.05, 0.05, 0.15, 0.15, 0.85, 0)]),
+        }
+        monkeypatch.setattr(inference, 'load_model', lambda path, *args: fakes[path])
+        det = inference.CurrencyDetector({name: name for name in fakes}, device='cpu',
+                                         preprocessing_profile='none', lazy_specific=True)
+        assert list(det.models) == ['binary']
+
+        assert set(det.warm_up()) == {'binary'}
+        status = det.model_status()
+        assert status['binary']['warmed'] and status['coin']['lazy']
+
+        result = det.detect(np.zeros((640, 640, 3), np.uint8))
+        assert result['type'] == 'coin'
+        assert set(det.models) == {'binary', 'coin'}
+        assert not det.model_status()['coin']['lazy']
+
+# ============================================================================
+# UNIT TESTS - Inference backends
+# ============================================================================
+class TestBackends:
+    def test_nms(self):
+        import numpy as np
+        from utils.boxes import nms, batched_nms
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30]], dtype=float)
+        scores = np.array([0.9, 0.8, 0.7])
+        assert nms(boxes, scores, 0.5).tolist() == [0, 2]
+        assert batched_nms(boxes, scores, np.array([0, 1, 0]), 0.5).tolist() == [0, 1, 2]
+
+    def test_merge_boxes_across_seams(self):
+        import numpy as np
+        from utils.boxes import merge_boxes
+        # A coin cut by a tile border, its full box and another coin
+        boxes = np.array([[0, 0, 50, 100], [0, 0, 100, 100], [200, 0, 300, 100]], dtype=float)
+        scores = np.array([0.6, 0.9, 0.8])
+        keep, merged = merge_boxes(boxes, scores, np.array([0, 0, 0]), 0.6)
+        assert keep.tolist() == [1, 2]
+        assert merged[0].tolist() == [0, 0, 100, 100]
+
+        keep, merged = merge_boxes(boxes, scores, np.array([0, 0, 0]), 0.6, method='wbf')
+        assert keep.tolist() == [1, 2]
+        assert merged[0][2] == (50 * 0.6 + 100 * 0.9) / 1.5
+        # Different classes are never merged
+        assert merge_boxes(boxes, scores, np.array([0, 1, 0]), 0.6)[0].tolist() == [1, 2, 0]
+
+    def test_fuse_models_before_fork(self):
+        from utils.inference import CurrencyDetector
+        from utils.telemetry import memory_usage
+        fused = []
+
+        class Fusable(FakeBackend):
+            def fuse(self):
+                fused.append(self)
+
+        det = CurrencyDetector({}, device='cpu')
+        det.models['binary'] = Fusable({0: 'coin'}, [])
+        det.models['coin'] = FakeBackend({0: '10_coin'}, [])
+        det.fuse_models()
+        assert fused == [det.models['binary']]
+
+        memory = memory_usage()
+        if memory is not None:
+            assert memory['private'] + memory['shared'] == pytest.approx(memory['rss'], abs=1)
+
+    def test_exported_postprocess_undoes_letterbox(self):
+        import numpy as np
+        from utils.backends import ExportedBackend
+
+        class FakeExported(ExportedBackend):
+            names = {0: 'coin', 1: 'note'}
+
+            def _infer(self, batch):
+                # One 'note' box in letterboxed 640x640 coordinates
+                out = np.zeros((len(batch), 6, 1), dtype=np.float32)
+                out[:, :4, 0] = [320, 320, 320, 160]
+                out[:, 5, 0] = 0.9
+                return out
+
+        dets = FakeExported().predict([np.zeros((100, 200, 3), np.uint8)], conf=0.25, iou=0.5)
+        dets = dets[0].to_dicts()
+        assert dets[0]['class_name'] == 'note'
+        assert np.allclose(dets[0]['bbox'], [50, 25, 150, 75])
+
+    def test_iou_matrix_matches_scalar_iou(self):
+        import numpy as np
+        from utils.boxes import iou_matrix
+        a = [[0, 0, 10, 10], [5, 5, 15, 15]]
+        b = [[0, 0, 10, 10], [20, 20, 30, 30], [0, 5, 10, 15]]
+        matrix = iou_matrix(np.array(a, float), np.array(b, float))
+        expected = [[detector.calculate_iou(x, y) for y in b] for x in a]
+        assert np.allclose(matrix, expected)
+
+    def test_ensemble_vote_is_one_to_one(self):
+        from utils.detections import Detections
+        binary = Detections([[0, 0, 10, 10], [1, 1, 10, 10]], [0.6, 0.9], [0, 0], {0: 'coin'})
+        specific = Detections([[1, 1, 10, 10]], [0.7], [0], {0: '10_coin'})
+        matched = detector.ensemble_vote(binary, specific).to_dicts()
+        assert len(matched) == 1
+        assert matched[0]['class_name'] == '10_coin'
+        assert matched[0]['binary_confidence'] == pytest.approx(0.9)
+        assert matched[0]['ensemble_confidence'] == pytest.approx(0.9)
+
+    def test_detections_concat_and_to_dicts(self):
+        import numpy as np
+        from utils.detections import Detections
+        a = Detections([[0, 0, 1, 1]], [0.5], [0], {0: 'coin'}).with_column(
+            'ensemble_confidence', np.array([0.8], np.float32))
+        b = Detections([[2, 2, 3, 3]], [0.6], [0], {0: 'note'})
+        dets = Detections.concat([a, b]).to_dicts()
+        # Same class id from two different models keeps its own name
+        assert [d['class_name'] for d in dets] == ['coin', 'note']
+        assert 'ensemble_confidence' in dets[0]
+        assert 'ensemble_confidence' not in dets[1]
+
+# ============================================================================
+# UNIT TESTS - Evaluation
+# ============================================================================
+class TestEvaluation:
+    def test_polygon_labels(self, tmp_path):
+        from utils.evaluation import load_yolo_labels
+        label = tmp_path / "a.txt"
+        label.write_text("1 0.1 0.2 0.5 0.2 0.5 0.6 0.1 0.6\n0 0.5 0.5 0.2 0.4\n")
+        labels = load_yolo_labels(str(label), 100, 200)
+        assert labels[0][0] == 1
+        assert labels[0][1] == pytest.approx([10, 40, 50, 120])
+        assert labels[1][1] == pytest.approx([40, 60, 60, 140])
+
+    def test_perfect_and_missed_detections(self):
+        from utils.evaluation import evaluate_detections
+        gts = [[('10_coin', [0, 0, 10, 10])], [('5_coin', [0, 0, 10, 10])]]
+        perfect = [[{'class_name': '10_coin', 'bbox': [0, 0, 10, 10], 'confidence': 0.9}],
+                   [{'class_name': '5_coin', 'bbox': [0, 0, 10, 10], 'confidence': 0.9}]]
+        assert evaluate_detections(perfect, gts)['map50'] == pytest.approx(1.0)
+
+        missed = [perfect[0], []]
+        metrics = evaluate_detections(missed, gts)
+        assert metrics['map50'] == pytest.approx(0.5)
+        assert metrics['recall'] == pytest.approx(0.5)
+
+    def test_benchmark_config(self):
+        import numpy as np
+        from benchmark import run_config
+        det = TestMixedScenes()._detector()
+        image = np.zeros((640, 640, 3), np.uint8)
+        samples = [(image, [('coin', [32, 32, 96, 96]), ('note', [256, 256, 576, 448])])] * 3
+
+        result = run_config(det, samples, 'binary', 'none', True, batch_size=2)
+        assert result['images'] == 3
+        assert result['images_per_sec'] > 0
+        assert result['latency_ms']['p50'] <= result['latency_ms']['p99']
+        assert result['map50'] == pytest.approx(1.0)
+
 # ============================================================================
 # UNIT TESTS - TTS
 # ============================================================================
@@ -170,6 +593,122 @@ class TestTTS:
         success = tts.announce_detection(result)
         assert success is True
 
+    def test_phrase_cache(self, tmp_path):
+        from utils.cache import ResultCache
+        from utils.tts import TextToSpeech
+
+        class FakeSynthesizer:
+            name = "fake"
+            suffix = ".mp3"
+            calls = 0
+
+            def synthesize(self, text, voice):
+                FakeSynthesizer.calls += 1
+                return f"{voice}:{text}".encode("utf-8")
+
+        def make_tts():
+            cache = ResultCache(ttl=float("inf"), disk_dir=str(tmp_path))
+            return TextToSpeech("mk", FakeSynthesizer(), cache)
+
+        tts = make_tts()
+        first = tts.synthesize("Детектирана банкнота: 10 денари")
+        assert tts.synthesize("Детектирана банкнота: 10 денари") == first
+        assert FakeSynthesizer.calls == 1
+
+        phrases = tts.all_phrases()
+        assert "Не е детектирана валута" in phrases
+        assert len(phrases) == len(set(phrases))
+        assert tts.warm_up() == len(phrases)
+
+        # A fresh instance finds every phrase in the disk cache
+        calls = FakeSynthesizer.calls
+        fresh = make_tts()
+        assert fresh.warm_up() == len(phrases)
+        assert FakeSynthesizer.calls == calls
+
+# ============================================================================
+# UNIT TESTS - Worker pool
+# ============================================================================
+class TestWorkerPool:
+    def test_run_returns_result(self):
+        import asyncio
+        from utils.workers import InferencePool
+        pool = InferencePool(max_workers=2, max_queue=2)
+        try:
+            assert asyncio.run(pool.run(sum, [1, 2, 3])) == 6
+            assert pool.pending == 0
+        finally:
+            pool.shutdown()
+
+    def test_busy_when_queue_full(self):
+        import threading
+        from utils.workers import InferencePool, PoolBusyError
+        pool = InferencePool(max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            pool.submit(release.wait)
+            pool.submit(release.wait)
+            with pytest.raises(PoolBusyError):
+                pool.submit(release.wait)
+        finally:
+            release.set()
+            pool.shutdown()
+        assert pool.pending == 0
+
+    def test_timeout(self):
+        import asyncio
+        import time
+        from utils.workers import InferencePool
+        pool = InferencePool(max_workers=1, max_queue=0)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(pool.run(time.sleep, 0.5, timeout=0.05))
+        finally:
+            pool.shutdown()
+
+# ============================================================================
+# UNIT TESTS - Micro-batching
+# ============================================================================
+class TestBatching:
+    class FakeDetector:
+        def __init__(self):
+            self.batch_sizes = []
+
+        def detect_batch(self, images, **options):
+            self.batch_sizes.append(len(images))
+            return [{'index': int(img[0]), **options} for img in images]
+
+    def test_concurrent_requests_share_a_batch(self):
+        import numpy as np
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.batching import BatchScheduler
+        fake = self.FakeDetector()
+        scheduler = BatchScheduler(fake, max_batch_size=4, max_wait_ms=200)
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(
+                    lambda i: scheduler.detect(np.array([i]), use_ensemble=True),
+                    range(4)
+                ))
+        finally:
+            scheduler.close()
+        assert [r['index'] for r in results] == [0, 1, 2, 3]
+        assert max(fake.batch_sizes) > 1
+        assert sum(fake.batch_sizes) == 4
+
+    def test_different_options_are_not_mixed(self):
+        import numpy as np
+        from utils.batching import BatchScheduler
+        fake = self.FakeDetector()
+        scheduler = BatchScheduler(fake, max_batch_size=4, max_wait_ms=100)
+        try:
+            a = scheduler.submit(np.array([0]), use_ensemble=True)
+            b = scheduler.submit(np.array([1]), use_ensemble=False)
+            assert a.result()['use_ensemble'] is True
+            assert b.result()['use_ensemble'] is False
+        finally:
+            scheduler.close()
+
 # ============================================================================
 # API TESTS
 # ============================================================================
@@ -196,11 +735,475 @@ class TestAPIEndpoints:
         response = client.post("/detect")
         assert response.status_code == 422
 
+    def test_detect_endpoint_invalid_profile(self, client, image_bytes):
+        files = {"file":("test.jpg",image_bytes,"image/jpeg")}
+        response = client.post("/detect?preprocessing=bogus", files=files)
+        assert response.status_code == 400
+
+    def test_detect_endpoint_invalid_hint(self, client, image_bytes):
+        files = {"file":("test.jpg",image_bytes,"image/jpeg")}
+        response = client.post("/detect?hint=euro", files=files)
+        assert response.status_code == 400
+
     def test_detect_endpoint_invalid_file(self, client):
         files = {"file":("test.txt",b"not an image","text/plain")}
         response = client.post("/detect", files=files)
         assert response.status_code in [400,500]
 
+    def test_detect_repeated_upload_is_cached(self, client, image_bytes, monkeypatch):
+        from utils import inference
+        monkeypatch.setattr(inference, 'detector', TestMixedScenes()._detector())
+        files = {"file":("test.jpg",image_bytes,"image/jpeg")}
+        first = client.post("/detect?extract_images=false", files=files)
+        second = client.post("/detect?extract_images=false", files=files)
+        assert first.json()["success"]
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json()
+
+        stats = client.get("/cache/stats").json()
+        assert stats["enabled"] and stats["hits"] >= 1
+
+    def test_detection_errors_are_not_cached(self, client, monkeypatch):
+        import cv2
+        import numpy as np
+        from utils import inference
+        monkeypatch.setattr(inference, 'detector', None)
+        # An image no other test uploads, so nothing is cached for it yet
+        image = np.full((64, 64, 3), 37, np.uint8)
+        files = {"file": ("test.png", cv2.imencode('.png', image)[1].tobytes(), "image/png")}
+        for _ in range(2):
+            response = client.post("/detect?extract_images=false", files=files)
+            assert response.headers["X-Cache"] == "MISS"
+            assert response.json()["success"] is False
+            assert "not initialized" in response.json()["error"]
+
+    def test_cancelled_first_request_does_not_abort_waiters(self, monkeypatch):
+        import asyncio
+        import main
+        from utils.cache import ResultCache
+
+        class SlowPool:
+            calls = 0
+
+            async def run(self, fn, *args, timeout=None):
+                SlowPool.calls += 1
+                await asyncio.sleep(0.05)
+                return b'body', {}, False
+
+        monkeypatch.setattr(main, 'get_inference_pool', lambda: SlowPool())
+        monkeypatch.setattr(main, 'result_cache', ResultCache(max_entries=8))
+        options = main.ResponseOptions('json', 'png', None, None)
+
+        async def scenario():
+            first = asyncio.create_task(main.detect_cached(b'same upload', False, None, options))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(main.detect_cached(b'same upload', False, None, options))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        body, _, status = asyncio.run(scenario())
+        assert (body, status) == (b'body', 'MISS')
+        assert SlowPool.calls == 2
+
+    def test_detect_debug_timings(self, client, image_bytes):
+        files = {"file": ("test.jpg", image_bytes, "image/jpeg")}
+        response = client.post("/detect?debug=true", files=files)
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "BYPASS"
+        timings = response.json()["timings"]
+        assert list(timings)[0] == "decode"
+        assert all(ms >= 0 for ms in timings.values())
+
+    def test_ready_endpoint(self, client):
+        response = client.get("/ready")
+        assert response.status_code in (200, 503)
+        assert response.json()["ready"] == (response.status_code == 200)
+
+    def test_ready_waits_for_pool_probe(self, monkeypatch):
+        import asyncio
+        import main
+        from utils import inference
+        from utils.workers import InferencePool
+        monkeypatch.setattr(inference, 'load_model', lambda path, *args: FakeBackend({0: 'coin'}, []))
+        monkeypatch.setattr(inference, 'detector', inference.CurrencyDetector(
+            {'binary': 'binary', 'coin': 'coin'}, device='cpu'
+        ))
+        monkeypatch.setattr(main, 'inference_pool', InferencePool(1, 2, kind='thread'))
+        monkeypatch.setattr(main, 'models_ready', False)
+        monkeypatch.setattr(main, 'pool_detector', None)
+        monkeypatch.setattr(main, 'startup_times', {})
+
+        asyncio.run(main.probe_pool(0.0))
+        assert main.models_ready
+        assert main.pool_detector['settings'] == inference.detector.settings()
+        assert main.pool_detector['models']['coin']['loaded']
+
+    def test_stage_timer(self):
+        from utils.telemetry import StageTimer
+        timer = StageTimer()
+        with timer.stage("binary"):
+            pass
+        timer.merge({"decode": 0.002, "binary": 0.001})
+        assert list(timer.as_ms()) == ["decode", "binary"]
+        assert timer.as_ms()["decode"] == 2.0
+
+    def test_detect_multipart_response(self, client, image_bytes):
+        files = {"file":("test.jpg",image_bytes,"image/jpeg")}
+        response = client.post("/detect?response_format=multipart", files=files)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("multipart/mixed; boundary=")
+
+    def test_detect_unavailable_format(self, client, image_bytes):
+        try:
+            import msgpack  # noqa: F401
+            pytest.skip("msgpack is installed")
+        except ImportError:
+            pass
+        files = {"file":("test.jpg",image_bytes,"image/jpeg")}
+        response = client.post("/detect", files=files, headers={"Accept": "application/msgpack"})
+        assert response.status_code == 406
+
+    def test_detect_batch_streams_ndjson(self, client, image_bytes, monkeypatch):
+        import json
+        from utils import inference
+        monkeypatch.setattr(inference, 'detector', TestMixedScenes()._detector())
+        data = image_bytes.getvalue()
+        files = [("files", ("a.jpg", data, "image/jpeg")),
+                 ("files", ("b.jpg", data, "image/jpeg")),
+                 ("files", ("c.jpg", b"not an image", "image/jpeg"))]
+        response = client.post("/detect/batch", files=files)
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+        assert lines[-1]["summary"] and lines[-1]["images"] == 3
+        assert lines[-1]["failed"] == 1
+
+    @staticmethod
+    def _zip(entries):
+        import zipfile
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, data in entries:
+                archive.writestr(name, data)
+        return buf.getvalue()
+
+    def test_detect_batch_counts_images_across_zips(self, client, image_bytes, monkeypatch):
+        import zipfile
+        import main
+        monkeypatch.setattr(main, 'BATCH_MAX_FILES', 3)
+        data = image_bytes.getvalue()
+        first = self._zip([('a.jpg', data), ('b.jpg', data)])
+        second = self._zip([('c.jpg', data), ('d.jpg', data)])
+
+        files = [("files", ("first.zip", first, "application/zip")),
+                 ("files", ("second.zip", second, "application/zip"))]
+        real_read = zipfile.ZipFile.read
+        reads = []
+        monkeypatch.setattr(zipfile.ZipFile, 'read',
+                            lambda self, info: reads.append(info.filename) or real_read(self, info))
+        response = client.post("/detect/batch", files=files)
+        assert response.status_code == 413
+        assert response.json()["detail"].startswith("second.zip:")
+        assert reads == ['a.jpg', 'b.jpg']
+
+    def test_detect_batch_refuses_zip_bombs(self, client, monkeypatch):
+        import zipfile
+        import main
+        monkeypatch.setattr(main, 'BATCH_MAX_UPLOAD_SIZE', 8 * 1024 * 1024)
+        bomb = self._zip([(f'{i}.jpg', bytes(4 * 1024 * 1024)) for i in range(3)])
+        assert len(bomb) < 100 * 1024
+
+        def no_read(*args, **kwargs):
+            raise AssertionError("a zip bomb must not be inflated")
+
+        monkeypatch.setattr(zipfile.ZipFile, 'read', no_read)
+        response = client.post("/detect/batch",
+                               files=[("files", ("bomb.zip", bomb, "application/zip"))])
+        assert response.status_code == 413
+        assert "uncompressed" in response.json()["detail"]
+
+    def test_detect_chunk_isolates_a_failing_image(self, monkeypatch):
+        import cv2
+        import numpy as np
+        import main
+
+        def fake_batch(images, **options):
+            if any(image.shape[0] == 32 for image in images):
+                raise ValueError("bad image")
+            return [{'success': True, 'type': 'coin', 'detections': [
+                {'class_name': '10_coin', 'confidence': 0.9, 'bbox': [0, 0, 8, 8], 'type': 'coin'}
+            ]} for _ in images]
+
+        monkeypatch.setattr(main, 'detect_currency_batch', fake_batch)
+        encode = lambda size: cv2.imencode('.png', np.zeros((size, size, 3), np.uint8))[1].tobytes()
+        lines = main.detect_chunk([(0, 'a.png', encode(64)), (1, 'b.png', encode(32)),
+                                   (2, 'c.png', encode(64))])
+
+        assert [line['success'] for line in lines] == [True, False, True]
+        assert lines[1]['error'] == 'bad image'
+        assert 'error' not in lines[0]
+
+    def test_detect_stream_websocket(self, client, image_bytes, monkeypatch):
+        from utils import inference
+        monkeypatch.setattr(inference, 'detector', TestMixedScenes()._detector())
+        with client.websocket_connect("/ws/detect?full_every=2") as ws:
+            modes = []
+            for _ in range(2):
+                ws.send_bytes(image_bytes.getvalue())
+                message = ws.receive_json()
+                modes.append(message["mode"])
+                assert {"fps", "latency_ms", "dropped", "detections"} <= set(message)
+        assert modes[0] == "detect"
+
+    def test_detect_stream_survives_a_failed_detection(self, client, image_bytes, monkeypatch):
+        import main
+        calls = []
+
+        def flaky_detect(image, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("backend fault")
+            det = {'class_name': '10_coin', 'confidence': 0.9, 'bbox': [10, 10, 50, 50], 'type': 'coin'}
+            return {'success': True, 'type': 'coin', 'detections': [det]}
+
+        monkeypatch.setattr(main, 'detect_currency', flaky_detect)
+        with client.websocket_connect("/ws/detect?full_every=1") as ws:
+            messages = []
+            for _ in range(3):
+                ws.send_bytes(image_bytes.getvalue())
+                messages.append(ws.receive_json())
+
+        assert messages[1]["error"] == "backend fault"
+        assert "detections" not in messages[1] and "announcement" not in messages[1]
+        # The frame after the fault continues the same track
+        assert messages[2]["detections"][0]["track_id"] == messages[0]["detections"][0]["track_id"]
+
+    def test_detect_stream_rejects_invalid_frames(self, client, image_bytes, monkeypatch):
+        import main
+
+        def no_decode(*args, **kwargs):
+            raise AssertionError("rejected frames must not be decoded")
+
+        monkeypatch.setattr(main, 'decode_upload', no_decode)
+        monkeypatch.setattr(main, 'MAX_IMAGE_SIZE', 16)
+        with client.websocket_connect("/ws/detect") as ws:
+            ws.send_bytes(image_bytes.getvalue())
+            assert "larger than" in ws.receive_json()["error"]
+            ws.send_bytes(b"not an image")
+            assert ws.receive_json()["error"] == "Invalid image file"
+
+    def test_speak_streams_audio(self, client, monkeypatch):
+        import main
+        from utils.tts import TextToSpeech
+
+        class StreamingSynthesizer:
+            name = "fake"
+            suffix = ".mp3"
+            media_type = "audio/mpeg"
+            calls = 0
+
+            async def stream(self, text, voice):
+                StreamingSynthesizer.calls += 1
+                for word in text.split():
+                    yield word.encode("utf-8")
+
+        tts = TextToSpeech("mk", StreamingSynthesizer())
+        monkeypatch.setattr(main, "get_tts", lambda: tts)
+
+        response = client.get("/speak", params={"text": "Детектирана монета: 5 денари"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "audio/mpeg"
+        assert response.content == "Детектиранамонета:5денари".encode("utf-8")
+
+        again = client.get("/speak", params={"text": "Детектирана монета: 5 денари"})
+        assert again.content == response.content
+        assert StreamingSynthesizer.calls == 1
+        assert client.get("/speak", params={"text": "x", "language": "de"}).status_code == 400
+
+    def test_denomination(self):
+        from utils.inference import denomination
+        assert denomination("1000_note") == 1000
+        assert denomination("coin") is None
+
+    def test_lazy_detection_image(self, client):
+        import numpy as np
+        import main
+        frame = np.zeros((400, 400, 3), np.uint8)
+        frame_id = main.frame_store.put(frame, [{'id': 0, 'bbox': [50, 50, 150, 150], 'type': 'note'}])
+
+        response = client.get(f"/frames/{frame_id}/detections/0/image?image_format=jpeg")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        again = client.get(f"/frames/{frame_id}/detections/0/image?image_format=jpeg")
+        assert again.content == response.content
+        assert main.frame_store.stats()["crop_hits"] >= 1
+
+        assert client.get(f"/frames/{frame_id}/detections/5/image").status_code == 404
+        assert client.get("/frames/unknown/detections/0/image").status_code == 404
+
+    def test_lazy_crop_matches_eager_crop(self, client):
+        import numpy as np
+        import main
+        from utils.encoding import encode_crop
+        frame = np.random.default_rng(0).integers(0, 255, (400, 400, 3), dtype=np.uint8)
+        detections = [{'id': 0, 'bbox': [50, 60, 250, 180], 'type': 'note'},
+                      {'id': 1, 'bbox': [200, 200, 320, 320], 'type': 'coin'}]
+        frame_id = main.frame_store.put(frame, detections)
+
+        for det in detections:
+            eager, _ = encode_crop(main.extract_currency_image(frame, det['bbox'], det['type']),
+                                   'png', None, None, det['type'])
+            lazy = client.get(f"/frames/{frame_id}/detections/{det['id']}/image?image_format=png")
+            assert lazy.content == eager
+
+# ============================================================================
+# UNIT TESTS - Response encoding
+# ============================================================================
+class TestEncoding:
+    def test_crop_formats(self):
+        import numpy as np
+        import cv2
+        from utils.encoding import encode_crop
+        coin = np.full((200, 100, 4), 255, np.uint8)
+        coin[:20, :, 3] = 0  # transparent corner must survive
+
+        data, media_type = encode_crop(coin, 'auto', currency_type='coin')
+        assert media_type == 'image/webp'
+        assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED).shape[2] == 4
+
+        data, media_type = encode_crop(coin, 'jpeg', quality=70, max_dim=50)
+        assert media_type == 'image/jpeg'
+        assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED).shape == (50, 25, 3)
+
+    def test_multipart_and_negotiation(self):
+        from utils.encoding import encode_response, negotiate_format
+        payload = {'success': True, 'detections': [{'id': 0}]}
+        body = encode_response(payload, {0: (b'PNGDATA', 'image/png')}, 'multipart', 'b0')
+        assert body.startswith(b'--b0\r\nContent-Type: application/json')
+        assert b'"image_part":"crop-0"' in body
+        assert b'Content-ID: <crop-0>\r\n\r\nPNGDATA\r\n--b0--' in body
+
+        assert negotiate_format(None, 'application/cbor, */*') == 'cbor'
+        assert negotiate_format(None, None) == 'json'
+        with pytest.raises(ValueError):
+            negotiate_format('xml', None)
+
+class TestFrameStore:
+    def test_byte_budget_evicts_oldest(self):
+        import numpy as np
+        from utils.frames import FrameStore
+        store = FrameStore(max_bytes=250, ttl=60)
+        first = store.put(np.zeros((10, 10), np.uint8), [])
+        second = store.put(np.zeros((10, 10), np.uint8), [])
+        third = store.put(np.zeros((10, 10), np.uint8), [])
+        assert store.get(first) is None
+        assert store.get(second) is not None and store.get(third) is not None
+
+    def test_region_gives_same_crop(self):
+        import numpy as np
+        from main import extract_currency_image
+        from utils.frames import StoredFrame
+        image = np.random.randint(0, 255, (300, 300, 3), np.uint8)
+        frame = StoredFrame(image, [], expires=0)
+        bbox = [5.5, 100.2, 120.9, 290.0]
+        region, region_bbox = frame.region(bbox, padding=10)
+        for currency_type in ('note', 'coin'):
+            assert np.array_equal(
+                extract_currency_image(region, region_bbox, currency_type),
+                extract_currency_image(image, bbox, currency_type)
+            )
+
+class TestStreaming:
+    def test_tracker_follows_motion(self):
+        import numpy as np
+        import cv2
+        from utils.tracking import BoxTracker
+        rng = np.random.default_rng(0)
+        scene = cv2.GaussianBlur(rng.integers(0, 255, (500, 700), dtype=np.uint8), (7, 7), 0)
+        tracker = BoxTracker(full_every=10, scene_threshold=255)
+
+        first = scene[0:400, 0:600]
+        dets = tracker.reset(first, [{'bbox': [200, 100, 300, 200], 'class_name': '10_coin', 'type': 'coin'}])
+        assert dets[0]['track_id'] == 0
+        assert not tracker.needs_detection(first)
+
+        # Camera moves: content shifts 10 px left and 6 px up
+        moved = tracker.propagate(scene[6:406, 10:610])
+        assert np.allclose(moved[0]['bbox'], [190, 94, 290, 194], atol=1.5)
+
+        # Same object in the next full run keeps its id
+        again = tracker.reset(first, [{'bbox': [192, 95, 292, 195], 'class_name': '10_coin', 'type': 'coin'}])
+        assert again[0]['track_id'] == 0
+
+    def test_latest_frame_wins(self):
+        import asyncio
+        from utils.streaming import LatestFrameSlot
+
+        async def run():
+            slot = LatestFrameSlot()
+            for frame in (1, 2, 3):
+                slot.put(frame)
+            newest = await slot.get()
+            slot.close()
+            return newest, await slot.get(), slot.dropped
+
+        assert asyncio.run(run()) == (3, None, 2)
+
+    def test_stabilizer_announces_changes_once(self):
+        from utils.stabilizer import DetectionStabilizer
+        stabilizer = DetectionStabilizer(window=5, min_share=0.6, debounce=1.0, min_frames=3)
+        ten = {'class_name': '10_coin', 'type': 'coin', 'confidence': 0.8}
+        fifty = {'class_name': '50_coin', 'type': 'coin', 'confidence': 0.6}
+
+        # A flickering misclassification does not outvote the majority
+        frames = [[ten], [ten], [fifty], [ten], [ten], [ten]]
+        announcements = [stabilizer.update(f, now=i * 0.1) for i, f in enumerate(frames)]
+        made = [a for a in announcements if a is not None]
+        assert len(made) == 1
+        assert made[0]['counts'] == {'10_coin': 1}
+        assert made[0]['type'] == 'coin'
+
+        # A second coin appears: announced once the debounce has passed
+        assert stabilizer.update([ten, fifty], now=0.7) is None
+        assert stabilizer.update([ten, fifty], now=0.8) is None
+        changed = stabilizer.update([ten, fifty], now=1.5)
+        assert changed['counts'] == {'10_coin': 1, '50_coin': 1}
+        assert stabilizer.update([ten, fifty], now=3.0) is None
+
+# ============================================================================
+# UNIT TESTS - Result cache
+# ============================================================================
+class TestResultCache:
+    def test_key_depends_on_settings(self):
+        from utils.cache import make_cache_key
+        assert make_cache_key(b"img", {"a": 1}) == make_cache_key(b"img", {"a": 1})
+        assert make_cache_key(b"img", {"a": 1}) != make_cache_key(b"img", {"a": 2})
+
+    def test_lru_size_and_ttl_eviction(self):
+        import time
+        from utils.cache import ResultCache
+        cache = ResultCache(max_entries=2, max_bytes=10, ttl=60)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")
+        cache.put("c", b"1234")  # over both limits, evicts least recently used "b"
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+
+        cache.ttl = 0.01
+        cache.put("d", b"1")
+        time.sleep(0.02)
+        assert cache.get("d") is None
+        assert cache.stats()["evictions"] >= 1
+
+    def test_disk_tier_is_shared(self, tmp_path):
+        from utils.cache import ResultCache
+        ResultCache(disk_dir=str(tmp_path)).put("abc", b"payload")
+        other = ResultCache(disk_dir=str(tmp_path))
+        assert other.get("abc") == b"payload"
+        assert other.stats()["disk_hits"] == 1
+
 # ============================================================================
 # INTEGRATION TESTS
 # ============================================================================
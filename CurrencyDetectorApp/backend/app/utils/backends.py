@@ -0,0 +1,247 @@
+"""
+Inference backends for the YOLO detectors
+PyTorch (ultralytics), ONNX Runtime and OpenVINO behind one predict() interface
+"""
+
+import ast
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+import cv2
+import numpy as np
+
+from utils.boxes import batched_nms
+from utils.detections import Detections
+from utils.preprocess import letterbox
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+
+class DetectionBackend:
+    """
+    Common interface of all backends
+
+    predict() returns, for every input image, a Detections container
+    with boxes in the coordinates of that input image.
+    """
+
+    names: Dict[int, str] = {}
+    imgsz: int = 640
+
+    def predict(self, images: List[np.ndarray], conf: float, iou: float,
+                imgsz: Optional[int] = None) -> List[Detections]:
+        raise NotImplementedError
+
+    def fuse(self) -> None:
+        """Apply the one-off graph changes of the first predict() now"""
+
+
+class UltralyticsBackend(DetectionBackend):
+    def __init__(self, path: str, device: str = 'cpu'):
+        from ultralytics import YOLO
+
+        self.model = YOLO(path)
+        self.names = self.model.names
+        self.device = device
+        # The ultralytics predictor keeps per-call state and is not safe
+        # to share between threads; different models still run in parallel
+        self._lock = threading.Lock()
+
+    def predict(self, images: List[np.ndarray], conf: float, iou: float,
+                imgsz: Optional[int] = None) -> List[Detections]:
+        kwargs = {'imgsz': imgsz} if imgsz else {}
+        with self._lock:
+            results = self.model(
+                images,
+                conf=conf,
+                iou=iou,
+                verbose=False,
+                **kwargs
+            )
+
+        return [Detections.from_ultralytics(result.boxes, self.names) for result in results]
+
+    def fuse(self) -> None:
+        # The predictor fuses Conv+BN on its first call unless the model
+        # already is; fused weights are new tensors, so doing it in the
+        # serve.py parent keeps them shared with the forked workers
+        self.model.fuse()
+
+
+class ExportedBackend(DetectionBackend):
+    """
+    Shared letterbox + decoding + NMS for exported YOLOv8 graphs
+
+    The raw graph output is (batch, 4 + num_classes, num_anchors) with
+    boxes as cx, cy, w, h in letterboxed input pixels.
+    """
+
+    max_det = 300
+    dynamic_batch = True
+    fixed_size = False  # static graphs only accept their export size
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _prepare(self, image: np.ndarray, size: int):
+        padded, scale, pad = letterbox(image, size)
+        blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+        return np.ascontiguousarray(blob, dtype=np.float32) / 255.0, scale, pad
+
+    def predict(self, images: List[np.ndarray], conf: float, iou: float,
+                imgsz: Optional[int] = None) -> List[Detections]:
+        size = self.imgsz if self.fixed_size else (imgsz or self.imgsz)
+        prepared = [self._prepare(image, size) for image in images]
+        blobs = np.stack([blob for blob, _, _ in prepared])
+
+        if self.dynamic_batch:
+            outputs = self._infer(blobs)
+        else:
+            outputs = np.concatenate([self._infer(blob[None]) for blob in blobs])
+
+        return [
+            self._postprocess(output, image.shape[:2], scale, pad, conf, iou)
+            for output, image, (_, scale, pad) in zip(outputs, images, prepared)
+        ]
+
+    def _postprocess(self, output: np.ndarray, shape, scale: float, pad,
+                     conf: float, iou: float) -> Detections:
+        pred = output.T  # (num_anchors, 4 + num_classes)
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(pred)), class_ids]
+
+        mask = scores >= conf
+        if not mask.any():
+            return Detections.empty(self.names)
+
+        xywh = pred[mask, :4]
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        keep = batched_nms(boxes, scores, class_ids, iou)[:self.max_det]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo the letterbox
+        h, w = shape
+        boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad[0]) / scale, 0, w)
+        boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad[1]) / scale, 0, h)
+
+        return Detections(boxes, scores, class_ids, self.names)
+
+
+def _parse_names(names) -> Dict[int, str]:
+    if isinstance(names, str):
+        names = ast.literal_eval(names)
+    if isinstance(names, list):
+        names = dict(enumerate(names))
+    return {int(k): v for k, v in names.items()}
+
+
+class OnnxBackend(ExportedBackend):
+    def __init__(self, path: str, num_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            path, options, providers=['CPUExecutionProvider']
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        # Ultralytics stores class names and input size in the metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(metadata.get('names', {}))
+        if isinstance(model_input.shape[2], int):
+            self.imgsz = model_input.shape[2]
+        elif 'imgsz' in metadata:
+            self.imgsz = ast.literal_eval(metadata['imgsz'])[0]
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.fixed_size = isinstance(model_input.shape[2], int)
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    def __init__(self, path: str, num_threads: int = 0):
+        import openvino as ov
+        import yaml
+
+        path = Path(path)
+        model_dir = path if path.is_dir() else path.parent
+        xml = path if path.suffix == '.xml' else next(model_dir.glob('*.xml'))
+
+        core = ov.Core()
+        config = {'INFERENCE_NUM_THREADS': num_threads} if num_threads else {}
+        self.compiled = core.compile_model(core.read_model(str(xml)), 'CPU', config)
+        self.output = self.compiled.output(0)
+
+        metadata_file = model_dir / 'metadata.yaml'
+        if metadata_file.exists():
+            with open(metadata_file, encoding='utf-8') as f:
+                metadata = yaml.safe_load(f)
+            self.names = _parse_names(metadata.get('names', {}))
+            self.imgsz = metadata.get('imgsz', [self.imgsz])[0]
+
+        input_shape = self.compiled.input(0).partial_shape
+        self.dynamic_batch = input_shape[0].is_dynamic
+        self.fixed_size = input_shape[2].is_static
+        if self.fixed_size:
+            self.imgsz = input_shape[2].get_length()
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled([batch])[self.output]
+
+
+def configure_threads(num_threads: int) -> None:
+    """
+    Limit the intra-op threads of OpenCV and, if imported, torch
+
+    onnxruntime and OpenVINO take their thread count when a model is
+    loaded (load_model(num_threads=...)).
+    """
+    if num_threads <= 0:
+        return
+    cv2.setNumThreads(num_threads)
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(num_threads)
+
+
+def load_model(path: str, backend: str = 'torch', device: str = 'cpu',
+               num_threads: int = 0) -> DetectionBackend:
+    """
+    Load one detector with the requested backend
+
+    Args:
+        path: .pt file (torch), .onnx file (onnx) or *_openvino_model dir
+        backend: One of BACKENDS
+        device: Device for the torch backend
+        num_threads: Intra-op threads for onnx/openvino (0 = runtime default)
+    """
+    if backend == 'torch':
+        return UltralyticsBackend(path, device)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if backend == 'onnx':
+        return OnnxBackend(path, num_threads)
+    if backend == 'openvino':
+        return OpenVinoBackend(path, num_threads)
+    raise ValueError(f"Unknown inference backend: {backend}")
@@ -0,0 +1,127 @@
+"""
+Dynamic micro-batching for concurrent detection requests
+Collects requests that arrive within a short window and runs them as one batch
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchScheduler:
+    def __init__(self, detector, max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        """
+        Batching front-end for a CurrencyDetector
+
+        Args:
+            detector: Object exposing detect_batch(images, **options)
+            max_batch_size: Maximum number of images per model call
+            max_wait_ms: How long the first request of a batch waits for
+                more requests before the batch is run
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self.batches_run = 0
+        self.images_processed = 0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, name='detect-batcher', daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, image: np.ndarray, **options: Any) -> Future:
+        """Queue an image for detection and return a Future for its result"""
+        future: Future = Future()
+        self._queue.put((image, options, future))
+        return future
+
+    def detect(self, image: np.ndarray, **options: Any) -> Dict:
+        """Blocking helper with the same result as detector.detect()"""
+        return self.submit(image, **options).result()
+
+    def stats(self) -> dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self.batches_run,
+            'images': self.images_processed,
+            'avg_batch_size': (self.images_processed / self.batches_run
+                               if self.batches_run else 0.0)
+        }
+
+    def close(self) -> None:
+        """Stop the scheduler thread after the queued requests are served"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def _collect(self, first) -> Tuple[List[tuple], bool]:
+        """Gather up to max_batch_size requests within the wait window"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 \
+                    else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch, stop = self._collect(first)
+
+            # Requests with different options cannot share a model call
+            groups: Dict[tuple, List[tuple]] = {}
+            for item in batch:
+                key = tuple(sorted(item[1].items()))
+                groups.setdefault(key, []).append(item)
+
+            for items in groups.values():
+                self._run(items)
+
+    def _run(self, items: List[tuple]) -> None:
+        # Skip requests whose caller has already given up
+        items = [item for item in items if item[2].set_running_or_notify_cancel()]
+        if not items:
+            return
+
+        images = [image for image, _, _ in items]
+        options = items[0][1]
+
+        try:
+            results = self.detector.detect_batch(images, **options)
+        except Exception as e:
+            logger.error(f"Batched detection failed: {e}")
+            for _, _, future in items:
+                future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.images_processed += len(items)
+
+        for (_, _, future), result in zip(items, results):
+            future.set_result(result)
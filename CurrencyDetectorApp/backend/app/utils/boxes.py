@@ -0,0 +1,175 @@
+"""
+Bounding box utilities
+Vectorized IoU and non-maximum suppression on [x1, y1, x2, y2] arrays
+"""
+
+import numpy as np
+
+
+def box_area(boxes: np.ndarray) -> np.ndarray:
+    """Area of each box in an (N, 4) array"""
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * \
+        np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of a single box against an (N, 4) array of boxes"""
+    inter_w = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    inter = inter_w * inter_h
+    union = box_area(box[None, :])[0] + box_area(boxes) - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def iou_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU of two box arrays
+
+    Args:
+        boxes1: (N, 4) boxes
+        boxes2: (M, 4) boxes
+
+    Returns:
+        (N, M) IoU matrix
+    """
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = box_area(boxes1)[:, None] + box_area(boxes2)[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def greedy_match(ious: np.ndarray, min_iou: float):
+    """
+    One-to-one assignment on an IoU matrix, best overlaps first
+
+    Args:
+        ious: (N, M) IoU matrix
+        min_iou: Pairs must overlap strictly more than this
+
+    Returns:
+        (rows, cols) index arrays of the matched pairs
+    """
+    rows, cols = np.nonzero(ious > min_iou)
+    if rows.size == 0:
+        return rows, cols
+
+    order = np.argsort(-ious[rows, cols], kind='stable')
+    rows, cols = rows[order], cols[order]
+
+    used_rows = np.zeros(ious.shape[0], dtype=bool)
+    used_cols = np.zeros(ious.shape[1], dtype=bool)
+    keep = np.zeros(rows.size, dtype=bool)
+    for k, (r, c) in enumerate(zip(rows, cols)):
+        if not used_rows[r] and not used_cols[c]:
+            used_rows[r] = used_cols[c] = True
+            keep[k] = True
+
+    return rows[keep], cols[keep]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Greedy non-maximum suppression
+
+    Args:
+        boxes: (N, 4) boxes
+        scores: (N,) scores
+        iou_threshold: Boxes overlapping a kept box above this are dropped
+
+    Returns:
+        Indices of kept boxes, highest score first
+    """
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = box_iou(boxes[i], boxes[order[1:]])
+        order = order[1:][ious <= iou_threshold]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray,
+                iou_threshold: float) -> np.ndarray:
+    """Class-aware NMS: boxes of different classes never suppress each other"""
+    if boxes.size == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Shift every class into its own region so one NMS pass is enough
+    offsets = classes.astype(np.float64)[:, None] * (boxes.max() + 1.0)
+    return nms(boxes + offsets, scores, iou_threshold)
+
+
+def ios_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Pairwise intersection over the smaller box area
+
+    Unlike IoU this is high when one box is a cut-off part of the other,
+    e.g. an object split by a tile border.
+
+    Args:
+        boxes1: (N, 4) boxes
+        boxes2: (M, 4) boxes
+
+    Returns:
+        (N, M) matrix
+    """
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    smaller = np.minimum(box_area(boxes1)[:, None], box_area(boxes2)[None, :])
+    return np.where(smaller > 0, inter / np.maximum(smaller, 1e-9), 0.0)
+
+
+def merge_boxes(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray,
+                threshold: float, method: str = 'nms'):
+    """
+    Merge duplicate detections of the same object (class-aware)
+
+    Boxes are clustered greedily, highest score first: a cluster takes
+    every unassigned box of its class whose intersection over the smaller
+    box exceeds the threshold. 'nms' keeps the best box of every cluster,
+    'wbf' (weighted boxes fusion) replaces it by the score-weighted mean
+    of the cluster's boxes.
+
+    Args:
+        boxes: (N, 4) boxes
+        scores: (N,) scores
+        classes: (N,) class keys
+        threshold: Minimum intersection over the smaller box
+        method: 'nms' or 'wbf'
+
+    Returns:
+        (indices of the best box per cluster, highest score first;
+         (K, 4) merged boxes)
+    """
+    if method not in ('nms', 'wbf'):
+        raise ValueError(f"Unknown merge method: {method}")
+    if boxes.size == 0:
+        return np.zeros(0, dtype=np.int64), boxes.reshape(0, 4)
+
+    overlaps = (ios_matrix(boxes, boxes) > threshold) & (classes[:, None] == classes[None, :])
+    assigned = np.zeros(len(boxes), dtype=bool)
+    keep, merged = [], []
+
+    for i in np.argsort(-scores, kind='stable'):
+        if assigned[i]:
+            continue
+        members = overlaps[i] & ~assigned
+        members[i] = True
+        assigned |= members
+        keep.append(i)
+        if method == 'wbf':
+            weights = scores[members][:, None]
+            merged.append((boxes[members] * weights).sum(axis=0) / max(weights.sum(), 1e-9))
+        else:
+            merged.append(boxes[i])
+
+    return np.asarray(keep, dtype=np.int64), np.asarray(merged, dtype=boxes.dtype).reshape(-1, 4)
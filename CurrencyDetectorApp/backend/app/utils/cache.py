@@ -0,0 +1,205 @@
+"""
+Content-addressed result cache
+Stores encoded /detect responses keyed by a hash of the uploaded bytes and
+the detection settings, in memory (LRU) and optionally on a shared disk
+directory so several uvicorn workers reuse each other's results
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def make_cache_key(contents: bytes, settings: Dict) -> str:
+    """
+    Cache key for an upload
+
+    Args:
+        contents: Raw uploaded bytes
+        settings: Everything that changes the response (profile,
+            thresholds, extract_images, ...); must be JSON-serializable
+
+    Returns:
+        Hex sha256 digest
+    """
+    digest = hashlib.sha256(contents)
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of response bodies with size- and TTL-based eviction
+
+    Thread-safe. Values are bytes so a hit can be returned without
+    re-serializing the payload.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 300.0, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            max_bytes: Maximum total size of the in-memory entries
+            ttl: Seconds an entry stays valid (memory and disk)
+            disk_dir: Directory of the shared on-disk tier (None disables it)
+            disk_max_bytes: Size the disk tier is pruned back to
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (expires, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk_writes = 0
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached value or None; disk hits are promoted to memory"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value, now)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        """Store a value in memory and, if enabled, on disk"""
+        with self._lock:
+            self._store(key, value, time.monotonic())
+        self._disk_put(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'disk_dir': str(self.disk_dir) if self.disk_dir else None
+            }
+
+    def _store(self, key: str, value: bytes, now: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (now + self.ttl, value)
+        self._bytes += len(value)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    # ------------------------------------------------------------------
+    # Shared disk tier
+    # ------------------------------------------------------------------
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_bytes()
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, value: bytes) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Write to a temp file and rename so other workers never
+            # read a partially written entry
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 64 == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self) -> None:
+        """Delete expired disk entries, then the oldest beyond disk_max_bytes"""
+        if self.disk_dir is None:
+            return
+
+        now = time.time()
+        files = []
+        for path in self.disk_dir.glob('*/*'):
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
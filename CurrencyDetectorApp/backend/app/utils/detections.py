@@ -0,0 +1,180 @@
+"""
+Columnar detection container
+Keeps boxes, scores and classes as NumPy arrays through the pipeline and
+only builds per-detection dicts when the API response is assembled
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class Detections:
+    """
+    Detections of one image as parallel arrays
+
+    Attributes:
+        boxes: (N, 4) float32 boxes as x1, y1, x2, y2
+        scores: (N,) float32 confidences
+        class_ids: (N,) int64 class indices
+        names: Class index -> class name of the model that produced them
+        extra: Optional per-detection columns, e.g. 'binary_confidence'
+            or 'type'. Float columns use NaN for "not set".
+    """
+
+    __slots__ = ('boxes', 'scores', 'class_ids', 'names', 'extra')
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray,
+                 class_ids: np.ndarray, names: Dict[int, str],
+                 extra: Optional[Dict[str, np.ndarray]] = None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        self.names = names
+        self.extra = extra or {}
+
+    @classmethod
+    def empty(cls, names: Optional[Dict[int, str]] = None) -> 'Detections':
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0), names or {})
+
+    @classmethod
+    def from_ultralytics(cls, boxes, names: Dict[int, str]) -> 'Detections':
+        """
+        Build from an ultralytics Boxes object
+
+        The (N, 6) data tensor is moved to the host once instead of
+        indexing every box separately.
+        """
+        data = boxes.data
+        if hasattr(data, 'cpu'):
+            data = data.cpu().numpy()
+        return cls(data[:, :4], data[:, -2], data[:, -1], names)
+
+    @classmethod
+    def from_dicts(cls, detections: List[Dict], names: Optional[Dict[int, str]] = None) -> 'Detections':
+        """Build from detection dicts as returned by to_dicts()"""
+        if not detections:
+            return cls.empty(names)
+        if names is None:
+            names = {d['class_id']: d['class_name'] for d in detections}
+        return cls(
+            [d['bbox'] for d in detections],
+            [d['confidence'] for d in detections],
+            [d['class_id'] for d in detections],
+            names
+        )
+
+    @classmethod
+    def concat(cls, parts: Iterable['Detections']) -> 'Detections':
+        """
+        Concatenate detections; columns missing in a part become NaN/None
+
+        Parts may come from different models whose class ids overlap, so
+        the class names are carried along as a 'class_name' column.
+        """
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+
+        names = {}
+        for part in parts:
+            names.update(part.names)
+        parts = [
+            p.with_column('class_name', np.array(p.class_names(), dtype=object))
+            for p in parts
+        ]
+
+        columns = {key for part in parts for key in part.extra}
+        extra = {}
+        for key in columns:
+            values = []
+            for part in parts:
+                if key in part.extra:
+                    values.append(part.extra[key])
+                else:
+                    sample = next(p.extra[key] for p in parts if key in p.extra)
+                    fill = np.nan if sample.dtype.kind == 'f' else None
+                    values.append(np.full(len(part), fill, dtype=sample.dtype))
+            extra[key] = np.concatenate(values)
+
+        return cls(
+            np.concatenate([p.boxes for p in parts]),
+            np.concatenate([p.scores for p in parts]),
+            np.concatenate([p.class_ids for p in parts]),
+            names,
+            extra
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __getitem__(self, index) -> 'Detections':
+        """Select by index array or boolean mask"""
+        return Detections(
+            self.boxes[index], self.scores[index], self.class_ids[index],
+            self.names, {k: v[index] for k, v in self.extra.items()}
+        )
+
+    def with_column(self, key: str, values) -> 'Detections':
+        """Copy with an extra column set (a scalar is broadcast)"""
+        values = np.asarray(values)
+        if values.ndim == 0:
+            values = np.full(len(self), values.item(), dtype=values.dtype)
+        extra = dict(self.extra)
+        extra[key] = values
+        return Detections(self.boxes, self.scores, self.class_ids, self.names, extra)
+
+    @property
+    def final_scores(self) -> np.ndarray:
+        """Ensemble confidence where available, model confidence otherwise"""
+        ensemble = self.extra.get('ensemble_confidence')
+        if ensemble is None:
+            return self.scores
+        return np.where(np.isnan(ensemble), self.scores, ensemble)
+
+    def class_names(self) -> List[str]:
+        if 'class_name' in self.extra:
+            return self.extra['class_name'].tolist()
+        return [self.names.get(int(c), str(int(c))) for c in self.class_ids]
+
+    def scale(self, sx: float, sy: float) -> 'Detections':
+        """Copy with boxes scaled by (sx, sy)"""
+        boxes = self.boxes * np.array([sx, sy, sx, sy], dtype=np.float32)
+        return Detections(boxes, self.scores, self.class_ids, self.names, self.extra)
+
+    def translate(self, dx: float, dy: float) -> 'Detections':
+        """Copy with boxes shifted by (dx, dy)"""
+        boxes = self.boxes + np.array([dx, dy, dx, dy], dtype=np.float32)
+        return Detections(boxes, self.scores, self.class_ids, self.names, self.extra)
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        Per-detection dicts for the API
+
+        Keys: bbox, confidence, class_id, class_name plus every extra
+        column that is set for that detection.
+        """
+        boxes = self.boxes.tolist()
+        scores = self.scores.tolist()
+        class_ids = self.class_ids.tolist()
+        names = self.class_names()
+        extra = {k: v.tolist() for k, v in self.extra.items() if k != 'class_name'}
+
+        detections = []
+        for i in range(len(scores)):
+            det = {
+                'bbox': boxes[i],
+                'confidence': scores[i],
+                'class_id': class_ids[i],
+                'class_name': names[i]
+            }
+            for key, values in extra.items():
+                value = values[i]
+                if value is None or (isinstance(value, float) and np.isnan(value)):
+                    continue
+                det[key] = value
+            detections.append(det)
+
+        return detections
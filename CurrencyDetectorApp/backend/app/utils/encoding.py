@@ -0,0 +1,209 @@
+"""
+Response encoding utilities
+Crop encoding (PNG / WebP / JPEG) and the /detect response formats
+(JSON with data URIs, multipart/mixed, MessagePack, CBOR)
+"""
+
+import base64
+import json
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Crop formats; 'auto' picks JPEG for banknotes and WebP (with alpha) for coins
+IMAGE_FORMATS = ('png', 'webp', 'jpeg', 'auto')
+
+IMAGE_MEDIA_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+RESPONSE_FORMATS = ('json', 'multipart', 'msgpack', 'cbor')
+
+RESPONSE_MEDIA_TYPES = {
+    'json': 'application/json',
+    'multipart': 'multipart/mixed',
+    'msgpack': 'application/msgpack',
+    'cbor': 'application/cbor',
+}
+
+# Accept header media types -> response format
+ACCEPT_FORMATS = {
+    'application/json': 'json',
+    'multipart/mixed': 'multipart',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack',
+    'application/cbor': 'cbor',
+}
+
+DEFAULT_QUALITY = {'webp': 90, 'jpeg': 90}
+
+
+class FormatUnavailable(RuntimeError):
+    """Raised when a response format needs a package that is not installed"""
+
+
+class ResponseOptions(NamedTuple):
+    response_format: str = 'json'
+    image_format: str = 'png'
+    image_quality: Optional[int] = None
+    image_max_dim: Optional[int] = None
+
+
+def resolve_image_format(image_format: str, currency_type: Optional[str]) -> str:
+    if image_format == 'auto':
+        return 'webp' if currency_type == 'coin' else 'jpeg'
+    return image_format
+
+
+def encode_crop(image: np.ndarray, image_format: str = 'png',
+                quality: Optional[int] = None, max_dim: Optional[int] = None,
+                currency_type: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Encode an extracted currency image
+
+    Args:
+        image: BGR or BGRA crop
+        image_format: One of IMAGE_FORMATS
+        quality: 1-100 for WebP/JPEG (ignored for PNG)
+        max_dim: Downscale so the longest side is at most this
+        currency_type: 'coin' or 'note', used by 'auto'
+
+    Returns:
+        (encoded bytes, media type)
+    """
+    image_format = resolve_image_format(image_format, currency_type)
+
+    if max_dim and max(image.shape[:2]) > max_dim:
+        scale = max_dim / max(image.shape[:2])
+        image = cv2.resize(
+            image,
+            (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+
+    params = []
+    if image_format == 'jpeg':
+        if image.ndim == 3 and image.shape[2] == 4:
+            # JPEG has no alpha, flatten onto white
+            alpha = image[:, :, 3:4].astype(np.float32) / 255.0
+            image = (image[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality or DEFAULT_QUALITY['jpeg']]
+    elif image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality or DEFAULT_QUALITY['webp']]
+
+    ok, buffer = cv2.imencode(f'.{image_format}', image, params)
+    if not ok:
+        raise ValueError(f"Could not encode crop as {image_format}")
+    return buffer.tobytes(), IMAGE_MEDIA_TYPES[image_format]
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Response format from the query parameter, else from the Accept header
+
+    Raises:
+        ValueError: If the requested format is unknown
+    """
+    if requested:
+        if requested not in RESPONSE_FORMATS:
+            raise ValueError(f"response_format must be one of {', '.join(RESPONSE_FORMATS)}")
+        return requested
+
+    for part in (accept or '').split(','):
+        media_type = part.split(';')[0].strip().lower()
+        if media_type in ACCEPT_FORMATS:
+            return ACCEPT_FORMATS[media_type]
+    return 'json'
+
+
+def response_media_type(response_format: str, boundary: str) -> str:
+    if response_format == 'multipart':
+        return f'multipart/mixed; boundary={boundary}'
+    return RESPONSE_MEDIA_TYPES[response_format]
+
+
+def _load_packer(response_format: str):
+    try:
+        if response_format == 'msgpack':
+            import msgpack
+            return lambda obj: msgpack.packb(obj, use_bin_type=True)
+        import cbor2
+        return cbor2.dumps
+    except ImportError:
+        raise FormatUnavailable(f"{response_format} responses are not available on this server")
+
+
+def check_format_available(response_format: str) -> None:
+    """Raise FormatUnavailable before any work is done for the request"""
+    if response_format in ('msgpack', 'cbor'):
+        _load_packer(response_format)
+
+
+def encode_response(payload: Dict, images: Dict[int, Tuple[bytes, str]],
+                    response_format: str = 'json', boundary: str = '') -> bytes:
+    """
+    Serialize a /detect payload and its crops
+
+    json:      crops as base64 data URIs in detection['image']
+    msgpack,
+    cbor:      crops as raw bytes in detection['image'], media type in
+               detection['image_type']
+    multipart: a JSON part followed by one part per crop; detections
+               reference their part with detection['image_part']
+
+    Args:
+        payload: Response payload (detections carry an 'id')
+        images: Detection id -> (encoded crop, media type)
+        response_format: One of RESPONSE_FORMATS
+        boundary: Multipart boundary
+
+    Raises:
+        FormatUnavailable: If msgpack/cbor2 is not installed
+    """
+    detections = payload.get('detections', [])
+
+    if response_format == 'json':
+        for det in detections:
+            if det['id'] in images:
+                data, media_type = images[det['id']]
+                det['image'] = f"data:{media_type};base64,{base64.b64encode(data).decode('ascii')}"
+        return _json(payload)
+
+    if response_format in ('msgpack', 'cbor'):
+        pack = _load_packer(response_format)
+        for det in detections:
+            if det['id'] in images:
+                det['image'], det['image_type'] = images[det['id']]
+        return pack(payload)
+
+    for det in detections:
+        if det['id'] in images:
+            det['image_part'] = f"crop-{det['id']}"
+
+    delimiter = f'--{boundary}\r\n'.encode('ascii')
+    parts = [
+        delimiter,
+        b'Content-Type: application/json\r\nContent-ID: <result>\r\n\r\n',
+        _json(payload),
+        b'\r\n'
+    ]
+    for det_id, (data, media_type) in images.items():
+        parts += [
+            delimiter,
+            f'Content-Type: {media_type}\r\nContent-ID: <crop-{det_id}>\r\n\r\n'.encode('ascii'),
+            data,
+            b'\r\n'
+        ]
+    parts.append(f'--{boundary}--\r\n'.encode('ascii'))
+    return b''.join(parts)
+
+
+def _json(payload: Dict) -> bytes:
+    # Same serialization as fastapi's JSONResponse
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
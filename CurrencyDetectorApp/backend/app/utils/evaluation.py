@@ -0,0 +1,151 @@
+"""
+Accuracy evaluation utilities
+Reads YOLO label files and computes mAP50 / precision / recall
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from utils.boxes import box_iou
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
+
+def load_class_names(dataset_dir: str) -> Dict[int, str]:
+    """Class names from a dataset's data.yaml"""
+    with open(Path(dataset_dir) / 'data.yaml', encoding='utf-8') as f:
+        names = yaml.safe_load(f)['names']
+    if isinstance(names, list):
+        names = dict(enumerate(names))
+    return {int(k): v for k, v in names.items()}
+
+
+def load_yolo_labels(label_path: str, width: int, height: int) -> List[Tuple[int, List[float]]]:
+    """
+    Read a YOLO label file as (class_id, [x1, y1, x2, y2]) in pixels
+
+    Handles both box rows (class cx cy w h) and the polygon rows
+    (class x1 y1 x2 y2 ...) exported by Roboflow.
+    """
+    labels = []
+    path = Path(label_path)
+    if not path.exists():
+        return labels
+
+    for line in path.read_text().splitlines():
+        values = line.split()
+        if len(values) < 5:
+            continue
+
+        class_id = int(values[0])
+        coords = np.array(values[1:], dtype=np.float64)
+
+        if len(coords) == 4:
+            cx, cy, w, h = coords
+            box = [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+        else:
+            xs, ys = coords[0::2], coords[1::2]
+            box = [xs.min(), ys.min(), xs.max(), ys.max()]
+
+        labels.append((class_id, [box[0] * width, box[1] * height,
+                                  box[2] * width, box[3] * height]))
+
+    return labels
+
+
+def list_split(dataset_dir: str, split: str = 'test',
+               limit: Optional[int] = None) -> List[Tuple[Path, Path]]:
+    """(image path, label path) pairs of a dataset split"""
+    image_dir = Path(dataset_dir) / split / 'images'
+    label_dir = Path(dataset_dir) / split / 'labels'
+    images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if limit:
+        images = images[:limit]
+    return [(p, label_dir / f"{p.stem}.txt") for p in images]
+
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """Area under the precision envelope (all-point interpolation)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    idx = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def evaluate_detections(predictions: List[List[Dict]],
+                        ground_truths: List[List[Tuple[str, List[float]]]],
+                        iou_threshold: float = 0.5,
+                        conf_threshold: float = 0.25) -> Dict:
+    """
+    Compare detections with labels, matching on class name
+
+    Args:
+        predictions: Per image, detections with 'class_name', 'bbox' and
+            'confidence' (or 'ensemble_confidence')
+        ground_truths: Per image, (class_name, bbox) pairs
+        iou_threshold: IoU needed for a true positive
+        conf_threshold: Confidence at which precision/recall are reported
+
+    Returns:
+        {'map50', 'precision', 'recall', 'per_class': {name: ap}}
+    """
+    records = {}   # class -> list of (confidence, is_true_positive)
+    gt_counts = {}
+
+    for preds, gts in zip(predictions, ground_truths):
+        for name, _ in gts:
+            gt_counts[name] = gt_counts.get(name, 0) + 1
+
+        used = set()
+        ordered = sorted(preds, key=lambda d: -d.get('ensemble_confidence', d['confidence']))
+        for det in ordered:
+            name = det['class_name']
+            conf = det.get('ensemble_confidence', det['confidence'])
+            candidates = [i for i, (gt_name, _) in enumerate(gts)
+                          if gt_name == name and i not in used]
+
+            hit = False
+            if candidates:
+                ious = box_iou(np.asarray(det['bbox'], dtype=np.float64),
+                               np.array([gts[i][1] for i in candidates], dtype=np.float64))
+                best = int(ious.argmax())
+                if ious[best] >= iou_threshold:
+                    used.add(candidates[best])
+                    hit = True
+
+            records.setdefault(name, []).append((conf, hit))
+
+    per_class = {}
+    tp_total = fp_total = 0
+    for name, n_gt in gt_counts.items():
+        recs = sorted(records.get(name, []), key=lambda r: -r[0])
+        hits = np.array([hit for _, hit in recs], dtype=bool)
+        confs = np.array([conf for conf, _ in recs])
+
+        if len(hits):
+            tp = np.cumsum(hits)
+            fp = np.cumsum(~hits)
+            per_class[name] = average_precision(tp / n_gt, tp / (tp + fp))
+        else:
+            per_class[name] = 0.0
+
+        above = confs >= conf_threshold if len(confs) else np.zeros(0, dtype=bool)
+        tp_total += int(hits[above].sum()) if len(hits) else 0
+        fp_total += int((~hits[above]).sum()) if len(hits) else 0
+
+    # Predictions of classes that have no labels at all are false positives
+    for name, recs in records.items():
+        if name not in gt_counts:
+            fp_total += sum(1 for conf, _ in recs if conf >= conf_threshold)
+
+    n_gt_total = sum(gt_counts.values())
+    return {
+        'map50': float(np.mean(list(per_class.values()))) if per_class else 0.0,
+        'precision': tp_total / (tp_total + fp_total) if tp_total + fp_total else 0.0,
+        'recall': tp_total / n_gt_total if n_gt_total else 0.0,
+        'per_class': per_class
+    }
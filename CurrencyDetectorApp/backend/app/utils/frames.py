@@ -0,0 +1,139 @@
+"""
+Server-side frame store
+Keeps decoded frames of lazy /detect requests so crops can be extracted
+and encoded only when a client asks for them
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class StoredFrame:
+    """A decoded frame, its detections and the crops encoded so far"""
+
+    def __init__(self, image: np.ndarray, detections: List[Dict], expires: float):
+        self.image = image
+        self.detections = detections  # indexed by detection id
+        self.expires = expires
+        self.crops: Dict[Hashable, Tuple[bytes, str]] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self.image.nbytes + sum(len(data) for data, _ in self.crops.values())
+
+    def region(self, bbox: List[float], padding: int) -> Tuple[np.ndarray, List[float]]:
+        """
+        Cut bbox plus padding out of the frame
+
+        Returns:
+            (region view, bbox in region coordinates); extracting from the
+            region gives the same crop as extracting from the whole frame
+            but only the region has to be handed to a worker process
+        """
+        h, w = self.image.shape[:2]
+        x1, y1, x2, y2 = map(int, bbox)
+        rx1, ry1 = max(0, x1 - padding), max(0, y1 - padding)
+        rx2, ry2 = min(w, x2 + padding), min(h, y2 + padding)
+        return (
+            self.image[ry1:ry2, rx1:rx2],
+            [x1 - rx1, y1 - ry1, x2 - rx1, y2 - ry1]
+        )
+
+
+class FrameStore:
+    """
+    LRU of decoded frames with a byte budget and a TTL
+
+    Thread-safe. Encoded crops are stored with their frame and count
+    against the same budget.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: float = 120.0):
+        """
+        Args:
+            max_bytes: Total size of frames and cached crops
+            ttl: Seconds a frame stays available after /detect
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._frames: 'OrderedDict[str, StoredFrame]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.evictions = 0
+        self.crop_hits = 0
+        self.crop_misses = 0
+
+    def put(self, image: np.ndarray, detections: List[Dict]) -> str:
+        """Store a frame and return its id"""
+        frame_id = uuid.uuid4().hex
+        frame = StoredFrame(image, detections, time.monotonic() + self.ttl)
+        with self._lock:
+            self._frames[frame_id] = frame
+            self._bytes += frame.nbytes
+            self._evict()
+        return frame_id
+
+    def get(self, frame_id: str) -> Optional[StoredFrame]:
+        """Return a frame that has not expired, or None"""
+        with self._lock:
+            frame = self._frames.get(frame_id)
+            if frame is None:
+                return None
+            if frame.expires <= time.monotonic():
+                self._remove(frame_id)
+                return None
+            self._frames.move_to_end(frame_id)
+            return frame
+
+    def get_crop(self, frame_id: str, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            frame = self._frames.get(frame_id)
+            crop = frame.crops.get(key) if frame is not None else None
+            if crop is None:
+                self.crop_misses += 1
+            else:
+                self.crop_hits += 1
+            return crop
+
+    def put_crop(self, frame_id: str, key: Hashable, crop: Tuple[bytes, str]) -> None:
+        with self._lock:
+            frame = self._frames.get(frame_id)
+            if frame is None or key in frame.crops:
+                return
+            frame.crops[key] = crop
+            self._bytes += len(crop[0])
+            self._evict()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'frames': len(self._frames),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'evictions': self.evictions,
+                'crop_hits': self.crop_hits,
+                'crop_misses': self.crop_misses
+            }
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for frame_id in [f for f, frame in self._frames.items() if frame.expires <= now]:
+            self._remove(frame_id)
+            self.evictions += 1
+
+        # Keep the newest frame even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._frames) > 1:
+            self._remove(next(iter(self._frames)))
+            self.evictions += 1
+
+    def _remove(self, frame_id: str) -> None:
+        frame = self._frames.pop(frame_id)
+        self._bytes -= frame.nbytes
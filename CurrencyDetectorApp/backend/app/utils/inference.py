@@ -1,18 +1,112 @@
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.backends import DetectionBackend, load_model
+from utils.batching import BatchScheduler
+from utils.boxes import batched_nms, greedy_match, iou_matrix, merge_boxes
+from utils.detections import Detections
+from utils.telemetry import StageTimer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# none       - feed the image to the models as is
+# clahe_only - contrast enhancement only
+# fast       - CLAHE + bilateral filter
+# full       - CLAHE + non-local means denoising (slowest)
+PREPROCESSING_PROFILES = ('none', 'clahe_only', 'fast', 'full')
+
+# Binary class -> specific model that classifies it
+SPECIFIC_MODELS = {'note': 'banknote', 'coin': 'coin'}
+
+
+class TypePrior:
+    """
+    Decayed counts of the currency types in one client's recent results
+
+    Gives the type_hint of speculative detection. Kept per stream or
+    request, so one user's coin-heavy stream never changes which model
+    runs first for anybody else.
+    """
+
+    def __init__(self, decay: float = 0.9):
+        self.decay = decay
+        self.weights = {currency_type: 0.0 for currency_type in SPECIFIC_MODELS}
+
+    def update(self, types: Iterable[str]) -> None:
+        """Add the types found in one image"""
+        found = set(types) & set(self.weights)
+        for currency_type in self.weights:
+            self.weights[currency_type] *= self.decay
+            if currency_type in found:
+                self.weights[currency_type] += 1.0 / len(found)
+
+    def likely(self) -> Optional[str]:
+        """Type seen most recently and often, None before any"""
+        currency_type, weight = max(self.weights.items(), key=lambda item: item[1])
+        return currency_type if weight > 0 else None
+
+
+def denomination(class_name: str) -> Optional[int]:
+    """Face value in denars of a specific class, e.g. '10_note' -> 10"""
+    value = class_name.split('_', 1)[0]
+    return int(value) if value.isdigit() else None
+
 class CurrencyDetector:
-    def __init__(self, model_paths: Dict[str, str], device: str = 'cuda'):
+    def __init__(self, model_paths: Dict[str, str], device: str = 'cuda',
+                 preprocessing_profile: str = 'full', image_size: int = 640,
+                 backend: str = 'torch', num_threads: int = 0,
+                 parallel_loading: bool = True, lazy_specific: bool = False,
+                 binary_image_size: Optional[int] = None):
+        """
+        Args:
+            model_paths: Model name ('binary', 'banknote', 'coin') -> path
+            device: Device for the torch backend
+            preprocessing_profile: Profile used with use_preprocessing=True
+            image_size: Model input size
+            backend: One of utils.backends.BACKENDS
+            num_threads: Intra-op threads for onnx/openvino (0 = default)
+            parallel_loading: Load the models in parallel threads
+            lazy_specific: Load the banknote/coin models on first use
+            binary_image_size: Input size of the binary stage, below
+                image_size runs it at low resolution first (None: image_size)
+        """
         self.device = device
-        self.models = {}
+        self.backend = backend
+        self.num_threads = num_threads
+        self.models: Dict[str, DetectionBackend] = {}
+        # Seconds each model took to load and to warm up
+        self.load_times: Dict[str, float] = {}
+        self.warmup_times: Dict[str, float] = {}
+
+        self._model_paths = dict(model_paths)
+        # Specific models that are loaded when first needed
+        self._lazy = {name for name in model_paths
+                      if lazy_specific and name in SPECIFIC_MODELS.values()}
+        self._model_lock = threading.Lock()
+
+        if preprocessing_profile not in PREPROCESSING_PROFILES:
+            raise ValueError(f"Unknown preprocessing profile: {preprocessing_profile}")
+
+        # Profile used when detect() is called with use_preprocessing=True
+        self.preprocessing_profile = preprocessing_profile
+        # Model input size; preprocessing works at this resolution
+        self.image_size = image_size
+
+        # CLAHE objects keep internal buffers, so each thread reuses its own
+        self._local = threading.local()
+
+        # Runs the banknote and coin passes of mixed scenes side by side
+        self._stage_pool = ThreadPoolExecutor(
+            max_workers=len(SPECIFIC_MODELS), thread_name_prefix='specific'
+        )
 
         # Confidence thresholds - ADJUST THESE FOR BETTER ACCURACY
         self.binary_threshold = 0.35
@@ -20,34 +114,206 @@ class CurrencyDetector:
         self.coin_threshold = 0.45
         self.iou_threshold = 0.5
 
-        for name, path in model_paths.items():
+        # ROI cascade: margin around binary boxes (fraction of box size)
+        # and the input size the specific model runs at on the crops
+        self.roi_margin = 0.15
+        self.roi_image_size = 320
+
+        # Adaptive binary resolution: the coarse coin/note stage runs at
+        # binary_image_size and is re-run at image_size only for images
+        # whose low-res result is empty or ambiguous (a box below
+        # binary_escalate_confidence, or a coin and a note box on the
+        # same object). The specific stage always runs at image_size.
+        self.binary_image_size = binary_image_size or image_size
+        self.binary_escalate_confidence = 0.6
+        # Images that went through the low-res binary pass / were re-run
+        self.binary_low_res = 0
+        self.binary_escalations = 0
+
+        # Speculative ordering (speculative=True with a type_hint): the
+        # specific model of the hinted type runs first and its answer is
+        # kept when every box scores at least speculative_confidence. The
+        # hint comes from the caller (client, previous frame, TypePrior of
+        # one connection), never from other clients' results.
+        self.speculative_confidence = 0.7
+        # Images per path: 'cascade' (binary first), 'speculative'
+        # (answered by one specific pass) and 'fallback' (speculation
+        # rejected, cascade run afterwards)
+        self.path_counts = {'cascade': 0, 'speculative': 0, 'fallback': 0}
+        # Counters are updated from request, stage and batching threads
+        self._stats_lock = threading.Lock()
+
+        # Tiled mode: images longer than tile_max_scale * image_size are
+        # cut into tiles of that size overlapping by tile_overlap (at most
+        # tile_max_count tiles, larger tiles beyond that); duplicates at
+        # the seams are merged with tile_merge ('nms' or 'wbf') when they
+        # overlap more than tile_merge_threshold of the smaller box
+        self.tile_max_scale = 2.0
+        self.tile_overlap = 0.2
+        self.tile_max_count = 16
+        self.tile_merge = 'nms'
+        self.tile_merge_threshold = 0.6
+
+        eager = [name for name in model_paths if name not in self._lazy]
+        if parallel_loading and len(eager) > 1:
+            # Loading is mostly file I/O and native code that releases the GIL
+            with ThreadPoolExecutor(max_workers=len(eager), thread_name_prefix='load') as pool:
+                list(pool.map(self._load_model, eager))
+        else:
+            for name in eager:
+                self._load_model(name)
+
+    def _load_model(self, name: str) -> None:
+        try:
+            start = time.perf_counter()
+            model = load_model(self._model_paths[name], self.backend, self.device, self.num_threads)
+            self.load_times[name] = time.perf_counter() - start
+            self.models[name] = model
+            logger.info(f"✅ Loaded {name} model ({self.backend}) in {self.load_times[name]:.2f}s")
+        except Exception as e:
+            logger.error(f"❌ Failed to load {name} model: {e}")
+
+    def get_model(self, name: str) -> Optional[DetectionBackend]:
+        """A loaded model, loading a lazy one now; None if unavailable"""
+        model = self.models.get(name)
+        if model is None and name in self._lazy:
+            with self._model_lock:
+                if name in self._lazy:
+                    self._load_model(name)
+                    self._lazy.discard(name)
+            model = self.models.get(name)
+        return model
+
+    def fuse_models(self) -> None:
+        """Fuse every loaded model (see DetectionBackend.fuse)"""
+        for name, model in list(self.models.items()):
             try:
-                self.models[name] = YOLO(path)
-                logger.info(f"✅ Loaded {name} model")
+                model.fuse()
             except Exception as e:
-                logger.error(f"❌ Failed to load {name} model: {e}")
+                logger.error(f"❌ Fusing {name} model failed: {e}")
+
+    def warm_up(self, image_size: Optional[int] = None) -> Dict[str, float]:
+        """
+        Run every loaded model once on a blank image
+
+        The first inference allocates buffers and (torch, openvino)
+        builds kernels; doing it here keeps that out of the first request.
+
+        Returns:
+            Seconds per model
+        """
+        size = image_size or self.image_size
+        dummy = np.zeros((size, size, 3), dtype=np.uint8)
+        self.preprocess_image(dummy, self.preprocessing_profile)
+
+        for name, model in list(self.models.items()):
+            # The binary stage may also run at its low resolution
+            sizes = {self.image_size, self.binary_image_size} if name == 'binary' else {self.image_size}
+            start = time.perf_counter()
+            try:
+                for imgsz in sorted(sizes):
+                    model.predict([dummy], conf=0.5, iou=self.iou_threshold, imgsz=imgsz)
+            except Exception as e:
+                logger.error(f"❌ Warm-up of {name} model failed: {e}")
+                continue
+            self.warmup_times[name] = time.perf_counter() - start
+        return dict(self.warmup_times)
+
+    def model_status(self) -> Dict[str, Dict]:
+        """Per model: loaded, lazy, warmed and the measured seconds"""
+        return {
+            name: {
+                'loaded': name in self.models,
+                'lazy': name in self._lazy,
+                'warmed': name in self.warmup_times,
+                'load_s': self.load_times.get(name),
+                'warmup_s': self.warmup_times.get(name)
+            }
+            for name in self._model_paths
+        }
+
+    def settings(self) -> Dict:
+        """Everything besides the input that changes detect() results"""
+        return {
+            'binary_threshold': self.binary_threshold,
+            'banknote_threshold': self.banknote_threshold,
+            'coin_threshold': self.coin_threshold,
+            'iou_threshold': self.iou_threshold,
+            'roi_margin': self.roi_margin,
+            'roi_image_size': self.roi_image_size,
+            'binary_image_size': self.binary_image_size,
+            'binary_escalate_confidence': self.binary_escalate_confidence,
+            'speculative_confidence': self.speculative_confidence,
+            'tile_max_scale': self.tile_max_scale,
+            'tile_overlap': self.tile_overlap,
+            'tile_max_count': self.tile_max_count,
+            'tile_merge': self.tile_merge,
+            'tile_merge_threshold': self.tile_merge_threshold,
+            'image_size': self.image_size,
+            'backend': self.backend
+        }
+
+    def _get_clahe(self):
+        clahe = getattr(self._local, 'clahe', None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            self._local.clahe = clahe
+        return clahe
+
+    def _resize_to_model_size(self, image: np.ndarray) -> np.ndarray:
+        """Downscale so the longest side matches the model input size"""
+        h, w = image.shape[:2]
+        scale = self.image_size / max(h, w)
+        if scale >= 1.0:
+            return image
+        return cv2.resize(
+            image,
+            (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+
+    def preprocess_image(self, image: np.ndarray, profile: str = 'full') -> np.ndarray:
+        """
+        Enhance image quality for better detection
+
+        The image is first downscaled to the model input size (the models
+        never see more pixels than that), so the returned image may be
+        smaller than the input.
+
+        Args:
+            image: Input image (BGR format)
+            profile: One of PREPROCESSING_PROFILES
+
+        Returns:
+            Enhanced image
+        """
+        if profile == 'none':
+            return image
 
-    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
-        """Enhance image quality for better detection"""
         try:
             # Convert grayscale to BGR if needed
             if len(image.shape) == 2:
                 image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
 
+            resized = self._resize_to_model_size(image)
+
             # Enhance contrast using CLAHE
-            lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+            lab = cv2.cvtColor(resized, cv2.COLOR_BGR2LAB)
             l, a, b = cv2.split(lab)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            l = clahe.apply(l)
+            l = self._get_clahe().apply(l)
             enhanced = cv2.merge([l, a, b])
             enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
 
+            if profile == 'clahe_only':
+                return enhanced
+
             # Reduce noise
-            denoised = cv2.fastNlMeansDenoisingColored(
+            if profile == 'fast':
+                return cv2.bilateralFilter(enhanced, 5, 50, 50)
+
+            return cv2.fastNlMeansDenoisingColored(
                 enhanced, None, 10, 10, 7, 21
             )
-
-            return denoised
         except Exception as e:
             logger.warning(f"Preprocessing failed: {e}, using original image")
             return image
@@ -55,34 +321,32 @@ class CurrencyDetector:
     def detect_with_confidence_filter(
             self,
             image: np.ndarray,
-            model: YOLO,
+            model: DetectionBackend,
             conf_threshold: float
     ) -> List[Dict]:
         """Run detection and filter by confidence"""
+        return self.detect_batch_with_confidence_filter(
+            [image], model, conf_threshold
+        )[0].to_dicts()
+
+    def detect_batch_with_confidence_filter(
+            self,
+            images: List[np.ndarray],
+            model: DetectionBackend,
+            conf_threshold: float,
+            imgsz: Optional[int] = None
+    ) -> List[Detections]:
+        """Run detection on a batch of images in one model call"""
         try:
-            results = model(
-                image,
+            return model.predict(
+                images,
                 conf=conf_threshold,
                 iou=self.iou_threshold,
-                verbose=False
+                imgsz=imgsz
             )
-
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    detection = {
-                        'bbox': box.xyxy[0].cpu().numpy().tolist(),
-                        'confidence': float(box.conf[0]),
-                        'class_id': int(box.cls[0]),
-                        'class_name': model.names[int(box.cls[0])]
-                    }
-                    detections.append(detection)
-
-            return detections
         except Exception as e:
             logger.error(f"Detection failed: {e}")
-            return []
+            return [Detections.empty(model.names) for _ in images]
 
     def calculate_iou(self, box1: List[float], box2: List[float]) -> float:
         """Calculate IoU between two bounding boxes"""
@@ -104,46 +368,46 @@ class CurrencyDetector:
 
     def ensemble_vote(
             self,
-            binary_dets: List[Dict],
-            specific_dets: List[Dict]
-    ) -> List[Dict]:
-        """Combine binary and specific model predictions"""
-        if not binary_dets or not specific_dets:
-            return specific_dets
-
-        matched_dets = []
-
-        for binary_det in binary_dets:
-            best_match = None
-            best_iou = 0.3  # Minimum IoU threshold
-
-            for specific_det in specific_dets:
-                iou = self.calculate_iou(
-                    binary_det['bbox'],
-                    specific_det['bbox']
-                )
+            binary_dets: Detections,
+            specific_dets: Detections
+    ) -> Detections:
+        """
+        Combine binary and specific model predictions
 
-                if iou > best_iou:
-                    best_iou = iou
-                    best_match = specific_det.copy()
+        The full binary x specific IoU matrix is computed in one shot and
+        pairs are assigned one-to-one, highest IoU first.
+        """
+        if not len(binary_dets) or not len(specific_dets):
+            return specific_dets
 
-            if best_match:
-                # Combine confidence scores
-                best_match['binary_confidence'] = binary_det['confidence']
-                best_match['ensemble_confidence'] = max(
-                    binary_det['confidence'],
-                    best_match['confidence']
-                )
+        # Minimum IoU threshold 0.3
+        rows, cols = greedy_match(
+            iou_matrix(binary_dets.boxes, specific_dets.boxes), 0.3
+        )
+        if rows.size == 0:
+            return specific_dets
 
-                matched_dets.append(best_match)
+        # Keep the binary order of the original matching loop
+        order = np.argsort(rows, kind='stable')
+        rows, cols = rows[order], cols[order]
 
-        return matched_dets if matched_dets else specific_dets
+        binary_conf = binary_dets.scores[rows]
+        matched = specific_dets[cols]
+        # Combine confidence scores
+        return matched.with_column('binary_confidence', binary_conf).with_column(
+            'ensemble_confidence', np.maximum(binary_conf, matched.scores)
+        )
 
     def detect(
             self,
             image: np.ndarray,
             use_preprocessing: bool = False,
-            use_ensemble: bool = True
+            use_ensemble: bool = True,
+            preprocessing: Optional[str] = None,
+            use_roi_cascade: bool = False,
+            use_tiling: bool = False,
+            speculative: bool = False,
+            type_hint: Optional[str] = None
     ) -> Dict:
         """
         Main detection pipeline
@@ -152,113 +416,677 @@ class CurrencyDetector:
             image: Input image (BGR format)
             use_preprocessing: Apply image enhancement
             use_ensemble: Use ensemble voting for better accuracy
+            preprocessing: Preprocessing profile, overrides use_preprocessing
+            use_roi_cascade: Run the specific model only on binary crops
+            use_tiling: Detect on overlapping tiles of large images
+            speculative: Run the specific model of the likely type first
+            type_hint: Likely type ('coin' or 'note') for speculative mode
 
         Returns:
             Detection results dictionary
         """
-        # Preprocess image
-        if use_preprocessing:
-            processed_image = self.preprocess_image(image)
+        return self.detect_batch(
+            [image],
+            use_preprocessing=use_preprocessing,
+            use_ensemble=use_ensemble,
+            preprocessing=preprocessing,
+            use_roi_cascade=use_roi_cascade,
+            use_tiling=use_tiling,
+            speculative=speculative,
+            type_hint=type_hint
+        )[0]
+
+    def detect_batch(
+            self,
+            images: List[np.ndarray],
+            use_preprocessing: bool = False,
+            use_ensemble: bool = True,
+            preprocessing: Optional[str] = None,
+            use_roi_cascade: bool = False,
+            use_tiling: bool = False,
+            speculative: bool = False,
+            type_hint: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Detection pipeline for several images at once
+
+        The binary model runs once over the whole batch, then its boxes are
+        grouped by class and every specific model runs once over the
+        images that contain its type (both in parallel when a batch holds
+        banknotes and coins).
+
+        Args:
+            images: Input images (BGR format)
+            use_preprocessing: Apply image enhancement
+            use_ensemble: Use ensemble voting for better accuracy
+            preprocessing: Preprocessing profile, overrides use_preprocessing
+            use_roi_cascade: Run the specific model only on binary crops
+            use_tiling: Cut large images into overlapping tiles (see
+                tile_windows); the tiles of all images form one batch
+            speculative: Run the specific model of the likely type first
+                and the binary model only for uncertain images
+            type_hint: Likely type ('coin' or 'note') for speculative
+                mode, e.g. from the client or the previous frame;
+                without one the cascade runs
+
+        Returns:
+            One detection results dictionary per input image
+            (boxes are in the coordinates of the input images); its
+            'timings' holds the seconds per stage of the whole batch
+        """
+        if not images:
+            return []
+
+        if preprocessing is None:
+            preprocessing = self.preprocessing_profile if use_preprocessing else 'none'
+        if preprocessing not in PREPROCESSING_PROFILES:
+            raise ValueError(f"Unknown preprocessing profile: {preprocessing}")
+
+        if type_hint is not None and type_hint not in SPECIFIC_MODELS:
+            raise ValueError(f"Unknown currency type: {type_hint}")
+
+        timer = StageTimer()
+        images = [to_bgr_array(image) for image in images]
+        first_type = type_hint if speculative else None
+
+        if use_tiling:
+            results = self._detect_tiled(
+                images, preprocessing, use_ensemble, use_roi_cascade, timer, first_type
+            )
+        else:
+            results = self._detect_images(
+                images, preprocessing, use_ensemble, use_roi_cascade, timer, first_type
+            )
+
+        # Build the response dicts only now
+        with timer.stage('postprocess'):
+            for result in results:
+                result['detections'] = result['detections'].to_dicts()
+
+        for result in results:
+            result['timings'] = dict(timer.stages)
+
+        return results
+
+    def _detect_images(
+            self,
+            images: List[np.ndarray],
+            preprocessing: str,
+            use_ensemble: bool,
+            use_roi_cascade: bool,
+            timer: StageTimer,
+            first_type: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        The pipeline of detect_batch(), detections still as Detections
+        (in the coordinates of the input images)
+
+        Args:
+            first_type: Speculate on this currency type (see
+                _detect_speculative); None runs the binary-first cascade
+        """
+        # Preprocess images
+        with timer.stage('preprocess'):
+            processed_images = [
+                self.preprocess_image(image, preprocessing) for image in images
+            ]
+
+        if first_type is None:
+            results = self._cascade(
+                images, processed_images, use_ensemble, use_roi_cascade, timer
+            )
+            self._count_path('cascade', len(images))
         else:
-            processed_image = image
+            results = self._detect_speculative(
+                images, processed_images, first_type, use_ensemble, use_roi_cascade, timer
+            )
+
+        # Map boxes from the (possibly downscaled) processed images back
+        with timer.stage('postprocess'):
+            for image, processed, result in zip(images, processed_images, results):
+                if processed.shape[:2] != image.shape[:2]:
+                    result['detections'] = result['detections'].scale(
+                        image.shape[1] / processed.shape[1],
+                        image.shape[0] / processed.shape[0]
+                    )
 
+        return results
+
+    def _cascade(
+            self,
+            images: List[np.ndarray],
+            processed_images: List[np.ndarray],
+            use_ensemble: bool,
+            use_roi_cascade: bool,
+            timer: StageTimer
+    ) -> List[Dict]:
+        """Binary model first, then the specific model of each found type"""
         # Step 1: Binary classification (coin vs note)
-        binary_dets = self.detect_with_confidence_filter(
-            processed_image,
-            self.models['binary'],
-            self.binary_threshold
+        with timer.stage('binary'):
+            binary_batch = self.detect_binary(processed_images)
+
+        results: List[Optional[Dict]] = [None] * len(images)
+
+        # Binary detections of every image, grouped by currency type
+        by_type: List[Dict[str, Detections]] = []
+        for idx, binary_dets in enumerate(binary_batch):
+            groups: Dict[str, Detections] = {}
+            for class_id in np.unique(binary_dets.class_ids):
+                name = binary_dets.names.get(int(class_id), str(int(class_id)))
+                groups[name] = binary_dets[binary_dets.class_ids == class_id]
+            by_type.append(groups)
+
+            if not len(binary_dets):
+                results[idx] = {
+                    'success': False,
+                    'message': 'Не е детектирана валута',
+                    'type': None,
+                    'detections': Detections.empty()
+                }
+
+        # Step 2: Specific classification, one batched call per type
+        # for the images where that type was found
+        jobs = {}
+        for currency_type in SPECIFIC_MODELS:
+            indices = [idx for idx, groups in enumerate(by_type) if currency_type in groups]
+            if indices:
+                jobs[currency_type] = indices
+
+        def run(currency_type):
+            return self._run_specific(
+                currency_type, jobs[currency_type], images,
+                processed_images, by_type, use_roi_cascade
+            )
+
+        with timer.stage('specific'):
+            if len(jobs) > 1:
+                # Banknote and coin passes are independent, run them in parallel
+                futures = {t: self._stage_pool.submit(run, t) for t in jobs}
+                specific = {t: future.result() for t, future in futures.items()}
+            else:
+                specific = {t: run(t) for t in jobs}
+
+        with timer.stage('ensemble'):
+            for idx, groups in enumerate(by_type):
+                if results[idx] is None:
+                    results[idx] = self._finalize(
+                        groups,
+                        {t: None if specific[t] is None
+                         else specific[t].get(idx, Detections.empty())
+                         for t in groups},
+                        use_ensemble
+                    )
+
+        return results
+
+    def _detect_speculative(
+            self,
+            images: List[np.ndarray],
+            processed_images: List[np.ndarray],
+            first_type: str,
+            use_ensemble: bool,
+            use_roi_cascade: bool,
+            timer: StageTimer
+    ) -> List[Dict]:
+        """
+        Speculative ordering: the specific model of the likely type first
+
+        Images where every box scores at least speculative_confidence are
+        answered from that single pass (no binary model, no ensemble).
+        The others, including images without boxes, go through the full
+        cascade as one batch.
+        """
+        model_name = SPECIFIC_MODELS[first_type]
+        model = self.get_model(model_name)
+        if model is None:
+            self._count_path('cascade', len(images))
+            return self._cascade(images, processed_images, use_ensemble, use_roi_cascade, timer)
+
+        with timer.stage('specific'):
+            batch = self.detect_batch_with_confidence_filter(
+                processed_images, model, getattr(self, f'{model_name}_threshold'),
+                imgsz=self.image_size
+            )
+
+        results: List[Optional[Dict]] = [None] * len(images)
+        retry = []
+        with timer.stage('ensemble'):
+            for idx, dets in enumerate(batch):
+                if len(dets) and dets.scores.min() >= self.speculative_confidence:
+                    results[idx] = self._finalize(
+                        {first_type: Detections.empty()}, {first_type: dets}, False
+                    )
+                else:
+                    retry.append(idx)
+
+        self._count_path('speculative', len(images) - len(retry))
+        self._count_path('fallback', len(retry))
+
+        if retry:
+            fallback = self._cascade(
+                [images[idx] for idx in retry],
+                [processed_images[idx] for idx in retry],
+                use_ensemble, use_roi_cascade, timer
+            )
+            for idx, result in zip(retry, fallback):
+                results[idx] = result
+
+        return results
+
+    def _count_path(self, path: str, images: int) -> None:
+        with self._stats_lock:
+            self.path_counts[path] += images
+
+    def binary_ambiguous(self, dets: Detections) -> bool:
+        """Whether a low-res binary result has to be confirmed at full size"""
+        if not len(dets) or dets.scores.min() < self.binary_escalate_confidence:
+            return True
+        if len(np.unique(dets.class_ids)) < 2:
+            return False
+        # Coin and note boxes on the same object: the classes disagree
+        ious = iou_matrix(dets.boxes, dets.boxes)
+        different = dets.class_ids[:, None] != dets.class_ids[None, :]
+        return bool((ious[different] > self.iou_threshold).any())
+
+    def detect_binary(self, images: List[np.ndarray]) -> List[Detections]:
+        """
+        Binary stage (coin vs note) over a batch
+
+        Runs at binary_image_size; when that is below image_size, the
+        images with an ambiguous result (see binary_ambiguous) are
+        re-run at image_size in one more batched call.
+        """
+        model = self.models['binary']
+        if self.binary_image_size >= self.image_size:
+            return self.detect_batch_with_confidence_filter(
+                images, model, self.binary_threshold, imgsz=self.image_size
+            )
+
+        batch = self.detect_batch_with_confidence_filter(
+            images, model, self.binary_threshold, imgsz=self.binary_image_size
         )
+        retry = [idx for idx, dets in enumerate(batch) if self.binary_ambiguous(dets)]
+        with self._stats_lock:
+            self.binary_low_res += len(images)
+            self.binary_escalations += len(retry)
 
-        if not binary_dets:
-            return {
-                'success': False,
-                'message': 'Не е детектирана валута',
-                'type': None,
-                'detections': []
-            }
+        if retry:
+            full = self.detect_batch_with_confidence_filter(
+                [images[idx] for idx in retry], model, self.binary_threshold,
+                imgsz=self.image_size
+            )
+            for idx, dets in zip(retry, full):
+                batch[idx] = dets
+        return batch
 
-        # Determine currency type
-        currency_type = binary_dets[0]['class_name']
+    def tile_windows(self, height: int, width: int) -> np.ndarray:
+        """
+        Overlapping tiles covering an image
 
-        # Step 2: Specific classification
-        if currency_type == 'note':
-            specific_model = self.models.get('banknote')
-            conf_threshold = self.banknote_threshold
-            type_name = 'banknote'
-        else:
-            specific_model = self.models.get('coin')
-            conf_threshold = self.coin_threshold
-            type_name = 'coin'
+        Tiles are squares of tile_max_scale * image_size pixels (so the
+        models see them downscaled at most that much) spread evenly from
+        edge to edge with at least tile_overlap overlap. Images that fit
+        into one tile get a single window, the untiled fast path.
 
-        if specific_model is None:
-            return {
-                'success': False,
-                'message': f'{type_name} модел не е вчитан',
-                'type': currency_type,
-                'detections': []
-            }
+        Returns:
+            (K, 4) int windows as x1, y1, x2, y2
+        """
+        tile = round(self.image_size * self.tile_max_scale)
+        if max(height, width) <= tile:
+            return np.array([[0, 0, width, height]])
+
+        def count(side: int, size: int) -> int:
+            if side <= size:
+                return 1
+            return math.ceil((side - size) / (size * (1 - self.tile_overlap))) + 1
+
+        # Grow the tiles until their number fits the budget
+        while count(width, tile) * count(height, tile) > self.tile_max_count:
+            tile = round(tile * 1.25)
+
+        tile_w, tile_h = min(tile, width), min(tile, height)
+        xs = np.linspace(0, width - tile_w, count(width, tile)).round().astype(int)
+        ys = np.linspace(0, height - tile_h, count(height, tile)).round().astype(int)
+        x1, y1 = (grid.ravel() for grid in np.meshgrid(xs, ys))
+        return np.stack([x1, y1, x1 + tile_w, y1 + tile_h], axis=1)
+
+    def merge_tiles(self, dets: Detections) -> Detections:
+        """Merge the duplicates of objects cut by tile borders"""
+        if len(dets) < 2:
+            return dets
+
+        # Class ids of the banknote and coin models overlap, use the names
+        _, classes = np.unique(np.array(dets.class_names(), dtype=object), return_inverse=True)
+        keep, boxes = merge_boxes(
+            dets.boxes, dets.final_scores, classes,
+            self.tile_merge_threshold, self.tile_merge
+        )
+        merged = dets[keep]
+        return Detections(boxes, merged.scores, merged.class_ids, merged.names, merged.extra)
+
+    def _detect_tiled(
+            self,
+            images: List[np.ndarray],
+            preprocessing: str,
+            use_ensemble: bool,
+            use_roi_cascade: bool,
+            timer: StageTimer,
+            first_type: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Tiled variant of _detect_images()
+
+        The tiles of all images run through the cascade as one batch, then
+        the boxes of every image are shifted back from tile coordinates
+        and merged across the seams.
+        """
+        tiles = []
+        owners = []  # (image index, x offset, y offset)
+        for idx, image in enumerate(images):
+            for x1, y1, x2, y2 in self.tile_windows(*image.shape[:2]).tolist():
+                tiles.append(image[y1:y2, x1:x2])
+                owners.append((idx, x1, y1))
+
+        if len(tiles) == len(images):
+            # Nothing to tile
+            return self._detect_images(
+                images, preprocessing, use_ensemble, use_roi_cascade, timer, first_type
+            )
 
-        specific_dets = self.detect_with_confidence_filter(
-            processed_image,
-            specific_model,
-            conf_threshold
+        tile_results = self._detect_images(
+            tiles, preprocessing, use_ensemble, use_roi_cascade, timer, first_type
         )
 
-        if not specific_dets:
+        with timer.stage('tile_merge'):
+            parts: List[List[Detections]] = [[] for _ in images]
+            fallback: List[Optional[Dict]] = [None] * len(images)
+            for (idx, x_off, y_off), result in zip(owners, tile_results):
+                if len(result['detections']):
+                    parts[idx].append(result['detections'].translate(x_off, y_off))
+                elif fallback[idx] is None or (fallback[idx]['type'] is None
+                                               and result['type'] is not None):
+                    # Message of an empty result, preferring tiles where
+                    # the binary model found something
+                    fallback[idx] = result
+
+            results = []
+            for idx, image_parts in enumerate(parts):
+                dets = self.merge_tiles(Detections.concat(image_parts))
+                if not len(dets):
+                    results.append(dict(fallback[idx], detections=dets))
+                    continue
+
+                dets = dets[np.argsort(-dets.final_scores, kind='stable')]
+                found_types = set(dets.extra['type'].tolist())
+                results.append({
+                    'success': True,
+                    'type': found_types.pop() if len(found_types) == 1 else 'mixed',
+                    'detections': dets,
+                    'message': f'Детектирани {len(dets)} објекти'
+                })
+
+        return results
+
+    def detect_rois(
+            self,
+            images: List[np.ndarray],
+            processed_images: List[np.ndarray],
+            binary_batch: List[Detections],
+            model: DetectionBackend,
+            conf_threshold: float
+    ) -> List[Detections]:
+        """
+        Run a specific model only on the regions found by the binary model
+
+        Every binary box (plus margin) is cropped from the original image,
+        all crops of all images go through the model as one batch at
+        roi_image_size, and the boxes are mapped back to processed-image
+        coordinates. Crops come from the original image so small coins
+        keep their full resolution.
+
+        Args:
+            images: Original images
+            processed_images: Images the binary model ran on
+            binary_batch: Binary detections per image
+            model: Specific model
+            conf_threshold: Confidence threshold for the specific model
+
+        Returns:
+            Specific detections per image
+        """
+        crops = []
+        owners = []  # (image index, x offset, y offset, scale to processed)
+
+        for idx, (image, processed, binary_dets) in enumerate(
+                zip(images, processed_images, binary_batch)):
+            h, w = image.shape[:2]
+            scale = w / processed.shape[1]
+
+            boxes = binary_dets.boxes * scale
+            margin = (boxes[:, 2:] - boxes[:, :2]) * self.roi_margin
+            lo = np.maximum(boxes[:, :2] - margin, 0).astype(int)
+            hi = np.minimum(boxes[:, 2:] + margin + 1, [w, h]).astype(int)
+
+            for (x1, y1), (x2, y2) in zip(lo.tolist(), hi.tolist()):
+                if x2 - x1 < 2 or y2 - y1 < 2:
+                    continue
+
+                crops.append(image[y1:y2, x1:x2])
+                owners.append((idx, x1, y1, scale))
+
+        per_image: List[Detections] = [Detections.empty(model.names) for _ in images]
+        if not crops:
+            return per_image
+
+        try:
+            crop_batch = model.predict(
+                crops,
+                conf=conf_threshold,
+                iou=self.iou_threshold,
+                imgsz=self.roi_image_size
+            )
+        except Exception as e:
+            logger.error(f"ROI detection failed: {e}")
+            return per_image
+
+        parts: List[List[Detections]] = [[] for _ in images]
+        for (idx, x_off, y_off, scale), dets in zip(owners, crop_batch):
+            if len(dets):
+                offset = np.array([x_off, y_off, x_off, y_off], dtype=np.float32)
+                parts[idx].append(Detections(
+                    (dets.boxes + offset) / scale, dets.scores,
+                    dets.class_ids, dets.names
+                ))
+
+        for idx, image_parts in enumerate(parts):
+            dets = Detections.concat(image_parts)
+            # Overlapping crops can find the same object twice
+            if len(dets) > 1:
+                dets = dets[batched_nms(
+                    dets.boxes, dets.scores, dets.class_ids, self.iou_threshold
+                )]
+            if len(dets):
+                per_image[idx] = dets
+
+        return per_image
+
+    def _run_specific(
+            self,
+            currency_type: str,
+            indices: List[int],
+            images: List[np.ndarray],
+            processed_images: List[np.ndarray],
+            by_type: List[Dict[str, Detections]],
+            use_roi_cascade: bool
+    ) -> Optional[Dict[int, Detections]]:
+        """
+        Run the specific model of one currency type over a set of images
+
+        Returns:
+            Specific detections keyed by image index, or None if the
+            model is not loaded
+        """
+        model_name = SPECIFIC_MODELS[currency_type]
+        specific_model = self.get_model(model_name)
+        if specific_model is None:
+            return None
+        conf_threshold = getattr(self, f'{model_name}_threshold')
+
+        if use_roi_cascade:
+            specific_batch = self.detect_rois(
+                [images[idx] for idx in indices],
+                [processed_images[idx] for idx in indices],
+                [by_type[idx][currency_type] for idx in indices],
+                specific_model,
+                conf_threshold
+            )
+        else:
+            specific_batch = self.detect_batch_with_confidence_filter(
+                [processed_images[idx] for idx in indices],
+                specific_model,
+                conf_threshold,
+                imgsz=self.image_size
+            )
+
+        return dict(zip(indices, specific_batch))
+
+    def _finalize(
+            self,
+            binary_groups: Dict[str, Detections],
+            specific: Dict[str, Optional[Detections]],
+            use_ensemble: bool
+    ) -> Dict:
+        """
+        Combine, sort and filter the detections of one image
+
+        Args:
+            binary_groups: Binary detections grouped by currency type
+            specific: Specific detections per currency type
+                (None if that type's model is not loaded)
+            use_ensemble: Use ensemble voting
+
+        Returns:
+            Detection results dictionary with the detections still as a
+            Detections container; every detection carries its own 'type'
+            and the result type is 'mixed' when both are present
+        """
+        types = list(binary_groups)
+        currency_type = types[0] if len(types) == 1 else 'mixed'
+
+        parts = []
+        messages = []
+
+        for det_type, binary_dets in binary_groups.items():
+            type_name = SPECIFIC_MODELS[det_type]
+            specific_dets = specific.get(det_type)
+
+            if specific_dets is None:
+                messages.append(f'{type_name} модел не е вчитан')
+                continue
+            if not len(specific_dets):
+                messages.append(f'Не е детектирана специфична класа за {type_name}')
+                continue
+
+            # Step 3: Ensemble voting
+            if use_ensemble:
+                dets = self.ensemble_vote(binary_dets, specific_dets)
+            else:
+                dets = specific_dets
+
+            parts.append(dets.with_column('type', np.array(det_type, dtype=object)))
+
+        final_dets = Detections.concat(parts)
+        if not len(final_dets):
             return {
                 'success': False,
-                'message': f'Не е детектирана специфична класа за {type_name}',
+                'message': messages[0],
                 'type': currency_type,
-                'detections': []
+                'detections': final_dets
             }
 
-        # Step 3: Ensemble voting
-        if use_ensemble:
-            final_dets = self.ensemble_vote(binary_dets, specific_dets)
-        else:
-            final_dets = specific_dets
-
         # Sort by confidence
-        final_dets.sort(
-            key=lambda x: x.get('ensemble_confidence', x['confidence']),
-            reverse=True
-        )
+        scores = final_dets.final_scores
+        order = np.argsort(-scores, kind='stable')
 
         # Filter: Keep only detections above minimum confidence
         MIN_FINAL_CONFIDENCE = 0.4
-        final_dets = [
-            d for d in final_dets
-            if d.get('ensemble_confidence', d['confidence']) >= MIN_FINAL_CONFIDENCE
-        ]
+        final_dets = final_dets[order[scores[order] >= MIN_FINAL_CONFIDENCE]]
 
-        if not final_dets:
+        if not len(final_dets):
             return {
                 'success': False,
                 'message': 'Детекцијата е со ниска сигурност',
                 'type': currency_type,
-                'detections': []
+                'detections': final_dets
             }
 
+        found_types = set(final_dets.extra['type'].tolist())
         return {
             'success': True,
-            'type': currency_type,
+            'type': found_types.pop() if len(found_types) == 1 else 'mixed',
             'detections': final_dets,
             'message': f'Детектирани {len(final_dets)} објекти'
         }
+
+
+def scale_detections(detections: List[Dict], sx: float, sy: float) -> None:
+    """Scale detection boxes in place"""
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        det['bbox'] = [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+
+
+def to_bgr_array(image) -> np.ndarray:
+    """Accept a BGR array or a PIL image and return a BGR array"""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+
 detector = None
+batcher = None
 
-def init_detector(model_paths: Dict[str, str], device: str = 'cuda'):
+def init_detector(model_paths: Dict[str, str], device: str = 'cuda',
+                  preprocessing_profile: str = 'full', backend: str = 'torch',
+                  num_threads: int = 0, lazy_specific: bool = False,
+                  warm_up: bool = False, binary_image_size: Optional[int] = None):
     """Initialize the global detector"""
     global detector
-    detector = CurrencyDetector(model_paths, device)
+    detector = CurrencyDetector(
+        model_paths, device, preprocessing_profile, backend=backend,
+        num_threads=num_threads, lazy_specific=lazy_specific,
+        binary_image_size=binary_image_size
+    )
+    if warm_up:
+        detector.warm_up()
     return detector
 
-def detect_currency(image: np.ndarray) -> Dict:
+def enable_batching(max_batch_size: int = 8, max_wait_ms: float = 10.0):
+    """
+    Route detect_currency() through a micro-batching scheduler
+
+    Concurrent callers (e.g. the /detect worker threads) are grouped into
+    a single detect_batch() call.
+    """
+    global batcher
+    if detector is None:
+        raise RuntimeError("Detector not initialized. Call init_detector() first.")
+
+    if batcher is not None:
+        batcher.close()
+    batcher = BatchScheduler(detector, max_batch_size, max_wait_ms)
+    return batcher
+
+def detect_currency(image: np.ndarray, preprocessing: Optional[str] = None,
+                    **options) -> Dict:
     """
     Wrapper function for backward compatibility
 
     Args:
         image: Input image (BGR format)
+        preprocessing: Preprocessing profile (defaults to the detector's)
+        **options: Extra CurrencyDetector.detect() options,
+            e.g. use_roi_cascade=True
 
     Returns:
         Detection results
@@ -266,8 +1094,32 @@ def detect_currency(image: np.ndarray) -> Dict:
     if detector is None:
         raise RuntimeError("Detector not initialized. Call init_detector() first.")
 
-    return detector.detect(
-        image,
-        use_preprocessing=True,
-        use_ensemble=True
-    )
\ No newline at end of file
+    options = {
+        'use_preprocessing': True,
+        'use_ensemble': True,
+        'preprocessing': preprocessing,
+        **options
+    }
+
+    if batcher is not None:
+        return batcher.detect(image, **options)
+
+    return detector.detect(image, **options)
+
+def detect_currency_batch(images: List[np.ndarray], preprocessing: Optional[str] = None,
+                          **options) -> List[Dict]:
+    """
+    detect_currency() for several images in batched model calls
+
+    Bypasses the micro-batching scheduler, the batch is already formed.
+    """
+    if detector is None:
+        raise RuntimeError("Detector not initialized. Call init_detector() first.")
+
+    options = {
+        'use_preprocessing': True,
+        'use_ensemble': True,
+        'preprocessing': preprocessing,
+        **options
+    }
+    return detector.detect_batch(images, **options)
@@ -0,0 +1,239 @@
+"""
+Upload ingestion utilities
+Validates uploads and decodes them straight into (reduced-size) BGR arrays
+"""
+
+import io
+import os
+import zipfile
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# PIL format name -> file extensions it may be uploaded as
+FORMAT_EXTENSIONS = {
+    'JPEG': {'.jpg', '.jpeg'},
+    'PNG': {'.png'},
+    'WEBP': {'.webp'},
+}
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Largest factor first; IMREAD_REDUCED_* uses DCT scaling for JPEG
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload must be refused; carries the HTTP status"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class InvalidImageError(UploadRejected):
+    """Raised when an upload cannot be decoded as an image"""
+
+    def __init__(self, message: str = "Invalid image file"):
+        super().__init__(message, 400)
+
+
+class ImageHeader(NamedTuple):
+    format: str
+    width: int
+    height: int
+    orientation: int
+
+
+class DecodedImage(NamedTuple):
+    image: np.ndarray                 # image to run detection on
+    full_image: Optional[np.ndarray]  # full resolution, only if requested
+    scale: float                      # full-res pixels per detection pixel
+
+
+def read_header(contents: bytes) -> ImageHeader:
+    """
+    Read format, size and EXIF orientation without decoding pixels
+
+    Raises:
+        InvalidImageError: If the bytes are not a readable image
+    """
+    try:
+        with Image.open(io.BytesIO(contents)) as img:
+            orientation = 1
+            if img.format == 'JPEG':
+                orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+            return ImageHeader(img.format, img.width, img.height, orientation)
+    except Exception:
+        raise InvalidImageError()
+
+
+def validate_upload(contents: bytes, filename: Optional[str], max_bytes: int,
+                    allowed_extensions: set) -> ImageHeader:
+    """
+    Check size, extension and actual image format before decoding
+
+    Args:
+        contents: Raw uploaded bytes
+        filename: Client-supplied file name (may be None)
+        max_bytes: Maximum accepted upload size
+        allowed_extensions: Accepted extensions, e.g. {'.jpg', '.png'}
+
+    Returns:
+        Parsed image header
+
+    Raises:
+        UploadRejected: 413 for oversized uploads, 400 otherwise
+    """
+    if len(contents) > max_bytes:
+        raise UploadRejected(
+            f"Image is larger than {max_bytes / (1024 * 1024):g} MB", 413
+        )
+
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext and ext not in allowed_extensions:
+        raise UploadRejected(f"Unsupported file type: {ext}")
+
+    header = read_header(contents)
+    if not FORMAT_EXTENSIONS.get(header.format, set()) & allowed_extensions:
+        raise UploadRejected(f"Unsupported image format: {header.format}")
+
+    return header
+
+
+def is_zip(contents: bytes, filename: Optional[str] = None) -> bool:
+    return (filename or '').lower().endswith('.zip') or contents[:4] == b'PK\x03\x04'
+
+
+def expand_zip(contents: bytes, allowed_extensions: set, max_files: int,
+               max_bytes: int, max_total_bytes: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """
+    Read the images of a zip upload
+
+    Entries with other extensions (and directories) are skipped.
+
+    Args:
+        contents: Raw zip bytes
+        allowed_extensions: Accepted image extensions
+        max_files: Maximum number of images
+        max_bytes: Maximum uncompressed size of one image
+        max_total_bytes: Maximum uncompressed size of all images together
+
+    Returns:
+        (entry name, bytes) per image, in archive order
+
+    Raises:
+        UploadRejected: For broken archives, too many images or entries
+            whose declared sizes exceed max_bytes or max_total_bytes
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(contents))
+    except zipfile.BadZipFile:
+        raise UploadRejected("Invalid zip file")
+
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and os.path.splitext(info.filename)[1].lower() in allowed_extensions
+        ]
+        if len(entries) > max_files:
+            raise UploadRejected(f"Zip contains more than {max_files} images", 413)
+
+        # Checked before reading so a zip bomb is never inflated; reads
+        # stop at the declared file_size
+        for info in entries:
+            if info.file_size > max_bytes:
+                raise UploadRejected(f"{info.filename} is larger than "
+                                     f"{max_bytes / (1024 * 1024):g} MB", 413)
+        total = sum(info.file_size for info in entries)
+        if max_total_bytes is not None and total > max_total_bytes:
+            raise UploadRejected(f"Zip images are larger than "
+                                 f"{max_total_bytes / (1024 * 1024):g} MB uncompressed", 413)
+
+        images = [(info.filename, archive.read(info)) for info in entries]
+
+    return images
+
+
+def reduced_decode_flag(width: int, height: int, target_size: int) -> Tuple[int, int]:
+    """
+    Pick the strongest decode-time reduction that keeps the longest
+    side at or above target_size
+
+    Returns:
+        (reduction factor, cv2.imdecode flag)
+    """
+    longest = max(width, height)
+    for factor, flag in REDUCED_FLAGS:
+        if longest // factor >= target_size:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def apply_exif_orientation(image: np.ndarray, orientation: int) -> np.ndarray:
+    """Rotate/flip a decoded image according to its EXIF orientation"""
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(image), -1)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def decode_upload(contents: bytes, target_size: int = 640,
+                  keep_full_res: bool = False,
+                  header: Optional[ImageHeader] = None) -> DecodedImage:
+    """
+    Decode uploaded bytes straight into a BGR array
+
+    Without keep_full_res the image is decoded at a reduced resolution
+    that is still at least target_size on its longest side, which for
+    JPEG skips most of the IDCT work and never materializes the full
+    photo. Detection boxes on the result must be multiplied by
+    DecodedImage.scale to get full-resolution coordinates.
+
+    Args:
+        contents: Raw uploaded bytes
+        target_size: Model input size
+        keep_full_res: Decode at full resolution (needed for extraction)
+        header: Previously parsed header, read again if None
+
+    Raises:
+        InvalidImageError: If the bytes cannot be decoded
+    """
+    if header is None:
+        header = read_header(contents)
+
+    if keep_full_res:
+        factor, flag = 1, cv2.IMREAD_COLOR
+    else:
+        factor, flag = reduced_decode_flag(header.width, header.height, target_size)
+
+    buffer = np.frombuffer(contents, dtype=np.uint8)
+    image = cv2.imdecode(buffer, flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise InvalidImageError()
+
+    image = apply_exif_orientation(image, header.orientation)
+
+    if keep_full_res:
+        return DecodedImage(image, image, 1.0)
+
+    scale = max(header.width, header.height) / max(image.shape[:2])
+    return DecodedImage(image, None, scale)
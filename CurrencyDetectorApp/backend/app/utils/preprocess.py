@@ -1,14 +1,17 @@
 import cv2
 import numpy as np
 from PIL import Image
+from typing import Tuple
 
-def preprocess_image(image: Image.Image, target_size: int=640):
-    img = np.array(image)
+def letterbox(img: np.ndarray, target_size: int = 640,
+              color: Tuple[int, int, int] = (114, 114, 114)) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Resize while maintaining aspect ratio and pad to a square
 
-    if len(img.shape) == 3 and img.shape[2] == 3:
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-
-    # Resize while maintaining aspect ratio
+    Returns:
+        (padded image, scale, (pad_w, pad_h)) - a point (x, y) in the
+        padded image maps back to ((x - pad_w) / scale, (y - pad_h) / scale)
+    """
     h, w = img.shape[:2]
     scale = target_size / max(h, w)
     new_w, new_h = int(w * scale), int(h*scale)
@@ -21,7 +24,17 @@ def preprocess_image(image: Image.Image, target_size: int=640):
     img_padded = cv2.copyMakeBorder(
         img_resized, pad_h, target_size - new_h - pad_h,
         pad_w, target_size - new_w - pad_w,
-        cv2.BORDER_CONSTANT, value=(114, 114, 114)
+        cv2.BORDER_CONSTANT, value=color
     )
 
-    return img_padded
\ No newline at end of file
+    return img_padded, scale, (pad_w, pad_h)
+
+def preprocess_image(image: Image.Image, target_size: int=640):
+    img = np.array(image)
+
+    if len(img.shape) == 3 and img.shape[2] == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+
+    img_padded, _, _ = letterbox(img, target_size)
+
+    return img_padded
@@ -0,0 +1,128 @@
+"""
+Temporal stabilization of streamed detections
+Turns per-frame detections into a stable set of denominations and only
+reports it for announcement when that set changes
+"""
+
+import time
+from collections import Counter, deque
+from typing import Dict, Hashable, List, Optional
+
+
+class DetectionStabilizer:
+    """
+    Per-session sliding-window vote over the detections of recent frames
+
+    Every object (its 'track_id' when the tracker provides one, else the
+    n-th detection of a class in a frame) votes for a class in each frame
+    it appears in. Objects present in at least min_share of the window
+    count with their majority class; confidences are averaged over the
+    window. update() returns an announcement only when the resulting
+    set of denominations differs from the last announced one and the
+    debounce interval has passed.
+    """
+
+    def __init__(self, window: int = 8, min_share: float = 0.6,
+                 debounce: float = 2.0, min_frames: int = 3,
+                 announce_empty: bool = False):
+        """
+        Args:
+            window: Number of recent frames voting
+            min_share: Share of the window an object must be present in
+            debounce: Minimum seconds between two announcements
+            min_frames: Frames needed before the first announcement
+            announce_empty: Also announce when all currency disappears
+        """
+        self.window = window
+        self.min_share = min_share
+        self.debounce = debounce
+        self.min_frames = min(min_frames, window)
+        self.announce_empty = announce_empty
+
+        self._frames = deque(maxlen=window)
+        self._announced: Counter = Counter()
+        self._last_announcement = float('-inf')
+        self.announcements = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def _keys(detections: List[Dict]) -> List[Hashable]:
+        seen = Counter()
+        keys = []
+        for det in detections:
+            if 'track_id' in det:
+                keys.append(('track', det['track_id']))
+            else:
+                keys.append(('class', det['class_name'], seen[det['class_name']]))
+                seen[det['class_name']] += 1
+        return keys
+
+    def stable(self) -> List[Dict]:
+        """Stable detections of the current window, most confident first"""
+        votes: Dict[Hashable, Counter] = {}
+        presence: Counter = Counter()
+        confidences: Dict[Hashable, Dict[str, List[float]]] = {}
+        types: Dict[str, str] = {}
+
+        for detections in self._frames:
+            for key, det in zip(self._keys(detections), detections):
+                name = det['class_name']
+                presence[key] += 1
+                votes.setdefault(key, Counter())[name] += 1
+                confidences.setdefault(key, {}).setdefault(name, []).append(
+                    det.get('ensemble_confidence', det['confidence'])
+                )
+                types[name] = det.get('type')
+
+        needed = self.min_share * len(self._frames)
+        stable = []
+        for key, count in presence.items():
+            if count < needed:
+                continue
+            name = votes[key].most_common(1)[0][0]
+            values = confidences[key][name]
+            stable.append({
+                'class_name': name,
+                'type': types[name],
+                'confidence': sum(values) / len(values)
+            })
+
+        stable.sort(key=lambda d: d['confidence'], reverse=True)
+        return stable
+
+    def update(self, detections: List[Dict], now: Optional[float] = None) -> Optional[Dict]:
+        """
+        Add the detections of one frame
+
+        Returns:
+            A detection result ({'success', 'type', 'detections',
+            'counts'}) to announce, or None when nothing changed
+        """
+        now = time.monotonic() if now is None else now
+        self._frames.append(detections)
+        if len(self._frames) < self.min_frames:
+            return None
+
+        stable = self.stable()
+        counts = Counter(det['class_name'] for det in stable)
+        if counts == self._announced:
+            return None
+        if not counts and not self.announce_empty:
+            # Forget silently so the same money is announced when it returns
+            self._announced = counts
+            return None
+        if now - self._last_announcement < self.debounce:
+            self.suppressed += 1
+            return None
+
+        self._announced = counts
+        self._last_announcement = now
+        self.announcements += 1
+
+        found_types = {det['type'] for det in stable}
+        return {
+            'success': bool(stable),
+            'type': found_types.pop() if len(found_types) == 1 else ('mixed' if found_types else None),
+            'detections': stable,
+            'counts': dict(counts)
+        }
@@ -0,0 +1,81 @@
+"""
+Streaming helpers for the WebSocket endpoint
+Latest-frame-wins mailbox and per-stream FPS / latency statistics
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+class LatestFrameSlot:
+    """
+    Single-item mailbox: a new frame replaces the one still waiting
+
+    When inference falls behind, stale frames are dropped instead of
+    queueing up, so results always refer to what the camera sees now.
+    """
+
+    def __init__(self):
+        self._item: Any = None
+        self._closed = False
+        self._event = asyncio.Event()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        self.received += 1
+        if self._item is not None:
+            self.dropped += 1
+        self._item = item
+        self._event.set()
+
+    def close(self) -> None:
+        self._closed = True
+        self._event.set()
+
+    async def get(self) -> Optional[Any]:
+        """Wait for the newest frame; None once closed and drained"""
+        while self._item is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        item, self._item = self._item, None
+        return item
+
+
+class StreamStats:
+    """Achieved FPS over a sliding window and end-to-end latency"""
+
+    def __init__(self, window: float = 2.0):
+        self.window = window
+        self._done = deque()
+        self.frames = 0
+        self.detections_run = 0
+
+    def record(self, received_at: float, full_detection: bool) -> Dict:
+        """
+        Register a processed frame
+
+        Args:
+            received_at: time.perf_counter() when the frame arrived
+            full_detection: Whether the cascade ran for it
+
+        Returns:
+            {'fps', 'latency_ms'} for this frame
+        """
+        now = time.perf_counter()
+        self.frames += 1
+        self.detections_run += int(full_detection)
+
+        self._done.append(now)
+        while self._done and now - self._done[0] > self.window:
+            self._done.popleft()
+
+        span = now - self._done[0] if len(self._done) > 1 else 0.0
+        return {
+            'fps': round((len(self._done) - 1) / span, 2) if span > 0 else 0.0,
+            'latency_ms': round((now - received_at) * 1000, 1)
+        }
@@ -0,0 +1,177 @@
+"""
+Stage timings and Prometheus metrics
+StageTimer measures the pipeline stages of one request; the module-level
+functions export them (and a few gauges) when prometheus_client is installed
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Request stages in pipeline order
+STAGES = (
+    'decode', 'preprocess', 'binary', 'specific', 'ensemble', 'tile_merge', 'postprocess',
+    'extraction', 'crop_encode', 'encode'
+)
+
+# Seconds; covers both a cached crop encode and a slow full-precision pass
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageTimer:
+    """
+    Accumulated durations per stage of one request
+
+    Plain dict of floats underneath, so it can be returned from a worker
+    process and merged into the timer of the caller.
+    """
+
+    def __init__(self, stages: Optional[Dict[str, float]] = None):
+        self.stages: Dict[str, float] = dict(stages or {})
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, stages: Optional[Dict[str, float]]) -> None:
+        for name, seconds in (stages or {}).items():
+            self.add(name, seconds)
+
+    def as_ms(self) -> Dict[str, float]:
+        """Durations in milliseconds, in pipeline order"""
+        order = {name: i for i, name in enumerate(STAGES)}
+        return {
+            name: round(self.stages[name] * 1000, 2)
+            for name in sorted(self.stages, key=lambda n: order.get(n, len(order)))
+        }
+
+
+def memory_usage() -> Optional[Dict[str, float]]:
+    """
+    Memory of this process in MB from /proc/self/smaps_rollup (Linux)
+
+    'private' is what the process costs on its own; pages shared
+    copy-on-write with other serve.py workers count under 'shared' and
+    are split between the sharers in 'pss'.
+
+    Returns:
+        {'rss', 'pss', 'shared', 'private'} or None where unavailable
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+
+    def mb(*keys: str) -> float:
+        return round(sum(int(fields.get(k, '0 kB').split()[0]) for k in keys) / 1024, 1)
+
+    return {
+        'rss': mb('Rss'),
+        'pss': mb('Pss'),
+        'shared': mb('Shared_Clean', 'Shared_Dirty'),
+        'private': mb('Private_Clean', 'Private_Dirty'),
+    }
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def _load_metrics():
+    """Create the metric objects on first use; None without prometheus_client"""
+    global _metrics
+    if _metrics is not None:
+        return _metrics or None
+
+    with _metrics_lock:
+        if _metrics is None:
+            try:
+                import prometheus_client as prom
+            except ImportError:
+                _metrics = False
+                return None
+
+            registry = prom.CollectorRegistry()
+            _metrics = {
+                'prom': prom,
+                'registry': registry,
+                'stage': prom.Histogram(
+                    'currency_stage_seconds', 'Duration of one pipeline stage',
+                    ['stage'], buckets=BUCKETS, registry=registry
+                ),
+                'request': prom.Histogram(
+                    'currency_request_seconds', 'Duration of a request in the handler',
+                    ['endpoint', 'cache'], buckets=BUCKETS, registry=registry
+                ),
+                'gauge': prom.Gauge(
+                    'currency_state', 'Current server state (queue depth, cache hit rate, ...)',
+                    ['name'], registry=registry
+                ),
+                'model_load': prom.Gauge(
+                    'currency_model_load_seconds', 'Time it took to load a model',
+                    ['model'], registry=registry
+                ),
+            }
+    return _metrics or None
+
+
+def metrics_available() -> bool:
+    return _load_metrics() is not None
+
+
+def observe_stages(stages: Dict[str, float]) -> None:
+    """Record the stage durations (seconds) of one request"""
+    metrics = _load_metrics()
+    if metrics is None:
+        return
+    for name, seconds in stages.items():
+        metrics['stage'].labels(name).observe(seconds)
+
+
+def observe_request(endpoint: str, cache: str, seconds: float) -> None:
+    metrics = _load_metrics()
+    if metrics is not None:
+        metrics['request'].labels(endpoint, cache).observe(seconds)
+
+
+def set_gauges(values: Dict[str, float]) -> None:
+    """Set state gauges, e.g. {'queue_depth': 3}"""
+    metrics = _load_metrics()
+    if metrics is None:
+        return
+    for name, value in values.items():
+        metrics['gauge'].labels(name).set(value)
+
+
+def set_model_load_times(load_times: Dict[str, float]) -> None:
+    metrics = _load_metrics()
+    if metrics is None:
+        return
+    for model, seconds in load_times.items():
+        metrics['model_load'].labels(model).set(seconds)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Prometheus text exposition of all metrics
+
+    Returns:
+        (body, content type)
+
+    Raises:
+        RuntimeError: prometheus_client is not installed
+    """
+    metrics = _load_metrics()
+    if metrics is None:
+        raise RuntimeError("prometheus_client is not installed")
+    prom = metrics['prom']
+    return prom.generate_latest(metrics['registry']), prom.CONTENT_TYPE_LATEST
@@ -0,0 +1,167 @@
+"""
+Box tracking between full detections
+Moves the last detected boxes along with the camera using sparse optical
+flow so the cascade only has to run every few frames of a stream
+"""
+
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from utils.boxes import greedy_match, iou_matrix
+
+SIGNATURE_SIZE = 32
+
+
+def frame_signature(gray: np.ndarray) -> np.ndarray:
+    """Tiny blurred thumbnail used to detect scene changes"""
+    small = cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32)
+
+
+class BoxTracker:
+    """
+    Per-stream tracker
+
+    reset() takes the detections of a full cascade run (boxes in the
+    coordinates of the gray frame); propagate() moves them to the next
+    frame with Lucas-Kanade optical flow. Tracks keep their 'track_id'
+    across full runs when a new box overlaps an old one of the same class.
+    """
+
+    def __init__(self, full_every: int = 5, scene_threshold: float = 12.0,
+                 min_tracked_fraction: float = 0.3):
+        """
+        Args:
+            full_every: Run the full cascade at least every N frames
+            scene_threshold: Mean absolute thumbnail difference (0-255)
+                to the last detected frame that counts as a new scene
+            min_tracked_fraction: Below this share of flow points found
+                again, the next frame is detected instead of tracked
+        """
+        self.full_every = max(1, full_every)
+        self.scene_threshold = scene_threshold
+        self.min_tracked_fraction = min_tracked_fraction
+
+        self.detections: List[Dict] = []
+        self._prev_gray: Optional[np.ndarray] = None
+        self._keyframe: Optional[np.ndarray] = None
+        self._since_full = 0
+        self._lost = False
+        self._next_id = 0
+
+    def needs_detection(self, gray: np.ndarray) -> bool:
+        """Whether this frame should go through the full cascade"""
+        if self._prev_gray is None or self._lost:
+            return True
+        if self._prev_gray.shape != gray.shape:
+            return True
+        if self._since_full + 1 >= self.full_every:
+            return True
+        diff = np.abs(frame_signature(gray) - self._keyframe).mean()
+        return diff > self.scene_threshold
+
+    def reset(self, gray: np.ndarray, detections: List[Dict]) -> List[Dict]:
+        """
+        Start tracking the detections of a full run
+
+        Returns:
+            The detections with a 'track_id' each
+        """
+        detections = [dict(det) for det in detections]
+        unmatched = set(range(len(detections)))
+
+        if self.detections and detections:
+            ious = iou_matrix(
+                np.array([d['bbox'] for d in self.detections], dtype=np.float64),
+                np.array([d['bbox'] for d in detections], dtype=np.float64)
+            )
+            same_class = np.array([
+                [old['class_name'] == new['class_name'] for new in detections]
+                for old in self.detections
+            ])
+            rows, cols = greedy_match(np.where(same_class, ious, 0.0), 0.3)
+            for row, col in zip(rows, cols):
+                detections[col]['track_id'] = self.detections[row]['track_id']
+                unmatched.discard(int(col))
+
+        for idx in sorted(unmatched):
+            detections[idx]['track_id'] = self._next_id
+            self._next_id += 1
+
+        self.detections = detections
+        self._prev_gray = gray
+        self._keyframe = frame_signature(gray)
+        self._since_full = 0
+        self._lost = False
+        return [dict(det) for det in detections]
+
+    def propagate(self, gray: np.ndarray) -> List[Dict]:
+        """Move the tracked boxes to a new frame"""
+        if self._prev_gray is None:
+            raise RuntimeError("reset() must be called before propagate()")
+
+        self._since_full += 1
+        if not self.detections:
+            self._prev_gray = gray
+            return []
+
+        h, w = gray.shape[:2]
+        points, owners = [], []
+        for idx, det in enumerate(self.detections):
+            x1, y1, x2, y2 = [int(round(v)) for v in det['bbox']]
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                continue
+            corners = cv2.goodFeaturesToTrack(
+                self._prev_gray[y1:y2, x1:x2], maxCorners=30,
+                qualityLevel=0.01, minDistance=5
+            )
+            if corners is None:
+                continue
+            corners = corners.reshape(-1, 2) + (x1, y1)
+            points.append(corners)
+            owners.extend([idx] * len(corners))
+
+        tracked = 0
+        moved = [dict(det) for det in self.detections]
+        if points:
+            old = np.concatenate(points).astype(np.float32)
+            new, status, _ = cv2.calcOpticalFlowPyrLK(
+                self._prev_gray, gray, old.reshape(-1, 1, 2), None,
+                winSize=(21, 21), maxLevel=3
+            )
+            new = new.reshape(-1, 2)
+            ok = status.reshape(-1).astype(bool)
+            owners = np.array(owners)
+            tracked = int(ok.sum())
+
+            for idx, det in enumerate(moved):
+                sel = ok & (owners == idx)
+                if sel.sum() < 2:
+                    continue
+                before, after = old[sel], new[sel]
+                dx, dy = np.median(after - before, axis=0)
+
+                # Scale from the spread of the points around their centre
+                spread_before = np.linalg.norm(before - before.mean(axis=0), axis=1).mean()
+                spread_after = np.linalg.norm(after - after.mean(axis=0), axis=1).mean()
+                scale = spread_after / spread_before if spread_before > 1e-3 else 1.0
+                scale = float(np.clip(scale, 0.8, 1.25))
+
+                x1, y1, x2, y2 = det['bbox']
+                cx, cy = (x1 + x2) / 2 + dx, (y1 + y2) / 2 + dy
+                hw, hh = (x2 - x1) / 2 * scale, (y2 - y1) / 2 * scale
+                det['bbox'] = [
+                    float(np.clip(cx - hw, 0, w)), float(np.clip(cy - hh, 0, h)),
+                    float(np.clip(cx + hw, 0, w)), float(np.clip(cy + hh, 0, h))
+                ]
+
+        total = sum(len(p) for p in points)
+        self._lost = total == 0 or tracked / total < self.min_tracked_fraction
+
+        self.detections = moved
+        self._prev_gray = gray
+        return [dict(det) for det in moved]
@@ -1,24 +1,159 @@
 import asyncio
-import time
-import edge_tts
-from typing import Optional, Dict, Any
-from playsound import playsound
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+from utils.cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Class names of the binary, banknote and coin models
+CURRENCY_CLASSES = (
+    "coin", "note",
+    "10_note", "50_note", "100_note", "200_note", "500_note", "1000_note", "2000_note",
+    "1_coin", "2_coin", "5_coin", "10_coin", "50_coin",
+)
+
+VOICES = {
+    "mk": "mk-MK-MarijaNeural",
+    "en": "en-US-GuyNeural",
+}
+
+# Largest count generate_currency_message() is pre-synthesized for
+MAX_PHRASE_COUNT = 10
+
+
+class EdgeSynthesizer:
+    """Microsoft Edge online voices (needs edge_tts and the network)"""
+
+    name = "edge"
+    suffix = ".mp3"
+    media_type = "audio/mpeg"
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        return asyncio.run(self._collect(text, voice))
+
+    async def stream(self, text: str, voice: str) -> AsyncIterator[bytes]:
+        """Audio chunks as the service produces them"""
+        import edge_tts
+
+        async for chunk in edge_tts.Communicate(text, voice).stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def _collect(self, text: str, voice: str) -> bytes:
+        return b"".join([chunk async for chunk in self.stream(text, voice)])
+
+
+class OfflineSynthesizer:
+    """Local system voices through pyttsx3; the Edge voice name is ignored"""
+
+    name = "offline"
+    suffix = ".wav"
+    media_type = "audio/wav"
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        import pyttsx3
+
+        # pyttsx3 can only render into a file
+        fd, path = tempfile.mkstemp(suffix=self.suffix)
+        os.close(fd)
+        try:
+            engine = pyttsx3.init()
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
+
+
+SYNTHESIZERS = {
+    "edge": EdgeSynthesizer,
+    "offline": OfflineSynthesizer,
+}
+
+
+def phrase_key(text: str, voice: str, synthesizer: str) -> str:
+    """Deterministic cache key of a synthesized phrase"""
+    return hashlib.sha256(f"{synthesizer}\n{voice}\n{text}".encode("utf-8")).hexdigest()
+
 
 class TextToSpeech:
-    def __init__(self, language: str = "mk"):
+    def __init__(self, language: str = "mk", synthesizer=None,
+                 cache: Optional[ResultCache] = None):
+        """
+        Args:
+            language: 'mk' or 'en'
+            synthesizer: Object with name, suffix, media_type and
+                synthesize(text, voice) returning audio bytes, optionally
+                an async stream(text, voice) (EdgeSynthesizer by default)
+            cache: Phrase cache; phrases never expire, so only size limits
+                evict them (in-memory LRU of 128 phrases by default)
+        """
         self.language = language
-        self.voice = "mk-MK-MarijaNeural" if language == "mk" else "en-US-GuyNeural"
+        self.voice = VOICES["mk"] if language == "mk" else VOICES["en"]
+        self.synthesizer = synthesizer or EdgeSynthesizer()
+        self.cache = cache if cache is not None else ResultCache(
+            max_entries=128, max_bytes=16 * 1024 * 1024, ttl=float("inf")
+        )
 
-    def speak(self, text: str, voice: Optional[str] = None) -> bool:
+    def synthesize(self, text: str, voice: Optional[str] = None) -> bytes:
+        """Audio bytes of a phrase, synthesized only on a cache miss"""
         voice = voice or self.voice
+        key = phrase_key(text, voice, self.synthesizer.name)
+        audio = self.cache.get(key)
+        if audio is None:
+            audio = self.synthesizer.synthesize(text, voice)
+            self.cache.put(key, audio)
+        return audio
+
+    async def stream(self, text: str, voice: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        Audio of a phrase for async callers
+
+        Cached phrases are yielded at once; otherwise the synthesizer's
+        chunks are passed on as they arrive and cached when complete.
+        Synthesizers without stream() run in a thread.
+        """
+        voice = voice or self.voice
+        key = phrase_key(text, voice, self.synthesizer.name)
+        audio = await asyncio.to_thread(self.cache.get, key)
+        if audio is not None:
+            yield audio
+            return
+
+        stream = getattr(self.synthesizer, "stream", None)
+        if stream is None:
+            audio = await asyncio.to_thread(self.synthesizer.synthesize, text, voice)
+            yield audio
+        else:
+            chunks = []
+            async for chunk in stream(text, voice):
+                chunks.append(chunk)
+                yield chunk
+            audio = b"".join(chunks)
+        await asyncio.to_thread(self.cache.put, key, audio)
+
+    def speak(self, text: str, voice: Optional[str] = None) -> bool:
+        path = None
         try:
-            filename = f"tts_{int(time.time() * 1000)}.mp3"  # unique file
-            asyncio.run(edge_tts.Communicate(text, voice).save(filename))
-            playsound(filename)
+            from playsound import playsound
+
+            audio = self.synthesize(text, voice)
+            fd, path = tempfile.mkstemp(prefix="tts_", suffix=self.synthesizer.suffix)
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            playsound(path)
             return True
         except Exception as e:
-            print(f"❌ Edge TTS error: {e}")
+            logger.exception(f"❌ TTS error: {e}")
             return False
+        finally:
+            if path is not None:
+                os.unlink(path)
 
     def generate_currency_message(self, detection_result: dict) -> str:
         MKD_CURRENCY_NAMES = {
@@ -49,6 +184,31 @@ class TextToSpeech:
         else:
             return f"Детектирани {count} {type_str}и" if self.language == "mk" else f"Detected {count} {type_str}s"
 
+    def all_phrases(self) -> List[str]:
+        """Every message generate_currency_message() can return for known classes"""
+        phrases = [self.generate_currency_message({"detections": []})]
+        for class_name in CURRENCY_CLASSES:
+            for count in range(1, MAX_PHRASE_COUNT + 1):
+                result = {"detections": [{"class_name": class_name}] * count}
+                phrases.append(self.generate_currency_message(result))
+        return list(dict.fromkeys(phrases))
+
+    def warm_up(self) -> int:
+        """
+        Synthesize all phrases into the cache
+
+        Returns:
+            Number of phrases available; failures are logged and skipped
+        """
+        ready = 0
+        for phrase in self.all_phrases():
+            try:
+                self.synthesize(phrase)
+                ready += 1
+            except Exception as e:
+                logger.warning(f"⚠️ TTS warm-up failed for '{phrase}': {e}")
+        return ready
+
     def announce_detection(self, detection_result: Dict[str, Any]) -> bool:
         message = self.generate_currency_message(detection_result)
         print(f"🔊 TTS: {message}")
@@ -56,9 +216,28 @@ class TextToSpeech:
 
 _tts_instance: TextToSpeech = None
 
+def init_tts(language: str = "mk", synthesizer: str = "edge", cache_dir: Optional[str] = None,
+             max_entries: int = 128, max_bytes: int = 16 * 1024 * 1024,
+             disk_max_bytes: int = 64 * 1024 * 1024) -> TextToSpeech:
+    """
+    Initialize the global TTS instance
+
+    Args:
+        language: 'mk' or 'en'
+        synthesizer: Key of SYNTHESIZERS ('edge' or 'offline')
+        cache_dir: Directory of the on-disk phrase cache (None disables it)
+        max_entries: Phrases kept in memory
+        max_bytes: Audio bytes kept in memory
+        disk_max_bytes: Size the disk cache is pruned back to
+    """
+    global _tts_instance
+    cache = ResultCache(max_entries, max_bytes, float("inf"), cache_dir, disk_max_bytes)
+    _tts_instance = TextToSpeech(language, SYNTHESIZERS[synthesizer](), cache)
+    return _tts_instance
+
 def get_tts(language: str = "mk") -> TextToSpeech:
     """Return a singleton TTS instance"""
     global _tts_instance
     if _tts_instance is None:
         _tts_instance = TextToSpeech(language=language)
-    return _tts_instance
\ No newline at end of file
+    return _tts_instance
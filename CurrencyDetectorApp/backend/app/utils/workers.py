@@ -0,0 +1,123 @@
+"""
+Worker pool utilities
+Runs the CPU-bound detection pipeline off the asyncio event loop
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when the pool and its waiting queue are both full"""
+
+
+class InferencePool:
+    def __init__(self, max_workers: int, max_queue: int, kind: str = 'thread',
+                 initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        """
+        Bounded executor for detection jobs
+
+        Args:
+            max_workers: Number of jobs executed in parallel
+            max_queue: Number of jobs allowed to wait for a free worker
+            kind: 'thread' or 'process'
+            initializer: Optional callable run once in every worker
+                (process pools use it to load the models)
+            initargs: Arguments for the initializer
+        """
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown pool kind: {kind}")
+
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.capacity = self.max_workers + self.max_queue
+
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        if kind == 'process':
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=initializer,
+                initargs=initargs
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='detect',
+                initializer=initializer,
+                initargs=initargs
+            )
+
+    @property
+    def pending(self) -> int:
+        """Jobs currently running or waiting for a worker"""
+        return self._pending
+
+    @property
+    def queued(self) -> int:
+        """Jobs waiting for a free worker"""
+        return max(0, self._pending - self.max_workers)
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """
+        Submit a job without waiting for it
+
+        Raises:
+            PoolBusyError: If every worker is busy and the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise PoolBusyError("Detection queue is full")
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        # The slot is freed when the job really finishes, even if the
+        # caller stopped waiting for it because of a timeout
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Run a job in the pool and await its result
+
+        Args:
+            fn: Callable to execute (must be picklable for process pools)
+            *args: Arguments passed to fn
+            timeout: Seconds to wait before giving up (None waits forever)
+
+        Raises:
+            PoolBusyError: If the queue is full
+            asyncio.TimeoutError: If the job did not finish in time
+        """
+        future = self.submit(fn, *args)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def stats(self) -> dict:
+        return {
+            'kind': self.kind,
+            'workers': self.max_workers,
+            'queue_size': self.max_queue,
+            'in_flight': min(self._pending, self.max_workers),
+            'queued': self.queued
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info(f"Worker pool ({self.kind}) shut down")